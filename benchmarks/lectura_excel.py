@@ -0,0 +1,86 @@
+"""Compara pd.read_excel completo contra el lector por columnas de lector_cartera.
+
+Genera un estado de cuenta sintético con el layout de Mundial (encabezado en la
+fila 6) y muchas columnas que el procesador no usa. Ejemplo::
+
+    python benchmarks/lectura_excel.py --filas 100000 --columnas-extra 30
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+import xlsxwriter
+
+from lector_cartera.excel import leer_columnas
+
+COLUMNAS = ["FECHA PAGO", "FACTURA", "VALOR RECLAMADO", "VALOR APROBADO", "Rete-Fuente", "ICA"]
+VALORES = ["VALOR RECLAMADO", "VALOR APROBADO", "Rete-Fuente", "ICA"]
+
+
+def generar_estado(ruta, filas, columnas_extra):
+    libro = xlsxwriter.Workbook(ruta, {"constant_memory": True})
+    hoja = libro.add_worksheet()
+    fecha = libro.add_format({"num_format": "yyyy-mm-dd"})
+    hoja.write_row(0, 0, ["COMPAÑIA MUNDIAL DE SEGUROS SA"])
+    hoja.write_row(2, 0, ["RELACION DE PAGOS"])
+    encabezado = COLUMNAS + [f"COLUMNA {i}" for i in range(columnas_extra)]
+    hoja.write_row(5, 0, encabezado)
+    inicio = datetime(2025, 1, 1)
+    for i in range(filas):
+        reclamado = 1000 + (i * 37) % 900000
+        aprobado = reclamado - (i % 7) * 100
+        hoja.write_datetime(6 + i, 0, inicio + timedelta(days=i % 365), fecha)
+        hoja.write_row(6 + i, 1, [f"FE{100000 + i}", reclamado, aprobado, round(aprobado * 0.02), round(aprobado * 0.0066)])
+        hoja.write_row(6 + i, len(COLUMNAS), [f"dato {i % 97}" if j % 2 else i * j for j in range(columnas_extra)])
+    libro.close()
+
+
+def medir(funcion):
+    # El tiempo y la memoria se miden por separado porque tracemalloc hace lento el código medido.
+    inicio = time.perf_counter()
+    resultado = funcion()
+    segundos = time.perf_counter() - inicio
+    del resultado
+    tracemalloc.start()
+    resultado = funcion()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return resultado, segundos, pico / 1024 / 1024
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filas", type=int, default=100_000)
+    parser.add_argument("--columnas-extra", type=int, default=30)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "mundial.xlsx")
+        generar_estado(ruta, args.filas, args.columnas_extra)
+        with open(ruta, "rb") as f:
+            contenido = f.read()
+
+    def archivo():
+        b = BytesIO(contenido)
+        b.name = "mundial.xlsx"
+        return b
+
+    completo, t_completo, m_completo = medir(lambda: pd.read_excel(archivo(), header=5)[COLUMNAS])
+    podado, t_podado, m_podado = medir(lambda: leer_columnas(archivo(), COLUMNAS, header=5, dtype=dict.fromkeys(VALORES, "float64")))
+
+    assert len(completo) == len(podado) == args.filas
+    print(f"{args.filas} filas, {len(COLUMNAS) + args.columnas_extra} columnas ({len(contenido) / 1024 / 1024:.1f} MB)")
+    print(f"pd.read_excel completo: {t_completo:7.2f} s  pico {m_completo:8.1f} MB")
+    print(f"leer_columnas:          {t_podado:7.2f} s  pico {m_podado:8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
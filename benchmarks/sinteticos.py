@@ -0,0 +1,204 @@
+"""Generadores de estados de cuenta sintéticos para cada formato de aseguradora.
+
+Los Excel y CSV se arman a partir de la definición del ``Layout`` (columnas,
+renombres y conversiones), con el preámbulo y la fila de encabezado propios de
+cada aseguradora. Los PDF se escriben a mano con texto plano para no depender
+de una librería de generación de PDF.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+import xlsxwriter
+
+from lector_cartera.layouts import LAYOUTS
+
+INICIO = datetime(2025, 1, 1)
+# Posición horizontal de las líneas de texto de los PDF.
+MARGEN_PDF = 40
+_EPOCA_EXCEL = datetime(1899, 12, 30)
+
+
+def layout(familia, nombre):
+    return next(l for l in LAYOUTS[familia] if l.nombre == nombre)
+
+
+def _columna(layout, columna, n, rng):
+    """Valores plausibles para una columna de origen según su papel en el layout."""
+    destino = layout.renombrar.get(columna)
+    if columna in layout.convertir:
+        return [f"${v:,.0f}" for v in rng.integers(10_000, 9_000_000, n)]
+    if destino == "FECHA":
+        dias = rng.integers(0, 365, n)
+        if layout.formato_fecha == "%Y%m%d":
+            return [int((INICIO + timedelta(days=int(d))).strftime("%Y%m%d")) for d in dias]
+        return [INICIO + timedelta(days=int(d)) for d in dias]
+    if destino == "APLICA A FV":
+        return [f"FE{v}" for v in rng.integers(100_000, 9_999_999, n)]
+    if columna == "Detalles":
+        return [f"FE{v} PAGO FACTURA" for v in rng.integers(100_000, 9_999_999, n)]
+    if columna in layout.columnas_valor or destino is not None:
+        return rng.integers(10_000, 9_000_000, n).astype(float).round(0).tolist()
+    return rng.integers(1, 99_999, n).tolist()
+
+
+def _tabla(layout, n, rng, encabezados=None):
+    columnas = list(layout.columnas)
+    datos = [_columna(layout, c, n, rng) for c in columnas]
+    return [encabezados.get(c, c) for c in columnas] if encabezados else columnas, list(zip(*datos))
+
+
+def escribir_excel(ruta, layout, filas, rng, preambulo=(), fila_encabezado=0, hoja=None, encabezados=None, pie=()):
+    """Escribe un .xlsx con el preámbulo, el encabezado en ``fila_encabezado`` y ``filas`` registros."""
+    encabezado, registros = _tabla(layout, filas, rng, encabezados)
+    libro = xlsxwriter.Workbook(ruta, {"constant_memory": True})
+    hoja_excel = libro.add_worksheet(hoja or (layout.hoja if isinstance(layout.hoja, str) else None))
+    formato_fecha = libro.add_format({"num_format": "dd/mm/yyyy"})
+    for i, fila in enumerate(preambulo):
+        for j, valor in enumerate(fila):
+            if isinstance(valor, datetime):
+                hoja_excel.write_number(i, j, (valor - _EPOCA_EXCEL).days, formato_fecha)
+            elif valor is not None:
+                hoja_excel.write(i, j, valor)
+    hoja_excel.write_row(fila_encabezado, 0, encabezado)
+    for i, registro in enumerate(registros, start=fila_encabezado + 1):
+        for j, valor in enumerate(registro):
+            if isinstance(valor, datetime):
+                hoja_excel.write_number(i, j, (valor - _EPOCA_EXCEL).days, formato_fecha)
+            else:
+                hoja_excel.write(i, j, valor)
+    for k, fila in enumerate(pie, start=fila_encabezado + 1 + filas):
+        hoja_excel.write_row(k, 0, fila)
+    libro.close()
+
+
+def escribir_csv(ruta, layout, filas, rng, titulo=None):
+    """Escribe un .csv con la codificación y el separador que espera el layout."""
+    sep = layout.opciones_csv.get("sep", ",")
+    encabezado, registros = _tabla(layout, filas, rng)
+    with open(ruta, "w", encoding=layout.opciones_csv.get("encoding", "utf-8"), newline="") as f:
+        if titulo is not None:
+            f.write(f"{titulo}\n")
+        f.write(sep.join(encabezado) + "\n")
+        for registro in registros:
+            f.write(sep.join(v.strftime("%d/%m/%Y") if isinstance(v, datetime) else str(v) for v in registro) + "\n")
+
+
+def _texto_pdf(texto):
+    return texto.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def contenido_pdf(paginas, columnas=None):
+    """Bytes de un PDF mínimo con una línea de texto Helvetica por cada elemento de cada página.
+
+    Una línea es una cadena, que empieza en el margen izquierdo, o una lista de
+    celdas que se ubican en las posiciones horizontales de ``columnas``; las
+    celdas vacías no se escriben.
+    """
+    objetos = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    hijos = []
+    for lineas in paginas:
+        textos = []
+        for i, linea in enumerate(lineas):
+            celdas = zip(columnas, linea) if isinstance(linea, list) else [(MARGEN_PDF, linea)]
+            textos += [f"BT /F1 9 Tf {x} {800 - 12 * i} Td ({_texto_pdf(texto)}) Tj ET" for x, texto in celdas if texto]
+        contenido = "\n".join(textos)
+        flujo = contenido.encode("latin-1")
+        objetos.append(f"<< /Length {len(flujo)} >>\nstream\n{contenido}\nendstream")
+        objetos.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents {len(objetos)} 0 R /Resources << /Font << /F1 3 0 R >> >> >>")
+        hijos.append(f"{len(objetos)} 0 R")
+    objetos[1] = f"<< /Type /Pages /Kids [{' '.join(hijos)}] /Count {len(hijos)} >>"
+    salida = bytearray(b"%PDF-1.4\n")
+    posiciones = []
+    for i, objeto in enumerate(objetos, start=1):
+        posiciones.append(len(salida))
+        salida += f"{i} 0 obj\n{objeto}\nendobj\n".encode("latin-1")
+    xref = len(salida)
+    salida += f"xref\n0 {len(objetos) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    salida += "".join(f"{p:010d} 00000 n \n" for p in posiciones).encode("latin-1")
+    salida += f"trailer\n<< /Size {len(objetos) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    return bytes(salida)
+
+
+def escribir_pdf(ruta, paginas, columnas=None):
+    """Escribe en ``ruta`` el PDF de ``contenido_pdf``."""
+    with open(ruta, "wb") as f:
+        f.write(contenido_pdf(paginas, columnas))
+
+
+def _paginar(encabezado, lineas, por_pagina=60):
+    paginas = [list(encabezado)]
+    for linea in lineas:
+        if len(paginas[-1]) >= por_pagina:
+            paginas.append([])
+        paginas[-1].append(linea)
+    return paginas
+
+
+def pdf_sisco(ruta, filas, rng):
+    """Soporte de pago de Seguros del Estado con la marca de SISCO en la primera página."""
+    brutos = rng.integers(10_000, 9_000_000, filas)
+    lineas = [f"{f}   $ {b:,}   $ {int(b * 0.9734):,}".replace(",", ".") for f, b in zip(rng.integers(10_000, 99_999_999, filas), brutos)]
+    escribir_pdf(ruta, _paginar(["Bogotá, D.C., 5 de marzo de 2025", "Consulte su pago en www.sis.co, opción pagos", ""], lineas))
+
+
+def pdf_equidad(ruta, filas, rng):
+    """Relación de pagos de La Equidad con la fecha en formato dd.mm.aaaa."""
+    lineas = [
+        f"{rng.integers(10**9, 10**10 - 1)} 2025 AB {rng.integers(1, 999)} {rng.integers(1, 99)} {rng.integers(1, 99)} X{rng.integers(1, 9)} {rng.integers(1_000, 999_999)} {neto:,}-".replace(",", ".")
+        for neto in rng.integers(10_000, 9_000_000, filas)
+    ]
+    escribir_pdf(ruta, _paginar(["LA EQUIDAD SEGUROS GENERALES", "Fecha: 07.04.2025", ""], lineas))
+
+
+def _previsora_liquidacion(ruta, filas, rng):
+    # Como las liquidaciones reales: el bloque RECLAMANTE: en la fila 5, la fecha
+    # de transferencia en la columna B y el encabezado de la tabla en la fila 9,
+    # con " Valor Reclamado" precedido de un espacio.
+    preambulo = [
+        ["LA PREVISORA S.A. COMPAÑÍA DE SEGUROS"], [], ["LIQUIDACIÓN DE PAGO"], [],
+        ["RECLAMANTE:", "IPS SINTÉTICA SAS"],
+        ["FECHA DE TRANSFERENCIA O DE CHEQUE:", INICIO],
+        ["VALOR TRANSFERIDO:", 0.0],
+        ["OBSERVACIONES:", "PAGO DE FACTURAS"],
+    ]
+    # La fila de totales al final queda incompleta y el layout la descarta.
+    escribir_excel(ruta, layout("PREVISORA", "Previsora liquidación"), filas, rng, preambulo, fila_encabezado=8, encabezados={"Valor Reclamado": " Valor Reclamado"}, pie=[["TOTAL", 0.0]])
+
+
+# Escenario -> (familia del procesador, extensión, generador(ruta, filas, rng)).
+GENERADORES = {
+    "axa": ("AXA", ".xlsx", lambda r, n, g: escribir_excel(r, layout("AXA", "AXA"), n, g)),
+    "axa_mayusculas": ("AXA", ".xlsx", lambda r, n, g: escribir_excel(r, layout("AXA", "AXA mayúsculas"), n, g, encabezados={"VALOR PAGADO DESPUES DE IMPUESTO": "VALOR PAGADO DESPUES DE IMPUESTO ", "VALOR PAGADO ANTES DE IMPUESTO": "VALOR PAGADO ANTES DE IMPUESTO "})),
+    "axa_retenciones": ("AXA", ".xlsx", lambda r, n, g: escribir_excel(r, layout("AXA", "AXA con retenciones"), n, g)),
+    "adres": ("ADRES", ".xlsx", lambda r, n, g: escribir_excel(r, layout("ADRES", "ADRES"), n, g, [["ADRES"], ["Resultado de auditoría"]], fila_encabezado=5)),
+    "previsora_liquidacion": ("PREVISORA", ".xlsx", _previsora_liquidacion),
+    "previsora": ("PREVISORA", ".xlsx", lambda r, n, g: escribir_excel(r, layout("PREVISORA", "Previsora"), n, g)),
+    "mundial": ("MUNDIAL", ".xlsx", lambda r, n, g: escribir_excel(r, layout("MUNDIAL", "Mundial"), n, g, [["COMPAÑIA MUNDIAL DE SEGUROS SA"], [], ["RELACION DE PAGOS"]], fila_encabezado=5)),
+    "sura_csv": ("SURA", ".csv", lambda r, n, g: escribir_csv(r, layout("SURA", "Sura CSV"), n, g, titulo="Consulta de pagos")),
+    "sura": ("SURA", ".xlsx", lambda r, n, g: escribir_excel(r, layout("SURA", "Sura"), n, g)),
+    "liberty": ("LIBERTY", ".xlsx", lambda r, n, g: escribir_excel(r, layout("LIBERTY", "Liberty"), n, g)),
+    "liberty_csv": ("LIBERTY", ".csv", lambda r, n, g: escribir_csv(r, layout("LIBERTY", "Liberty CSV"), n, g)),
+    "bolivar": ("BOLIVAR", ".xlsx", lambda r, n, g: escribir_excel(r, layout("BOLIVAR", "Bolívar"), n, g)),
+    "bolivar_csv": ("BOLIVAR", ".csv", lambda r, n, g: escribir_csv(r, layout("BOLIVAR", "Bolívar CSV"), n, g)),
+    "nueva_eps": ("NUEVA EPS", ".xlsx", lambda r, n, g: escribir_excel(r, layout("NUEVA EPS", "Nueva EPS"), n, g)),
+    "sisco": ("SISCO", ".pdf", pdf_sisco),
+    "equidad": ("EQUIDAD", ".pdf", pdf_equidad),
+}
+
+
+# SISCO solo se busca en las dos primeras páginas: los lotes grandes son muchos archivos cortos.
+FILAS_POR_ARCHIVO = {"sisco": 100}
+
+
+def generar(escenario, directorio, filas, archivos=1, semilla=0):
+    """Genera ``archivos`` archivos del escenario con ``filas`` registros en total y devuelve sus rutas."""
+    _, extension, generador = GENERADORES[escenario]
+    if escenario in FILAS_POR_ARCHIVO:
+        archivos = max(archivos, -(-filas // FILAS_POR_ARCHIVO[escenario]))
+    rng = np.random.default_rng(semilla)
+    rutas = []
+    for i in range(archivos):
+        ruta = f"{directorio}/{escenario}_{i}{extension}"
+        generador(ruta, filas // archivos + (1 if i < filas % archivos else 0), rng)
+        rutas.append(ruta)
+    return rutas
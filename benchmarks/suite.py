@@ -0,0 +1,197 @@
+"""Mide cada procesador sobre estados de cuenta sintéticos de todos los formatos.
+
+Por escenario registra el tiempo de punta a punta, el tiempo de cada etapa y el
+pico de memoria, y guarda todo en un JSON para comparar versiones. Ejemplos::
+
+    python benchmarks/suite.py --filas 20000 -o antes.json
+    python benchmarks/suite.py --filas 20000 -o despues.json --comparar antes.json
+    python benchmarks/suite.py --escenario sisco --escenario equidad --motor pdfium
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import closing
+from datetime import datetime
+from itertools import islice
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lector_cartera import instrumentacion
+from lector_cartera.archivos import ArchivoLocal, leer_contenido
+from lector_cartera.cache import VERSION_PARSER
+from lector_cartera.esquema import normalizar_esquema
+from lector_cartera.layouts import LAYOUTS, detectar_layout, transformar_archivo
+from lector_cartera.pdf import LECTURA_PDF, MOTOR_POR_DEFECTO, MOTORES_TEXTO, extraer_equidad, extraer_seg_estado, paginas_palabras, paginas_texto
+from lector_cartera.procesadores import FAMILIAS, FAMILIAS_PDF, filas_equidad, filas_seg_estado
+from sinteticos import GENERADORES, generar
+
+# Extractor, cómo lee las páginas y cómo se arman las filas.
+EXTRACTORES_PDF = {"SISCO": (extraer_seg_estado, paginas_texto, filas_seg_estado), "EQUIDAD": (extraer_equidad, paginas_palabras, filas_equidad)}
+
+
+def _cronometrar(funcion, repeticiones):
+    # Se toma el mejor tiempo: es el menos afectado por el resto de la máquina.
+    mejor = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        segundos = time.perf_counter() - inicio
+        mejor = segundos if mejor is None else min(mejor, segundos)
+    return resultado, mejor
+
+
+def _pico_mb(funcion):
+    # La memoria se mide en una corrida aparte porque tracemalloc hace lento el código medido.
+    tracemalloc.start()
+    try:
+        funcion()
+        return tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def etapas_layout(familia, archivos):
+    tiempos = dict.fromkeys(["deteccion", "lectura", "transformacion"], 0.0)
+    registro = instrumentacion.Registro()
+    for archivo in archivos:
+        inicio = time.perf_counter()
+        layout, fila, filas = detectar_layout(archivo, LAYOUTS[familia])
+        tiempos["deteccion"] += time.perf_counter() - inicio
+        # Los CSV se leen y transforman bloque a bloque; cada etapa se toma de los eventos.
+        with instrumentacion.capturar(registro, aislado=True):
+            transformar_archivo(archivo, layout, fila, filas)
+    for evento in registro.eventos:
+        tiempos[evento["etapa"]] += evento["segundos"]
+    return tiempos
+
+
+def etapas_pdf(familia, archivos, motor):
+    extractor, leer_paginas, armar_filas = EXTRACTORES_PDF[familia]
+    paginas = LECTURA_PDF[familia].max_paginas
+    tiempos = dict.fromkeys(["texto", "analisis", "normalizacion"], 0.0)
+    columnas = {}
+    for archivo in archivos:
+        contenido = leer_contenido(archivo)
+        inicio = time.perf_counter()
+        with closing(leer_paginas(contenido, motor)) as textos:
+            list(islice(textos, paginas))
+        texto = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        for columna, textos in extractor(archivo.name, contenido, 1, "ENTIDAD", "PLAN", motor).items():
+            columnas.setdefault(columna, []).extend(textos)
+        # El extractor vuelve a leer las páginas; lo que sobra es el análisis.
+        tiempos["analisis"] += max(0.0, time.perf_counter() - inicio - texto)
+        tiempos["texto"] += texto
+    inicio = time.perf_counter()
+    normalizar_esquema(armar_filas(columnas, 1, "ENTIDAD", "PLAN"), formato_fecha="%d/%m/%Y")
+    tiempos["normalizacion"] = time.perf_counter() - inicio
+    return tiempos
+
+
+def medir_escenario(escenario, directorio, filas, archivos, repeticiones, motor, workers):
+    familia = GENERADORES[escenario][0]
+    inicio = time.perf_counter()
+    rutas = generar(escenario, directorio, filas, archivos)
+    generacion = time.perf_counter() - inicio
+    entradas = [ArchivoLocal(ruta) for ruta in rutas]
+    opciones = {"motor": motor, "max_workers": workers} if familia in FAMILIAS_PDF else {}
+    procesar = lambda **extra: FAMILIAS[familia](entradas, 1, "ENTIDAD", "PLAN", **{**opciones, **extra})
+
+    df, segundos = _cronometrar(procesar, repeticiones)
+    if familia in FAMILIAS_PDF:
+        etapas = etapas_pdf(familia, entradas, motor)
+        # Los procesos hijos no los ve tracemalloc; la memoria se mide sin pool.
+        pico = _pico_mb(lambda: procesar(max_workers=1))
+    else:
+        etapas = etapas_layout(familia, entradas)
+        pico = _pico_mb(procesar)
+    return {
+        "escenario": escenario,
+        "familia": familia,
+        "archivos": len(rutas),
+        "bytes": sum(os.path.getsize(r) for r in rutas),
+        "filas_entrada": filas,
+        "filas_salida": len(df),
+        "segundos": round(segundos, 4),
+        "filas_por_segundo": round(len(df) / segundos) if segundos else None,
+        "etapas": {k: round(v, 4) for k, v in etapas.items()},
+        "pico_mb": round(pico, 2),
+        "generacion_segundos": round(generacion, 2),
+    }
+
+
+def _version_git():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(actual, base, tolerancia):
+    """Imprime el cambio de tiempo y memoria contra ``base`` y devuelve los escenarios más lentos que la tolerancia."""
+    anteriores = {r["escenario"]: r for r in base["resultados"]}
+    regresiones = []
+    print(f"\nComparación contra {base.get('commit') or '?'} ({base.get('fecha', '?')}):")
+    for r in actual["resultados"]:
+        anterior = anteriores.get(r["escenario"])
+        if anterior is None:
+            continue
+        cambio = r["segundos"] / anterior["segundos"] - 1 if anterior["segundos"] else 0.0
+        memoria = r["pico_mb"] / anterior["pico_mb"] - 1 if anterior["pico_mb"] else 0.0
+        marca = "  REGRESIÓN" if cambio > tolerancia else ""
+        print(f"{r['escenario']:>22}: {anterior['segundos']:8.3f} s -> {r['segundos']:8.3f} s ({cambio:+7.1%})  memoria {memoria:+7.1%}{marca}")
+        if cambio > tolerancia:
+            regresiones.append(r["escenario"])
+    return regresiones
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--escenario", action="append", choices=GENERADORES, help="Escenario a medir (por defecto todos)")
+    parser.add_argument("--filas", type=int, default=10_000, help="Filas por escenario")
+    parser.add_argument("--archivos", type=int, default=4, help="Archivos entre los que se reparten las filas")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--motor", choices=MOTORES_TEXTO, default=MOTOR_POR_DEFECTO, help="Motor de texto para los PDF")
+    parser.add_argument("--workers", type=int, default=1, help="Procesos para los PDF (1 = sin pool, más estable entre corridas)")
+    parser.add_argument("-o", "--salida", default="resultados_benchmark.json")
+    parser.add_argument("--comparar", help="JSON de una corrida anterior contra el que comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.10, help="Aumento de tiempo que se reporta como regresión")
+    args = parser.parse_args(argv)
+
+    resultados = []
+    with tempfile.TemporaryDirectory() as directorio:
+        for escenario in args.escenario or GENERADORES:
+            r = medir_escenario(escenario, directorio, args.filas, args.archivos, args.repeticiones, args.motor, args.workers)
+            etapas = "  ".join(f"{k} {v:.3f}" for k, v in r["etapas"].items())
+            print(f"{escenario:>22}: {r['segundos']:8.3f} s  {r['filas_salida']:>8} filas  pico {r['pico_mb']:8.1f} MB  [{etapas}]")
+            resultados.append(r)
+
+    actual = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "commit": _version_git(),
+        "version_parser": VERSION_PARSER,
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "parametros": {"filas": args.filas, "archivos": args.archivos, "repeticiones": args.repeticiones, "motor": args.motor, "workers": args.workers},
+        "resultados": resultados,
+    }
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(actual, f, ensure_ascii=False, indent=2)
+    print(f"Resultados en {args.salida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            regresiones = comparar(actual, json.load(f), args.tolerancia)
+        return 1 if regresiones else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,17 @@
 # --- 1. IMPORTACIÓN DE LIBRERÍAS ---
 import streamlit as st
 import pandas as pd
-import numpy as np
-import re
-import os
-from io import BytesIO
-import pdfplumber
-from PIL import Image
+from lector_cartera.almacen import AlmacenCartera
+from lector_cartera.archivos import ArchivoEnMemoria, expandir_zip
+from lector_cartera.avisos import registrar_manejador
+from lector_cartera.clasificar import candidatas, clasificar
+from lector_cartera.conciliacion import cargar_cartera, conciliar, resumen_conciliacion
+from lector_cartera.entidades import RUTA_CLIENTES, Catalogo, cargar_catalogo
+from lector_cartera.esquema import COLUMNAS_TOTALES, dias, totales
+from lector_cartera.exportar import FORMATOS, exportar, formatos_disponibles, nombre_reporte
+from lector_cartera.instrumentacion import a_jsonl, capturar, contexto, resumen
+from lector_cartera.procesadores import FAMILIAS, funcion_procesamiento
+from lector_cartera.trabajos import CANCELADO, EN_COLA, ENTIDADES_VARIAS, FALLIDO, ColaTrabajos, Grupo
 
 # --- 2. CONFIGURACIÓN INICIAL DE LA PÁGINA ---
 st.set_page_config(
@@ -55,460 +60,174 @@ st.markdown(f"""
 """, unsafe_allow_html=True)
 
 # --- 3. CARGA DE DATOS INICIALES ---
-@st.cache_data
-def charger_entidades():
+# El catálogo compilado se comparte entre sesiones; sus índices llenan los selectores sin filtrar el DataFrame.
+@st.cache_resource(max_entries=1)
+def charger_entidades(modificado, tamano):
+    # La llave es la fecha y el tamaño del Excel: si el archivo cambia, el catálogo se vuelve a cargar.
     try:
-        entidades = pd.read_excel("lista_de_clientes.xlsx", sheet_name="Base Clientes")
-        entidades.columns = entidades.columns.str.strip()
-        return entidades
+        return cargar_catalogo()
     except FileNotFoundError:
         st.error("Error: El archivo 'lista_de_clientes.xlsx' no se encontró. Asegúrate de que esté en la misma carpeta.")
-        return pd.DataFrame()
+        return Catalogo(pd.DataFrame())
     except Exception as e:
         st.error(f"Error al leer el archivo de clientes: {e}")
-        return pd.DataFrame()
+        return Catalogo(pd.DataFrame())
 
-df_entidades = charger_entidades()
+def estado_clientes():
+    try:
+        estado = RUTA_CLIENTES.stat()
+    except OSError:
+        return None, None
+    return estado.st_mtime_ns, estado.st_size
 
-# --- 4. DEFINICIÓN DE FUNCIONES DE PROCESAMIENTO POR ENTIDAD ---
-def procesar_axa(archivos, nit, selection_entidad, plan_entidad):
-    data = []
-    for archivo in archivos:
-        df = pd.read_excel(archivo)
-        
-        columnas_originales = ["Fecha de Pago", "N° Factura", "Valor Pagado Antes de Imp.", "Valor Pagado Despues de Imp."]
-        columnas_alt = ["No. FACTURA", "FECHA DE PAGO", "VALOR PAGADO DESPUES DE IMPUESTO ", "VALOR PAGADO ANTES DE IMPUESTO "]
-        columnas_alternativas = ["FECHA_PAGO", "N° Factura", "Valor Pagado Antes de Imp.", "Valor Pagado Despues de Imp.", "RTE_FUENTE", "RETE_ICA", "RETE_IVA"]
-        
-        if all(col in df.columns for col in columnas_originales):
-            df = df[columnas_originales]
-            df["Retención"] = df["Valor Pagado Antes de Imp."] - df["Valor Pagado Despues de Imp."]
-            df["Rete. Servicios"] = round(df["Valor Pagado Antes de Imp."] * 0.02)
-            df["ICA"] = df["Retención"] - df["Rete. Servicios"]
-            df["IVA"] = 0
-            df["VR. FACTURA"] = df["Valor Pagado Antes de Imp."]
-            df["VR. BRUTO"] = df["Valor Pagado Antes de Imp."]
-            df["DIFERENCIA"] = df["VR. FACTURA"] - df["VR. BRUTO"]
-            
-        elif all(col in df.columns for col in columnas_alt):
-            df = df[columnas_alt].rename(columns={
-                "FECHA DE PAGO": "Fecha de Pago",
-                "No. FACTURA": "N° Factura",
-                "VALOR PAGADO DESPUES DE IMPUESTO ": "Valor Pagado Despues de Imp.",
-                "VALOR PAGADO ANTES DE IMPUESTO ":"Valor Pagado Antes de Imp."
-            })
-            df["Retención"] = df["Valor Pagado Antes de Imp."] - df["Valor Pagado Despues de Imp."]
-            df["Rete. Servicios"] = round(df["Valor Pagado Antes de Imp."] * 0.02)
-            df["ICA"] = df["Retención"] - df["Rete. Servicios"]
-            df["IVA"] = 0
-            df["VR. FACTURA"] = df["Valor Pagado Antes de Imp."]
-            df["VR. BRUTO"] = df["Valor Pagado Antes de Imp."]
-            df["DIFERENCIA"] = df["VR. FACTURA"] - df["VR. BRUTO"]
-            
-        elif all(col in df.columns for col in columnas_alternativas):
-            df["Retención"] = df["Valor Pagado Antes de Imp."] - df["Valor Pagado Despues de Imp."]
-            df["VR. FACTURA"] = df["Valor Pagado Antes de Imp."]
-            df["VR. BRUTO"] = df["Valor Pagado Antes de Imp."]
-            df["DIFERENCIA"] = df["VR. FACTURA"] - df["VR. BRUTO"]
-            df = df[columnas_alternativas].rename(columns={
-                "FECHA_PAGO": "Fecha de Pago",
-                "RTE_FUENTE":"Rete. Servicios",
-                "RETE_ICA":"ICA",
-                "RETE_IVA":"IVA"
-            })
-        else:
-            st.warning(f"Archivo Excel {archivo.name} no tiene una estructura de columnas reconocida para AXA.")
-            continue
-        
-        df["NIT"] = nit
-        df["PLAN"] = plan_entidad
-        df["ASEGURADORA"] = selection_entidad
-        df["CASO"] = ""
-        df["Archivo"] = archivo.name
-        df["SEDE"] = ""
-        
-        df = df.rename(columns={
-            "Fecha de Pago": "FECHA",
-            "N° Factura": "APLICA A FV",
-            "Rete. Servicios": "(-) RETEF",
-            "ICA":"(-) ICA",
-            "Retención": "SUMA RETENCIONES",
-            "Valor Pagado Despues de Imp.": "VR. RECAUDO"
-        })
-        
-        columnas_ordenadas=["SEDE","FECHA", "NIT", "ASEGURADORA", "PLAN", "CASO", "APLICA A FV", "VR. FACTURA", "VR. BRUTO", "(-) RETEF", "(-) ICA", "IVA", "SUMA RETENCIONES", "VR. RECAUDO", "DIFERENCIA","Archivo"]
-        df = df.reindex(columns=columnas_ordenadas, fill_value="")
-        data.append(df)
-    return pd.concat(data, ignore_index=True) if data else pd.DataFrame()
-
-def procesar_adres(archivos, nit, selection_entidad, plan_entidad):
-    data = []
-    for archivo in archivos:
-        adres = pd.read_excel(archivo, sheet_name="Hoja1",header=5)
-        adres = adres.drop(columns=[col for col in adres.columns if "Unnamed" in col], errors='ignore')
-        adres= adres[["Numero Paquete", "Factura", "Valor Reclamado", "Valor aprobado", "Valor glosado","Servicios médicos", "Honorarios", "Compras"]]
-        adres["Retencion"] = (adres["Servicios médicos"]*0.02) + (adres["Honorarios"]*0.11) + (adres["Compras"] * 0.025)
-        adres["Neto"] = adres["Valor aprobado"] - adres["Retencion"]
-        
-        adres["NIT"] = nit
-        adres["PLAN"] = plan_entidad
-        adres["ASEGURADORA"] = selection_entidad
-        adres["FECHA"] = ""
-        adres["CASO"] = ""
-        adres["(-) RETEF"] = 0
-        adres["(-) ICA"] = 0
-        adres["IVA"] = 0
-        adres["Archivo"] = archivo.name
-        adres["SEDE"] = ""
-        adres["DIFERENCIA"] = adres["Valor Reclamado"] - adres["Valor aprobado"]
-        
-        adres=adres.rename(columns={
-            "Factura": "APLICA A FV",
-            "Valor Reclamado": "VR. FACTURA",
-            "Valor aprobado": "VR. BRUTO",
-            "Retencion": "SUMA RETENCIONES",
-            "Neto": "VR. RECAUDADO"
-        })
-        
-        columnas_ordenadas =["SEDE","FECHA", "NIT", "ASEGURADORA", "PLAN", "CASO", "APLICA A FV", "VR. FACTURA", "VR. BRUTO", "(-) RETEF", "(-) ICA", "IVA", "SUMA RETENCIONES", "VR. RECAUDADO", "DIFERENCIA", "Archivo"]
-        adres = adres.reindex(columns=columnas_ordenadas, fill_value="")
-        data.append(adres)
-    return pd.concat(data, ignore_index=True)
-
-def procesar_previsora(archivos, nit,selection_entidad, plan_entidad):
-    data = []
-    for archivo in archivos:
-        df_init = pd.read_excel(archivo, header = None, nrows=10)
-        
-        if (df_init == "RECLAMANTE:").any().any():
-            df = pd.read_excel(archivo, header=4)
-            fecha_transferencia = df.loc[df['RECLAMANTE:'] == "FECHA DE TRANSFERENCIA O DE CHEQUE:", df.columns[1]].values[0]
-            df["fecha_transferencia"] = pd.NA
-            df.at[3, "fecha_transferencia"] = "FECHA TRANSFERENCIA"
-            df.loc[4:, "fecha_transferencia"] = fecha_transferencia
-            df.columns = df.iloc[3]
-            df = df.iloc[4:].reset_index(drop=True)
-            df = df[["FECHA TRANSFERENCIA","N°. Doc. de cobro", " Valor Reclamado", "Valor pagado", "Valor Objetado", "I.V.A.", "Retención en la fuente", "I.C.A. - ImP. Ind y Ccio"]]
-            df.dropna(inplace= True)
-            
-            df["NIT"] = nit
-            df["PLAN"] = plan_entidad
-            df["ASEGURADORA"] = selection_entidad
-            df["CASO"] = ""
-            df["Archivo"] = archivo.name
-            df["SUMA RETENCIONES"] = df["Retención en la fuente"] + df["I.C.A. - ImP. Ind y Ccio"]
-            df["VR. RECAUDADO"] = df["Valor pagado"] - df["SUMA RETENCIONES"]
-            df["SEDE"] = ""
-            df["DIFERENCIA"] = df[" Valor Reclamado"] - df["Valor pagado"]
-            
-            df = df.rename(columns={
-                "FECHA TRANSFERENCIA": "FECHA",
-                "N°. Doc. de cobro":"APLICA A FV",
-                "I.V.A": "IVA",
-                "Retención en la fuente":"(-) RETEF",
-                "I.C.A. - ImP. Ind y Ccio": "(-) ICA",
-                " Valor Reclamado": "VR. FACTURA",
-                "Valor pagado": "VR. BRUTO"
-            })
-        else :
-            df = pd.read_excel(archivo)
-            df = df[["Fecha", "Factura", "Valor_Factura", "Este_Pago", "ImpValorIVA", "ImpValorReteICA", "ImpValorReteFuente"]]
-            
-            df["NIT"] = nit
-            df["PLAN"] = plan_entidad
-            df["ASEGURADORA"] = selection_entidad
-            df["CASO"] = ""
-            df["Archivo"] = archivo.name
-            df["SUMA RETENCIONES"] = df["ImpValorReteFuente"] + df["ImpValorReteICA"]
-            df["VR. RECAUDADO"] = df["Este_Pago"] - df["SUMA RETENCIONES"]
-            df["SEDE"] = ""
-            df["DIFERENCIA"] = df["Valor_Factura"] - df["Este_Pago"]
-            
-            df =df.rename(columns={
-                "Fecha":"FECHA",
-                "Factura": "APLICA A FV",
-                "ImpValorIVA": "IVA",
-                "ImpValorReteICA": "(-) ICA",
-                "ImpValorReteFuente": "(-) RETEF",
-                "Este_Pago": "VR. BRUTO",
-                "Valor_Factura": "VR. FACTURA"
-            })
-            
-        columnas_ordenadas =["SEDE","FECHA", "NIT", "ASEGURADORA", "PLAN", "CASO", "APLICA A FV", "VR. FACTURA", "VR. BRUTO", "(-) RETEF", "(-) ICA", "IVA", "SUMA RETENCIONES", "VR. RECAUDADO", "DIFERENCIA", "Archivo"]
-        df = df.reindex(columns=columnas_ordenadas, fill_value="")
-        data.append(df)
-    return pd.concat(data, ignore_index=True)
-
-def procesar_mundial(archivos, nit, selection_entidad, plan_entidad):
-    data = []
-    for archivo in archivos:
-        df = pd.read_excel(archivo, header=5)
-        df = df[["FECHA PAGO", "FACTURA", "VALOR RECLAMADO", "VALOR APROBADO", "Rete-Fuente", "ICA"]]
-        df["SUMA RETENCIONES"] = df["Rete-Fuente"] + df["ICA"]
-        df["VR. RECAUDADO"] = df["VALOR APROBADO"] - df["SUMA RETENCIONES"]
-        df["NIT"] = nit
-        df["PLAN"] = plan_entidad
-        df["ASEGURADORA"] = selection_entidad
-        df["CASO"] = ""
-        df["Archivo"] = archivo.name
-        df["IVA"] = 0
-        df["SEDE"] = ""
-        df["DIFERENCIA"] = df["VALOR RECLAMADO"] - df["VALOR APROBADO"]
-        df = df.rename(columns={
-            "FECHA PAGO": "FECHA",
-            "FACTURA":"APLICA A FV",
-            "VALOR RECLAMADO":"VR. FACTURA",
-            "VALOR APROBADO":"VR. BRUTO",
-            "Rete-Fuente":"(-) RETEF",
-            "ICA": "(-) ICA",
-            })
-        columnas_ordenadas=["SEDE", "FECHA", "NIT", "ASEGURADORA", "PLAN", "CASO", "APLICA A FV", "VR. FACTURA", "VR. BRUTO", "(-) RETEF", "(-) ICA", "IVA", "SUMA RETENCIONES", "VR. RECAUDADO", "DIFERENCIA", "Archivo"]
-        df = df.reindex(columns=columnas_ordenadas, fill_value="")
-        data.append(df)
-    return pd.concat(data, ignore_index=True)
-
-def procesar_sura(archivos, nit, selection_entidad, plan_entidad):
-    data = []
-    columns_requires= ["Factura", "Fecha Consignacion", "Vlr Factura", "Vlr Orden de Pago", "RteFete", "RteICA", "RteIVA", "Vlr Consignado"]
-    column_name_mapping = {
-            "Fecha Consignacion":"FECHA",
-            "Factura":"APLICA A FV",
-            "Vlr Factura":"VR. FACTURA",
-            "RteFete": "(-) RETEF",
-            "RteICA": "(-) ICA",
-            "RteIVA":"IVA",
-            "Vlr Consignado":"VR. RECAUDADO"
-        }
-    for archivo in archivos:
-        if archivo.name.lower().endswith("csv"):
-            df = pd.read_csv(archivo, encoding='latin-1', sep=";", header=1, index_col=False)
-        else: 
-            archivo.seek(0)
-            df = pd.read_excel(archivo, header=None)
-            header_row = None
-            for idx, row in df.iterrows():
-                clean_row= [str(cell).strip().lower() for cell in row.fillna('')]
-                if 'expediente' in clean_row:
-                    header_row = idx
-                    break
-            if header_row is None:
-                header_row = df.dropna(how='all').index[0]
-            archivo.seek(0)
-            df = pd.read_excel(archivo, header=header_row)
-        df.columns = df.columns.astype(str).str.strip()
-        missing_cols = [col for col in columns_requires if col not in df.columns]
-        if missing_cols:
-            st.error(f"Archivo {archivo.name}: Faltan columnas: {', '.join(missing_cols)}")
-            st.write("Columnas encontradas:", df.columns.tolist())
-            continue
-        df = df.rename(columns=column_name_mapping)
-        df["SUMA RETENCIONES"] = df["(-) RETEF"].fillna(0) + df["(-) ICA"].fillna(0)
-        df["NIT"] = nit
-        df["PLAN"] = plan_entidad
-        df["ASEGURADORA"] = selection_entidad
-        df["CASO"] = ""
-        df["ARCHIVOS"] = archivo.name
-        df["FECHA"] = pd.to_datetime(df["FECHA"], format="%Y%m%d").dt.date
-        df["VR. BRUTO"] = df["VR. FACTURA"]
-        df["SEDE"] = ""
-        df["DIFERENCIA"] = df["VR. FACTURA"] - df["VR. BRUTO"]
-        columnas_ordenadas = ["SEDE","FECHA", "NIT", "ASEGURADORA", "PLAN", "CASO", "APLICA A FV", "VR. FACTURA", "VR. BRUTO", "(-) RETEF", "(-) ICA", "IVA", "SUMA RETENCIONES", "VR. RECAUDADO", "DIFERENCIA", "ARCHIVOS"]
-        data.append(df[columnas_ordenadas])
-    return pd.concat(data, ignore_index=True) if data else pd.DataFrame()
-
-def procesar_liberty(archivos, nit, selection_entidad, plan_entidad):
-    data = []
-    for archivo in archivos:
-        nombre_archivo = archivo.name
-        if nombre_archivo.lower().endswith(('.xls', '.xlsx')):
-            df = pd.read_excel(archivo)
-        elif nombre_archivo.lower().endswith('.csv'):
-            df = pd.read_csv(archivo)
-        else:
-            continue
-        if nombre_archivo.lower().endswith('.csv'):
-            rename_columns = {"Fecha_Pago": "FECHA GIRO", "No_Factura": "NRO FACTURA", "Valor_Pagado": "VALOR PAGADO", "Valor_Ret":"VALOR RETEFUENTE", "Valor_Base":"VALOR LIQUIDADO"}
-        else:
-            rename_columns = {"FECHA GIRO": "FECHA GIRO" ,"NRO FACTURA": "NRO FACTURA", "VALOR LIQUIDADO": "VALOR LIQUIDADO", "VALOR RETEFUENTE":"VALOR RETEFUENTE", "VALOR PAGADO" : "VALOR PAGADO"}
-        df.rename(columns=rename_columns, inplace=True)
-        df["NIT"] = nit
-        df["PLAN"] = plan_entidad
-        df["ASEGURADORA"] = selection_entidad
-        df["CASO"] = ""
-        df["VR. BRUTO"] = df["VALOR LIQUIDADO"]
-        df["IVA"] = 0
-        df["(-) ICA"] = 0
-        df["SUMA RETENCIONES"] = df["VALOR RETEFUENTE"] + df["(-) ICA"]
-        df["ARCHIVO"] = archivo.name
-        df["SEDE"] = ""
-        df["DIFERENCIA"] = df["VALOR LIQUIDADO"] - df["VR. BRUTO"]
-        df = df.rename(columns={
-            "FECHA GIRO": "FECHA",
-            "NRO FACTURA":"APLICA A FV",
-            "VALOR LIQUIDADO":"VR. FACTURA",
-            "VALOR RETEFUENTE":"(-) RETEF",
-            "VALOR PAGADO":"VR. RECAUDADO"
-        })
-        columnas_ordenadas = ["SEDE","FECHA", "NIT", "ASEGURADORA", "PLAN", "CASO", "APLICA A FV", "VR. FACTURA", "VR. BRUTO", "(-) RETEF", "(-) ICA", "IVA", "SUMA RETENCIONES", "VR. RECAUDADO", "DIFERENCIA","ARCHIVO"]
-        df = df.reindex(columns=columnas_ordenadas, fill_value="")
-        data.append(df)
-    return pd.concat(data, ignore_index=True)
-
-def procesar_bolivar(archivos, nit, selection_entidad, plan_entidad):
-    data = []
-    for archivo in archivos:
-        nombre_archivo = archivo.name
-        if nombre_archivo.lower().endswith(('.xls', '.xlsx')):
-            df = pd.read_excel(archivo)
-        elif nombre_archivo.lower().endswith('.csv'):
-            df = pd.read_csv(archivo, encoding='latin-1', sep=";")
-            df["Valor pago"] = (df["Valor pago"].astype(str).str.replace("$", "", regex=False).str.replace(",", "", regex=False).astype(float).round(0).astype(int))
-            split_data = df["Detalles"].str.split(n=1, expand=True)
-            df["Detalle"] = split_data[0]
-        else:
-            continue
-        if nombre_archivo.lower().endswith('.csv'):
-            columnas = ["Fecha de Pago", "Rte. ICA", "Rte Fuente", "Valor pago", "Detalle"]
-        else:
-            columnas = ["Fecha de Pago", "Detalle", "Rte. ICA", "Rte Fuente", "Valor pago"]
-        df = df[columnas]
-        df["NIT"]=nit
-        df["PLAN"]=plan_entidad
-        df["ASEGURADORA"] =selection_entidad
-        df["CASO"] = ""
-        df["VR. FACTURA"] = 0
-        df["IVA"] = 0
-        df["ARCHIVO"] = archivo.name
-        df["VR. BRUTO"] = df["Valor pago"] / 0.98
-        df["(-) RETEF"] = round(df["VR. BRUTO"] * 0.02)
-        df["SUMA RETENCIONES"] = df["(-) RETEF"] + df["Rte. ICA"]
-        df["SEDE"] = ""
-        df["DIFERENCIA"] = df["VR. FACTURA"] - df["VR. BRUTO"]
-        df = df.rename(columns={
-            "Fecha de Pago":"FECHA",
-            "Detalle":"APLICA A FV",
-            "Valor pago":"VR. RECAUDADO",
-            "Rte. ICA":"(-) ICA",
-        })
-        columnas_ordenadas=["SEDE","FECHA", "NIT", "ASEGURADORA", "PLAN","CASO", "APLICA A FV", "VR. FACTURA","VR. BRUTO", "(-) RETEF", "(-) ICA", "IVA", "SUMA RETENCIONES", "VR. RECAUDADO", "DIFERENCIA", "ARCHIVO"]
-        df = df.reindex(columns=columnas_ordenadas, fill_value="")
-        data.append(df)
-    return pd.concat(data, ignore_index=True)
-
-def procesar_nueva_eps(archivos, nit, selection_entidad, plan_entidad):
-    data = []
-    for archivo in archivos:
-        df = pd.read_excel(archivo)
-        df = df[["Fecha Legalización", "Número Factura", "Valor Aplicación"]]
-        df["NIT"] = nit
-        df["PLAN"] = plan_entidad
-        df["ASEGURADORA"] = selection_entidad
-        df["CASO"] = ""
-        df["(-) RETEF"] = df["Valor Aplicación"] * 0.02
-    return pd.DataFrame(data)
-
-def procesar_seg_estado(archivos, nit, selection_entidad, plan_entidad):
-    data = []
-    for pdf_file in archivos:
-        try:
-            with pdfplumber.open(pdf_file) as pdf:
-                total_text = ""
-                for i, pagina in enumerate(pdf.pages[:2]):
-                    text = pagina.extract_text() or ""
-                    total_text += f"\n{text}"
-                    if i == 0 and not re.search(r"www\.sis\.co[\.,]", text, re.IGNORECASE):
-                        break
-                facturas = []
-                if re.search(r"www\.sis\.co[\.,]", total_text, re.IGNORECASE):
-                    fecha_doc = None
-                    fecha = r"""(?:Bogotá, D\.C\.,\s*)?(\d{1,2}\s+de\s+[a-z]+\s+de\s+\d{4})|(Fecha\s*[^:]*:\s*(\d{2}-\d{2}-\d{4}))|(\b\d{1,2}[/-]\d{1,2}[/-]\d{4}\b)"""
-                    match_fecha = re.search(fecha, total_text, re.IGNORECASE | re.VERBOSE)
-                    if match_fecha:
-                        try:
-                            if match_fecha.group(1):
-                                day, month, year = re.match(r"(\d{1,2})\s+de\s+(\w+)\s+de\s+(\d{4})", match_fecha.group(1)).groups()
-                                meses = {'enero': '01', 'febrero': '02', 'marzo': '03', 'abril': '04', 'mayo': '05', 'junio': '06', 'julio': '07', 'agosto': '08', 'septiembre': '09', 'octubre': '10', 'noviembre': '11', 'diciembre': '12'}
-                                fecha_doc = f"{day.zfill(2)}/{meses[month.lower()]}/{year}"
-                            elif match_fecha.group(3):
-                                day, month, year = match_fecha.group(3).split('-')
-                                fecha_doc = f"{day}/{month}/{year}"
-                            elif match_fecha.group(4):
-                                separador = '/' if '/' in match_fecha.group(4) else '-'
-                                day, month, year = match_fecha.group(4).split(separador)
-                                fecha_doc = f"{day}/{month}/{year}"
-                        except Exception as e:
-                            print(f"Error procesando fecha : {str(e)}")
-                    matches = re.findall(r"(\d{5,8})\s+\$\s*([\d.,]+)\s+\$\s*([\d.,]+)", total_text)
-                    for match in matches:
-                        try:
-                            valor_bruto = float(match[1].replace(".", "").replace(",", "."))
-                            valor_neto = float(match[2].replace(".", "").replace(",", "."))
-                            facturas.append({
-                                "SEDE": "", "FECHA": fecha_doc, "NIT":nit, "ASEGURADORA": selection_entidad, "PLAN": plan_entidad, "CASO": "", "APLICA FV": match[0], "VR. FACTURA": 0, "VR. BRUTO":valor_bruto, "(-) RETEF": round(valor_bruto * 0.02, 2), "(-) ICA":round(valor_bruto * 0.0066), "IVA": 0, "SUMA RETENCIONES":round((valor_bruto *0.02) + (valor_bruto * 0.0066)), "VR. RECAUDADO": valor_neto, "DIFERENCIA": 0 - valor_bruto, "Archivo": pdf_file.name
-                            })
-                        except Exception as e:
-                            print(f"Error en factura {match}: {str(e)}")
-                    data.extend(facturas)
-        except Exception as e:
-            print(f"Error procesando {pdf_file.name}: {str(e)}")
-            continue
-    return pd.DataFrame(data) if data else pd.DataFrame()
-
-def procesar_equidad(archivos, nit, selection_entidad, plan_entidad):
-    data = []
-    for pdf_file in archivos:
-        try:
-            with pdfplumber.open(pdf_file) as pdf:
-                total_text = "\n".join([page.extract_text() or "" for page in pdf.pages])
-                fecha_match = re.search(r"Fecha:\s*(\d{2}\.\d{2}\.\d{4})", total_text)
-                fecha = fecha_match.group(1).replace(".", "/") if fecha_match else "Fecha no Econtrada"
-                patron_facturas = r"""(\d{10})\D+(\d{4})\D+(\w{2})\D+(\d+)\D+(\d+)\D+(\d+)\D+(\S+)\D+(\d+)\D+([-\d.,]+)"""
-                facturas = re.findall(patron_facturas, total_text, re.VERBOSE)
-                for factura in facturas:
-                    try:
-                        neto_str= factura[8].replace(".","").replace(",", ".").replace("-", "")
-                        neto_pagar = float(neto_str)
-                        bruto = neto_pagar / 0.98 if 0.98 !=0 else 0
-                        data.append({
-                            "SEDE": "", "FECHA": fecha, "NIT": nit, "ASEGURADORA":selection_entidad, "PLAN": plan_entidad, "CASO":"", "APLICA FV": factura[7], "VR. FACTURA": 0, "VR. BRUTO": bruto, "(-) RETEF": round(bruto * 0.02), "(-) ICA":0, "IVA": 0, "SUMA RETENCIONES": round(bruto * 0.02), "VR. RECAUDADO": neto_pagar, "DIFERENCIA": 0 - bruto, "Archivo": pdf_file.name
-                        })
-                    except Exception as e:
-                        print(f"Error procesando factura {factura}: {str(e)}")
-        except Exception as e:
-            print(f"Error procesando {pdf_file.name}: {str(e)}")
-    return pd.DataFrame(data) if data else pd.DataFrame()
-
-# --- 6. DICCIONARIO DE MAPEADO ---
-funcion_procesamiento = {
-    "AXA COLPATRIA SEGUROS SA": procesar_axa,
-    "AXA COLPATRIA SEGUROS DE VIDA SA": procesar_axa,
-    "AXA COLPATRIA MEDICINA PREPAGADA": procesar_axa,
-    "ADMINISTRADORA DE LOS RECURSOS DEL SISTEMA GENERAL DE SEGURIDAD SOCIAL EN SALUD - ADRES":procesar_adres,
-    "LA PREVISORA SA COMPAÑÍA DE SEGUROS":procesar_previsora,
-    "FIDEICOMISOS PATRIMONIOS AUTÓNOMOS FIDUCIARIA LA PREVISORA S.A.": procesar_previsora,
-    "LA PREVISORA S A COMPANIA DE SEGURO": procesar_previsora,
-    "COMPAÑIA MUNDIAL DE SEGUROS SA": procesar_mundial,
-    "SEGUROS GENERALES SURAMERICANA SA": procesar_sura,
-    "EPS SURAMERICANA SA": procesar_sura,
-    "EPS Y MEDICINA PREPAGADA SURAMETICANA S A":procesar_sura,
-    "SEGUROS DE VIDA SURAMERICANA SA": procesar_sura,
-    "LIBERTY SEGUROS SA": procesar_liberty,
-    "LIBERTY SEGUROS DE VIDA SA": procesar_liberty,
-    "SEGUROS COMERCIALES BOLIVAR": procesar_bolivar,
-    "ARL SEGUROS BOLIVAR":procesar_bolivar,
-    "SEGUROS DEL ESTADO SA":procesar_seg_estado,
-    "SEGUROS DE VIDA DEL ESTADO S A":procesar_seg_estado,
-    "LA EQUIDAD SEGUROS GENERALES":procesar_equidad,
-    "LA EQUIDAD SEGUROS DE VIDA ORGANISMO CORPORATIVO": procesar_equidad
-}
-
-# --- 7. CONSTRUCCIÓN DE LA INTERFAZ DE USUARIO (UI) ---
+catalogo = charger_entidades(*estado_clientes())
+
+# --- 4. AVISOS DE LOS PROCESADORES ---
+# Las funciones de procesamiento viven en lector_cartera.procesadores; sus avisos se muestran en pantalla.
+def mostrar_aviso(mensaje, nivel):
+    if nivel == "error":
+        st.error(mensaje)
+    else:
+        st.warning(mensaje)
+
+registrar_manejador(mostrar_aviso)
+
+# --- 5. TRABAJOS EN SEGUNDO PLANO ---
+# Los lotes se procesan en una cola compartida por todas las sesiones. La sesión guarda
+# el identificador del trabajo por conjunto de archivos y entidad, y la URL guarda el
+# último, así que los reruns o recargar la página no obligan a procesar el lote otra vez.
+MAX_REPORTES = 3
+FILAS_REPORTE_GRANDE = 100_000
+# Filas que se envían al navegador por página; el lote completo solo sale en la descarga.
+FILAS_POR_PAGINA = 1_000
+SEGUNDOS_ENTRE_VISTAS = 1.0
+COLUMNAS_DETALLE = ["ARCHIVO", "FILAS", "SEGUNDOS", "ORIGEN"]
+COLUMNAS_ERRORES = ["archivo", "procesador", "etapa", "error"]
+
+@st.cache_resource
+def cola_trabajos():
+    return ColaTrabajos()
+
+cola = cola_trabajos()
+st.session_state.setdefault("trabajos", {})
+st.session_state.setdefault("reportes", {})
+st.session_state.setdefault("celebrados", set())
+
+@st.cache_data(show_spinner=False, max_entries=2000)
+def familia_archivo(nombre, contenido):
+    return clasificar(ArchivoEnMemoria(nombre, contenido))
+
+def llave_trabajo(archivos, selection_entidad, plan_entidad):
+    return (tuple((a.name, a.size) for a in archivos), selection_entidad, plan_entidad)
+
+def detalle_trabajo(trabajo):
+    return pd.DataFrame(trabajo.detalle, columns=COLUMNAS_DETALLE).astype({"SEGUNDOS": "float64"})
+
+def guardados_trabajo(trabajo):
+    # Reportes y conciliaciones ya calculados, para los últimos MAX_REPORTES trabajos.
+    reportes = st.session_state.reportes
+    if trabajo.id not in reportes:
+        reportes[trabajo.id] = {}
+        while len(reportes) > MAX_REPORTES:
+            reportes.pop(next(iter(reportes)))
+    return reportes[trabajo.id]
+
+@st.cache_resource(show_spinner="Leyendo la cartera...", max_entries=4)
+def cartera_cargada(nombre, contenido):
+    # La tabla indexada también queda en la caché en disco; aquí se evita leerla en cada rerun.
+    return cargar_cartera(ArchivoEnMemoria(nombre, contenido))
+
+def resultado_conciliado(trabajo, cartera, llave_cartera):
+    guardados = guardados_trabajo(trabajo)
+    if ("conciliacion", llave_cartera) not in guardados:
+        with capturar(trabajo.registro), contexto(trabajo=trabajo.id):
+            guardados[("conciliacion", llave_cartera)] = conciliar(trabajo.resultado, cartera)
+    return guardados[("conciliacion", llave_cartera)]
+
+def reporte_trabajo(trabajo, formato, df, llave_cartera=None):
+    # Los bytes del reporte se generan una sola vez por trabajo, formato y cartera.
+    guardados = guardados_trabajo(trabajo)
+    if (formato, llave_cartera) not in guardados:
+        with st.spinner("Generando el reporte..."), capturar(trabajo.registro), contexto(trabajo=trabajo.id):
+            # Un trabajo con varias entidades sale con una hoja por aseguradora.
+            separar_por = "ASEGURADORA" if len(trabajo.grupos) > 1 else None
+            guardados[(formato, llave_cartera)] = exportar(df, formato, separar_por)
+    return guardados[(formato, llave_cartera)]
+
+def totales_trabajo(trabajo, df, llave_cartera=None):
+    # Los totales por archivo y por fecha se calculan una vez por trabajo y cartera; los reruns solo los muestran.
+    guardados = guardados_trabajo(trabajo)
+    if ("totales", llave_cartera) not in guardados:
+        por_fecha = totales(df, dias(df)).sort_values("FECHA", ignore_index=True)
+        guardados[("totales", llave_cartera)] = (totales(df, "ARCHIVO"), por_fecha)
+    return guardados[("totales", llave_cartera)]
+
+def primera_pagina():
+    st.session_state.pagina_resultados = 1
+
+def filas_por_pagina(df):
+    # Se filtra en el servidor y al navegador llega solo la página pedida.
+    filtros = st.columns(3 if "CONCILIACION" in df.columns else 2)
+    archivo = filtros[0].selectbox("Archivo", [None, *df["ARCHIVO"].astype("category").cat.categories], format_func=lambda a: "Todos" if a is None else a, key="filtro_archivo", on_change=primera_pagina)
+    factura = filtros[1].text_input("Factura contiene", key="filtro_factura", on_change=primera_pagina).strip()
+    estado = None
+    if "CONCILIACION" in df.columns:
+        estado = filtros[2].selectbox("Conciliación", [None, *df["CONCILIACION"].astype("category").cat.categories], format_func=lambda e: "Todas" if e is None else e.capitalize(), key="filtro_conciliacion", on_change=primera_pagina)
+    mascara = None
+    for condicion in (
+        df["ARCHIVO"] == archivo if archivo is not None else None,
+        df["APLICA A FV"].str.contains(factura, case=False, regex=False, na=False) if factura else None,
+        df["CONCILIACION"] == estado if estado is not None else None,
+    ):
+        if condicion is not None:
+            mascara = condicion if mascara is None else mascara & condicion
+    vista = df if mascara is None else df[mascara]
+    paginas = max(1, -(-len(vista) // FILAS_POR_PAGINA))
+    if st.session_state.get("pagina_resultados", 1) > paginas:
+        primera_pagina()
+    pagina = st.number_input(f"Página (de {paginas:,})", min_value=1, max_value=paginas, step=1, key="pagina_resultados") if paginas > 1 else 1
+    inicio = (pagina - 1) * FILAS_POR_PAGINA
+    st.dataframe(vista.iloc[inicio:inicio + FILAS_POR_PAGINA], use_container_width=True)
+    if len(vista):
+        st.caption(f"Filas {inicio + 1:,} a {min(inicio + FILAS_POR_PAGINA, len(vista)):,} de {len(vista):,}. El reporte descargado trae todas las filas.")
+
+def diagnostico_trabajo(trabajo):
+    # Tiempos por etapa del trabajo y los errores que los procesadores dejaron pasar.
+    with st.expander(f"Diagnóstico por etapa ({len(trabajo.eventos)} eventos)"):
+        st.dataframe(resumen(trabajo.eventos), use_container_width=True, hide_index=True)
+        errores = [evento for evento in trabajo.eventos if "error" in evento]
+        if errores:
+            st.dataframe(pd.DataFrame(errores).reindex(columns=COLUMNAS_ERRORES), use_container_width=True, hide_index=True)
+        st.download_button(
+            label="Descargar eventos (JSON lines)",
+            data=a_jsonl(trabajo.eventos),
+            file_name=f"diagnostico_{trabajo.id}.jsonl",
+            mime="application/x-ndjson",
+            key="descargar_diagnostico"
+        )
+
+@st.fragment(run_every=SEGUNDOS_ENTRE_VISTAS)
+def seguimiento_trabajo(id_trabajo):
+    trabajo = cola.obtener(id_trabajo)
+    if trabajo is None or trabajo.terminado:
+        st.rerun()
+    if trabajo.estado == EN_COLA:
+        st.info(f"Trabajo en cola: hay {cola.posicion(id_trabajo)} lotes antes del tuyo.")
+    else:
+        st.progress(trabajo.procesados / max(trabajo.total, 1), text=f"{trabajo.procesados} de {trabajo.total} archivos procesados")
+        parcial = trabajo.resultado_parcial(ultimas=FILAS_POR_PAGINA)
+        if not parcial.empty:
+            st.caption("Últimas filas procesadas")
+            st.dataframe(parcial, use_container_width=True)
+    st.button("Cancelar", key="cancelar_trabajo", on_click=cola.cancelar, args=(id_trabajo,))
+
+# --- 6. CONSTRUCCIÓN DE LA INTERFAZ DE USUARIO (UI) ---
 with st.container():
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
         try:
-            logo = Image.open("LOGO_RED_SLOGM-02.png")
-            st.image(logo, use_container_width=True)
+            # Con la ruta, Streamlit sirve los bytes del PNG sin decodificarlo y volver a codificarlo.
+            st.image("LOGO_RED_SLOGM-02.png", use_container_width=True)
         except FileNotFoundError:
             st.warning("Logo 'LOGO_RED_SLOGM-02.png' no encontrado.")
 
@@ -518,75 +237,181 @@ st.markdown("<p style='text-align: center; color: #AAAAAA;'>Una solución inteli
 with st.container(border=True):
     st.header("1. Configuración del Proceso")
 
-    if not df_entidades.empty:
-        planes_dispo = df_entidades["Plan"].unique().tolist()
-        entidades_dispo = df_entidades["Razon Social"].unique().tolist()
+    modo_auto = st.toggle("Detectar la aseguradora de cada archivo", key="modo_auto", help="Para lotes con archivos de varias aseguradoras: cada archivo se clasifica por su formato y el reporte trae una hoja por aseguradora.")
+    selection_entidad = "Seleccionar..."
+    nit = None
+    plan_entidad = None
 
-        selection_plan = st.selectbox("Selecciona el Plan:", ["Todos"] + planes_dispo, key="select_plan")
+    if catalogo.vacio:
+        st.warning("No se pudieron cargar las entidades. La selección está deshabilitada.")
+    elif modo_auto:
+        st.caption("La entidad de cada formato detectado se elige al cargar los archivos.")
+    else:
+        selection_plan = st.selectbox("Selecciona el Plan:", ["Todos"] + catalogo.planes, key="select_plan")
 
         if selection_plan != "Todos":
-            entidades_filtradas = df_entidades[df_entidades["Plan"] == selection_plan]["Razon Social"].unique().tolist()
+            entidades_filtradas = catalogo.por_plan[selection_plan]
         else:
-            entidades_filtradas = entidades_dispo
+            entidades_filtradas = catalogo.razones
         
         selection_entidad = st.selectbox("Seleccione la Entidad:", ["Seleccionar..."] + entidades_filtradas, key="select_entidad")
 
-        nit = None
-        plan_entidad = None
         if selection_entidad != "Seleccionar...":
-            info_entidad = df_entidades[df_entidades["Razon Social"] == selection_entidad].iloc[0]
-            nit = info_entidad["Nit"]
-            plan_entidad = info_entidad["Plan"]
+            nit, plan_entidad = catalogo.por_razon[selection_entidad]
             st.info(f"**NIT seleccionado:** {nit} | **Plan:** {plan_entidad}")
-    else:
-        st.warning("No se pudieron cargar las entidades. La selección está deshabilitada.")
-        selection_entidad = "Seleccionar..."
 
 with st.container(border=True):
     st.header("2. Carga y Procesamiento")
 
     file_upload = st.file_uploader(
-        "Arrastra o selecciona los archivos a procesar (PDF, XLSX, CSV)",
-        type=["pdf", "xlsx", "csv", "xls"],
+        "Arrastra o selecciona los archivos a procesar (PDF, XLSX, CSV o ZIP)",
+        type=["pdf", "xlsx", "csv", "xls", "zip"],
         accept_multiple_files=True
     )
+    # Cada ZIP se reemplaza por los archivos que contiene; se descomprimen uno a uno al procesarlos.
+    archivos_cargados = expandir_zip(file_upload or [])
+    if len(archivos_cargados) != len(file_upload or []):
+        st.caption(f"{len(archivos_cargados)} archivos en el lote, contando el contenido de los ZIP.")
+    usar_cache = st.checkbox("Reutilizar resultados de archivos ya procesados", value=True, key="usar_cache")
+    # El consolidado se guarda en Parquet; sin pyarrow no se ofrece.
+    consolidar = "parquet" in formatos_disponibles() and st.checkbox("Agregar las filas al consolidado mensual", value=False, key="consolidar", help="Guarda las filas en el consolidado por aseguradora y mes; los archivos que ya estaban no se agregan dos veces.")
+    diagnostico = st.checkbox("Registrar el tiempo de cada etapa", value=False, key="diagnostico", help="Agrega a los resultados un diagnóstico con la duración de cada etapa (lectura, extracción de texto, exportación...) y los errores por archivo.")
 
-    df_final = None
-    
-    if st.button("✨ ¡Iniciar Procesamiento!", key="procesar"):
-        if file_upload and selection_entidad != "Seleccionar..." and selection_entidad in funcion_procesamiento:
-            with st.spinner(f"Analizando y procesando {len(file_upload)} archivos. ¡Un momento!"):
-                df_final = funcion_procesamiento[selection_entidad](file_upload, nit, selection_entidad, plan_entidad)
-            
-            if df_final is not None and not df_final.empty:
-                st.balloons()
-                st.success("¡Proceso completado con éxito!")
-            else:
-                st.warning("El procesamiento finalizó, pero no se generaron datos. Revisa los archivos y la selección.")
+    # En modo automático se arma un grupo por formato detectado, con la entidad que elija el usuario.
+    grupos = []
+    sin_clasificar = []
+    if modo_auto and archivos_cargados and not catalogo.vacio:
+        por_familia = {}
+        with st.spinner("Clasificando archivos..."):
+            for archivo in archivos_cargados:
+                familia = familia_archivo(archivo.name, archivo.getvalue())
+                if familia is None:
+                    sin_clasificar.append(archivo.name)
+                else:
+                    por_familia.setdefault(familia, []).append(archivo)
+        for familia, archivos_familia in por_familia.items():
+            opciones = candidatas(familia, catalogo.razones)
+            if not opciones:
+                st.warning(f"{len(archivos_familia)} archivos tienen el formato {familia}, pero ninguna entidad del catálogo usa ese procesador.")
+                sin_clasificar.extend(a.name for a in archivos_familia)
+                continue
+            entidad = st.selectbox(f"Formato {familia} ({len(archivos_familia)} archivos):", opciones, key=f"entidad_{familia}")
+            nit_familia, plan_familia = catalogo.por_razon[entidad]
+            grupos.append(Grupo(FAMILIAS[familia], archivos_familia, nit_familia, entidad, plan_familia))
+        if sin_clasificar:
+            st.warning(f"No se reconoció el formato de {len(sin_clasificar)} archivos; no se procesarán: {', '.join(sin_clasificar)}")
 
-        elif not file_upload:
+    id_trabajo = None
+    if modo_auto and grupos:
+        llave = llave_trabajo(archivos_cargados, ENTIDADES_VARIAS, tuple(g.selection_entidad for g in grupos))
+        id_trabajo = st.session_state.trabajos.get(llave)
+    elif archivos_cargados and selection_entidad != "Seleccionar...":
+        llave = llave_trabajo(archivos_cargados, selection_entidad, plan_entidad)
+        id_trabajo = st.session_state.trabajos.get(llave)
+
+    if st.button("✨ ¡Iniciar Procesamiento!", key="procesar"):
+        if modo_auto and grupos:
+            id_trabajo = cola.enviar_grupos(grupos, usar_cache=usar_cache, sin_clasificar=sin_clasificar, diagnostico=diagnostico, almacen=AlmacenCartera() if consolidar else None)
+            st.session_state.trabajos[llave] = id_trabajo
+            st.query_params["trabajo"] = id_trabajo
+        elif modo_auto and archivos_cargados:
+            st.error("Ningún archivo tiene un formato reconocido.")
+        elif archivos_cargados and selection_entidad != "Seleccionar..." and selection_entidad in funcion_procesamiento:
+            id_trabajo = cola.enviar(funcion_procesamiento[selection_entidad], archivos_cargados, nit, selection_entidad, plan_entidad, usar_cache=usar_cache, diagnostico=diagnostico, almacen=AlmacenCartera() if consolidar else None)
+            st.session_state.trabajos[llave] = id_trabajo
+            st.query_params["trabajo"] = id_trabajo
+        elif not archivos_cargados:
             st.error("Por favor, carga al menos un archivo.")
         elif selection_entidad == "Seleccionar...":
             st.error("Por favor, selecciona una entidad específica.")
         else:
             st.error(f"No hay una función de procesamiento definida para '{selection_entidad}'.")
 
-if df_final is not None and not df_final.empty:
+    # Al recargar la página se pierden los archivos cargados: si la sesión todavía no envió
+    # ningún lote, se retoma el trabajo de la URL. Con archivos cargados, el de la URL es de
+    # otra selección y se quita, para no mostrar sus resultados como si fueran de esta.
+    retomado = False
+    if id_trabajo is None and archivos_cargados:
+        if "trabajo" in st.query_params:
+            del st.query_params["trabajo"]
+    elif id_trabajo is None and not st.session_state.trabajos:
+        id_trabajo = st.query_params.get("trabajo")
+        retomado = id_trabajo is not None
+    elif id_trabajo is not None and st.query_params.get("trabajo") != id_trabajo:
+        st.query_params["trabajo"] = id_trabajo
+    trabajo = cola.obtener(id_trabajo)
+    if trabajo is not None and retomado:
+        st.info(f"Se muestra un lote anterior retomado desde la URL: {trabajo.selection_entidad}, {trabajo.total} archivos (trabajo {trabajo.id}). Carga archivos para procesar uno nuevo.")
+    if trabajo is not None and not trabajo.terminado:
+        seguimiento_trabajo(trabajo.id)
+    elif trabajo is not None:
+        for mensaje, nivel in trabajo.avisos:
+            mostrar_aviso(mensaje, nivel)
+        if trabajo.sin_clasificar and not sin_clasificar:
+            st.warning(f"Archivos sin formato reconocido que no se procesaron: {', '.join(trabajo.sin_clasificar)}")
+        if trabajo.estado == FALLIDO:
+            st.error(f"El procesamiento falló: {trabajo.error}")
+        elif trabajo.estado == CANCELADO:
+            st.info(f"Trabajo cancelado después de {trabajo.procesados} de {trabajo.total} archivos; se muestra lo ya procesado.")
+        elif trabajo.resultado is None or trabajo.resultado.empty:
+            st.warning("El procesamiento finalizó, pero no se generaron datos. Revisa los archivos y la selección.")
+        else:
+            if trabajo.id not in st.session_state.celebrados:
+                st.session_state.celebrados.add(trabajo.id)
+                st.balloons()
+            st.success("¡Proceso completado con éxito!")
+
+if trabajo is not None and trabajo.terminado and trabajo.resultado is not None and not trabajo.resultado.empty:
+    df_final = trabajo.resultado
     with st.container(border=True):
         st.header("3. Resultados")
-        st.dataframe(df_final, use_container_width=True)
+        st.caption(f"{trabajo.selection_entidad} | {trabajo.total} archivos | trabajo {trabajo.id}")
+        if trabajo.almacenado:
+            st.caption(f"Consolidado: {trabajo.almacenado['archivos']} archivos agregados ({trabajo.almacenado['filas']:,} filas); {trabajo.almacenado['omitidos']} ya estaban.")
+
+        # La cartera es opcional: completa el valor de las facturas y marca los pagos sin factura abierta o repetidos.
+        archivo_cartera = st.file_uploader("Cartera de facturas abiertas para conciliar (opcional)", type=["xlsx", "xls", "csv", "parquet"], key="archivo_cartera")
+        llave_cartera = None
+        if archivo_cartera is not None:
+            try:
+                cartera = cartera_cargada(archivo_cartera.name, archivo_cartera.getvalue())
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                llave_cartera = (archivo_cartera.name, archivo_cartera.size)
+                df_final = resultado_conciliado(trabajo, cartera, llave_cartera)
+                estados = resumen_conciliacion(df_final).query("PAGOS > 0")
+                for columna, estado in zip(st.columns(len(estados)), estados.itertuples(index=False)):
+                    columna.metric(estado.CONCILIACION.capitalize(), f"{estado.PAGOS:,}", help=f"Valor bruto: {estado.VALOR:,.0f}")
+
+        por_archivo, por_fecha = totales_trabajo(trabajo, df_final, llave_cartera)
+        st.caption(" | ".join([f"{len(df_final):,} filas", *(f"{nombre}: {por_archivo[nombre].sum():,.0f}" for nombre in COLUMNAS_TOTALES)]))
+        pestana_archivo, pestana_fecha, pestana_filas = st.tabs(["Totales por archivo", "Totales por fecha", "Filas"])
+        with pestana_archivo:
+            st.dataframe(por_archivo, use_container_width=True, hide_index=True)
+        with pestana_fecha:
+            st.dataframe(por_fecha, use_container_width=True, hide_index=True)
+        with pestana_filas:
+            filas_por_pagina(df_final)
+
+        with st.expander(f"Detalle por archivo ({trabajo.procesados} archivos)"):
+            st.dataframe(detalle_trabajo(trabajo), use_container_width=True, hide_index=True)
+
+        formatos = formatos_disponibles()
+        # Para lotes grandes el Excel es lo más lento de generar; se sugiere un formato columnar.
+        sugerido = "parquet" if len(df_final) >= FILAS_REPORTE_GRANDE and "parquet" in formatos else "xlsx"
+        formato = st.radio("Formato del reporte:", formatos, index=formatos.index(sugerido), format_func=lambda f: FORMATOS[f][1], horizontal=True, key="formato_reporte")
 
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df_final.to_excel(writer, index=False, sheet_name='Procesado')
-        
         st.download_button(
-            label="📥 Descargar Reporte en Excel",
-            data=output.getvalue(),
-            file_name=f'reporte_{selection_entidad.replace(" ", "_")}.xlsx',
-            mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            label=f"📥 Descargar Reporte en {FORMATOS[formato][1]}",
+            data=reporte_trabajo(trabajo, formato, df_final, llave_cartera),
+            file_name=nombre_reporte(trabajo.selection_entidad, formato),
+            mime=FORMATOS[formato][2]
         )
 
-# --- 8. PIE DE PÁGINA ---
+if trabajo is not None and trabajo.terminado and trabajo.eventos:
+    diagnostico_trabajo(trabajo)
+
+# --- 7. PIE DE PÁGINA ---
 st.markdown("---")
 st.markdown("<p style='text-align: center; color: #555555; font-size: 0.8em;'>© Copyright 2025 ValleSalud </p>", unsafe_allow_html=True)
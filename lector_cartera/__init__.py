@@ -0,0 +1 @@
+"""Procesamiento de soportes de pago de cartera de ValleSalud."""
@@ -0,0 +1,5 @@
+import sys
+
+from lector_cartera.cli import main
+
+sys.exit(main())
@@ -0,0 +1,280 @@
+"""Consolidado de cartera en Parquet, particionado por aseguradora y mes de pago.
+
+Cada lote agrega sus filas canónicas en archivos nuevos, uno por partición
+(``ASEGURADORA=<nombre>/MES=<aaaa-mm>/<lote>.parquet``), así que agregar un
+lote no lee ni reescribe lo ya guardado. Cada archivo de origen se reconoce por
+el hash de su contenido, el procesador y la versión del parser: agregar de
+nuevo un archivo que ya está no hace nada, salvo que se pida reemplazarlo, y si
+cambió el procesador o la versión sus filas se reemplazan. Los archivos que no
+producen filas no se registran. Los extractos se arman leyendo solo las
+particiones del filtro. Ejemplo::
+
+    python -m lector_cartera.almacen --resumen
+    python -m lector_cartera.almacen -o consolidado.xlsx --desde 2025-01 --hasta 2025-03
+    python -m lector_cartera.almacen -o bolivar.csv.gz --aseguradora "SEGUROS COMERCIALES BOLIVAR"
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from lector_cartera import instrumentacion
+from lector_cartera.archivos import leer_contenido
+from lector_cartera.avisos import avisar
+from lector_cartera.cache import VERSION_PARSER
+from lector_cartera.esquema import fechas_archivo, unir
+from lector_cartera.exportar import escribir_parquet, escribir_reporte, formato_de_ruta, formatos_disponibles
+
+DIRECTORIO_ALMACEN = Path(os.environ.get("CARTERA_ALMACEN_DIR", Path.home() / ".local" / "share" / "lector_cartera" / "almacen"))
+
+# Un registro JSON por archivo de origen (qué lote lo trae y cuántas filas hay
+# en cada parte) y uno por lote, que se escribe al final y lo da por completo.
+ARCHIVOS = "_archivos"
+LOTES = "_lotes"
+SIN_FECHA = "sin-fecha"
+MES = re.compile(r"^\d{4}-(0[1-9]|1[0-2])$")
+
+# Los trabajos en segundo plano de un mismo proceso agregan sus lotes de a uno.
+_agregando = threading.Lock()
+
+
+def huella(archivo):
+    return hashlib.blake2b(leer_contenido(archivo), digest_size=20).hexdigest()
+
+
+def _carpeta(aseguradora):
+    # El nombre de la aseguradora se usa como carpeta; se quitan los caracteres que no admite el sistema de archivos.
+    return re.sub(r'[\\/:*?"<>|]', " ", str(aseguradora)).strip() or "SIN ASEGURADORA"
+
+
+def _meses(fechas):
+    if not pd.api.types.is_datetime64_any_dtype(fechas):
+        return pd.Series(SIN_FECHA, index=fechas.index)
+    return fechas.dt.strftime("%Y-%m").fillna(SIN_FECHA)
+
+
+def _escribir(ruta, contenido, escribir):
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    # Un temporal propio por escritura, como en la caché: otro proceso puede escribir la misma ruta a la vez.
+    descriptor, temporal = tempfile.mkstemp(dir=ruta.parent, prefix=f"{ruta.stem}.", suffix=".tmp")
+    os.close(descriptor)
+    try:
+        escribir(contenido, temporal)
+        os.replace(temporal, ruta)
+    except BaseException:
+        Path(temporal).unlink(missing_ok=True)
+        raise
+
+
+def _escribir_json(contenido, ruta):
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(contenido, f, ensure_ascii=False)
+
+
+def _leer_json(ruta):
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+class AlmacenCartera:
+    """Consolidado de cartera guardado en ``directorio``.
+
+    Las partes de un lote solo aparecen en los extractos cuando existe el
+    registro del lote, que se escribe después de ellas; si un lote se
+    interrumpe, sus archivos se vuelven a agregar la próxima vez.
+    """
+
+    def __init__(self, directorio=DIRECTORIO_ALMACEN):
+        self.directorio = Path(directorio)
+
+    def _lote_completo(self, lote):
+        return (self.directorio / LOTES / f"{lote}.json").exists()
+
+    def registros(self):
+        """Registro de cada archivo de origen que está en el consolidado."""
+        lotes = {ruta.stem for ruta in (self.directorio / LOTES).glob("*.json")}
+        registros = (_leer_json(ruta) for ruta in sorted((self.directorio / ARCHIVOS).glob("*.json")))
+        return [registro for registro in registros if registro is not None and registro["lote"] in lotes]
+
+    def agregar(self, df, grupos, reemplazar=False):
+        """Agrega las filas de ``df`` de cada archivo de ``grupos`` que no esté ya en el consolidado.
+
+        ``grupos`` son los trabajos.Grupo del lote: de cada uno se usan el
+        procesador y los archivos. Las filas se asignan a su archivo por la
+        columna ARCHIVO y solo se registran los archivos que tienen filas. Un
+        archivo está si ya se agregó con el mismo procesador y la misma
+        VERSION_PARSER; si cambió alguno de los dos sus filas se reemplazan, y
+        con ``reemplazar`` se reemplazan siempre. Devuelve {"archivos":
+        agregados, "omitidos": los que ya estaban, "sin_filas": los que no
+        trajeron filas, "filas": filas escritas}. Lanza ImportError si falta pyarrow.
+        """
+        if "parquet" not in formatos_disponibles():
+            raise ImportError("Para el consolidado en Parquet instala pyarrow.")
+        archivos = [(archivo, grupo.funcion.__name__) for grupo in grupos for archivo in grupo.archivos]
+        repetidos = {nombre for nombre, veces in Counter(a.name for a, _ in archivos).items() if veces > 1}
+        if repetidos:
+            # Con nombres repetidos no se puede saber qué filas son de cada archivo.
+            avisar(f"No se agregan al consolidado los archivos con nombre repetido en el lote: {', '.join(sorted(repetidos))}")
+        con_filas = set(df["ARCHIVO"].astype(str).unique()) if not df.empty else set()
+        lote = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        with _agregando, instrumentacion.etapa("almacen") as medicion:
+            nuevos, vistas, omitidos, sin_filas = {}, set(), 0, 0
+            for archivo, procesador in archivos:
+                if archivo.name in repetidos:
+                    continue
+                huella_archivo = huella(archivo)
+                anterior = _leer_json(self.directorio / ARCHIVOS / f"{huella_archivo}.json")
+                completo = anterior is not None and self._lote_completo(anterior["lote"])
+                vigente = completo and anterior.get("procesador") == procesador and anterior.get("version") == VERSION_PARSER
+                if (vigente and not reemplazar) or huella_archivo in vistas:
+                    omitidos += 1
+                    continue
+                if archivo.name not in con_filas:
+                    # Un archivo que falló o no trae pagos no se registra: no impide agregarlo después.
+                    sin_filas += 1
+                    continue
+                vistas.add(huella_archivo)
+                # Si un reemplazo anterior se interrumpió, sus filas viejas siguen pendientes de borrar.
+                reemplaza = {"lote": anterior["lote"], "archivo": anterior["archivo"], "partes": anterior["partes"]} if completo else (anterior or {}).get("reemplaza")
+                nuevos[archivo.name] = {
+                    "huella": huella_archivo, "archivo": archivo.name, "procesador": procesador, "version": VERSION_PARSER, "lote": lote,
+                    "agregado": time.strftime("%Y-%m-%dT%H:%M:%S"), "partes": {}, "reemplaza": reemplaza,
+                }
+
+            filas = df[df["ARCHIVO"].isin(list(nuevos))] if nuevos else df.iloc[:0]
+            for registro in self._escribir_partes(filas, lote, nuevos):
+                _escribir(self.directorio / ARCHIVOS / f"{registro['huella']}.json", registro, _escribir_json)
+            if nuevos:
+                _escribir(self.directorio / LOTES / f"{lote}.json", {"lote": lote, "archivos": list(nuevos)}, _escribir_json)
+            for registro in nuevos.values():
+                if registro["reemplaza"]:
+                    self._borrar_filas(registro.pop("reemplaza"))
+                    _escribir(self.directorio / ARCHIVOS / f"{registro['huella']}.json", registro, _escribir_json)
+
+            resumen = {"archivos": len(nuevos), "omitidos": omitidos, "sin_filas": sin_filas, "filas": len(filas)}
+            medicion.filas = resumen["filas"]
+            medicion.campos.update(archivos=resumen["archivos"], omitidos=omitidos, sin_filas=sin_filas)
+        return resumen
+
+    def _escribir_partes(self, filas, lote, registros):
+        """Escribe una parte del lote por aseguradora y mes y anota en ``registros`` las filas de cada archivo."""
+        if not filas.empty:
+            # Cada archivo trae las fechas en su propio formato; se interpretan por separado.
+            fechas = [fechas_archivo(grupo) for _, grupo in filas.groupby("ARCHIVO", sort=False, observed=True)["FECHA"]]
+            meses = pd.concat([_meses(f) for f in fechas]).reindex(filas.index)
+            filas = filas.assign(FECHA=pd.concat(fechas).reindex(filas.index))
+            for (aseguradora, mes), grupo in filas.groupby([filas["ASEGURADORA"].astype(str), meses], sort=False):
+                grupo = grupo.reset_index(drop=True)
+                if mes != SIN_FECHA:
+                    # Junto a archivos con fechas en texto la columna queda como objeto; aquí todas son fechas.
+                    grupo["FECHA"] = pd.to_datetime(grupo["FECHA"])
+                for columna in grupo.columns[grupo.dtypes == "category"]:
+                    grupo[columna] = grupo[columna].cat.remove_unused_categories()
+                relativa = f"ASEGURADORA={_carpeta(aseguradora)}/MES={mes}/{lote}.parquet"
+                _escribir(self.directorio / relativa, grupo, escribir_parquet)
+                for nombre, n in grupo["ARCHIVO"].astype(str).value_counts().items():
+                    registros[nombre]["partes"][relativa] = int(n)
+        return list(registros.values())
+
+    def _borrar_filas(self, reemplazado):
+        """Quita de las partes de su lote las filas de un archivo reemplazado."""
+        for relativa in reemplazado["partes"]:
+            ruta = self.directorio / relativa
+            try:
+                parte = pd.read_parquet(ruta)
+            except FileNotFoundError:
+                continue
+            quedan = parte[parte["ARCHIVO"].astype(str) != reemplazado["archivo"]].reset_index(drop=True)
+            if quedan.empty:
+                ruta.unlink(missing_ok=True)
+            else:
+                _escribir(ruta, quedan, escribir_parquet)
+
+    def extraer(self, aseguradoras=None, desde=None, hasta=None):
+        """Filas de las ``aseguradoras`` (todas si es None) pagadas entre los meses ``desde`` y ``hasta`` (aaaa-mm, inclusive).
+
+        Con un rango de meses se dejan por fuera las filas sin fecha.
+        """
+        carpetas = None if aseguradoras is None else {_carpeta(a) for a in aseguradoras}
+        lotes = {ruta.stem for ruta in (self.directorio / LOTES).glob("*.json")}
+        rutas = []
+        for particion in sorted(self.directorio.glob("ASEGURADORA=*/MES=*")):
+            aseguradora, mes = particion.parent.name.partition("=")[2], particion.name.partition("=")[2]
+            if carpetas is not None and aseguradora not in carpetas:
+                continue
+            if (desde or hasta) and (mes == SIN_FECHA or (desde and mes < desde) or (hasta and mes > hasta)):
+                continue
+            rutas.extend(ruta for ruta in sorted(particion.glob("*.parquet")) if ruta.stem in lotes)
+        with instrumentacion.etapa("extraccion_almacen", partes=len(rutas)) as medicion:
+            # pyarrow suelta el GIL al leer; las partes se leen en paralelo.
+            with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as pool:
+                df = unir(list(pool.map(pd.read_parquet, rutas)))
+            if not df.empty:
+                df = df.sort_values(["ASEGURADORA", "FECHA"], kind="stable", ignore_index=True)
+            medicion.filas = len(df)
+        return df
+
+    def resumen(self):
+        """Archivos y filas por aseguradora y mes, a partir de los registros y sin leer las partes."""
+        filas = [
+            {"ASEGURADORA": relativa.split("/")[0].partition("=")[2], "MES": relativa.split("/")[1].partition("=")[2], "HUELLA": registro["huella"], "FILAS": n}
+            for registro in self.registros() for relativa, n in registro["partes"].items()
+        ]
+        if not filas:
+            return pd.DataFrame(columns=["ASEGURADORA", "MES", "ARCHIVOS", "FILAS"])
+        return pd.DataFrame(filas).groupby(["ASEGURADORA", "MES"]).agg(ARCHIVOS=("HUELLA", "nunique"), FILAS=("FILAS", "sum")).reset_index()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="lector_cartera.almacen", description="Genera extractos del consolidado de cartera.")
+    parser.add_argument("-o", "--salida", help="Ruta del extracto (.xlsx, .csv, .csv.gz o .parquet)")
+    parser.add_argument("--aseguradora", action="append", help="Aseguradora a incluir; se puede repetir (por defecto todas)")
+    parser.add_argument("--desde", metavar="AAAA-MM", help="Primer mes de pago a incluir")
+    parser.add_argument("--hasta", metavar="AAAA-MM", help="Último mes de pago a incluir")
+    parser.add_argument("--directorio", default=str(DIRECTORIO_ALMACEN), help="Carpeta del consolidado (CARTERA_ALMACEN_DIR)")
+    parser.add_argument("--resumen", action="store_true", help="Muestra los archivos y las filas por aseguradora y mes")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    logger = logging.getLogger("lector_cartera")
+    almacen = AlmacenCartera(args.directorio)
+
+    if args.resumen:
+        print(almacen.resumen().to_string(index=False))
+        return 0
+    if not args.salida:
+        parser.error("indique la ruta del extracto con -o o use --resumen")
+    for mes in (args.desde, args.hasta):
+        if mes is not None and not MES.match(mes):
+            logger.error(f"Mes inválido '{mes}'; use el formato AAAA-MM.")
+            return 2
+    formato = formato_de_ruta(args.salida)
+    if formato == "parquet" and "parquet" not in formatos_disponibles():
+        logger.error("Para escribir Parquet instala pyarrow.")
+        return 2
+
+    df = almacen.extraer(args.aseguradora, args.desde, args.hasta)
+    if df.empty:
+        logger.warning("El consolidado no tiene filas con ese filtro.")
+        return 1
+    escribir_reporte(df, args.salida, formato, "ASEGURADORA" if df["ASEGURADORA"].nunique() > 1 else None)
+    logger.info(f"{len(df)} filas escritas en {args.salida}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""Utilidades para los archivos cargados por el usuario."""
+import glob
+import os
+import posixpath
+import zipfile
+from io import BytesIO
+
+from lector_cartera.avisos import avisar
+
+EXTENSIONES = (".pdf", ".xlsx", ".xls", ".csv")
+EXTENSION_ZIP = ".zip"
+
+
+class ArchivoLocal:
+    """Archivo del disco que solo se lee al pedir su contenido.
+
+    Como en ``MiembroZip``, el contenido no se guarda: ``abrir_archivo`` lo lee
+    del disco cuando le toca, así abrir cientos de rutas no las carga todas en
+    memoria de una vez.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.name = os.path.basename(ruta)
+        self.size = os.path.getsize(ruta)
+
+    def getvalue(self):
+        with open(self.ruta, "rb") as f:
+            return f.read()
+
+
+class ArchivoEnMemoria(BytesIO):
+    """Copia de un archivo cargado que no depende de la sesión que lo subió."""
+
+    def __init__(self, nombre, contenido):
+        super().__init__(contenido)
+        self.name = nombre
+        self.size = len(contenido)
+
+
+class MiembroZip:
+    """Archivo dentro de un ZIP que solo se descomprime al leerlo.
+
+    ``origen`` es la ruta del ZIP o sus bytes. El contenido no se guarda: cada
+    lectura lo descomprime de nuevo, así un lote de cientos de archivos ocupa
+    en memoria lo que ocupe el más grande de ellos y no la suma de todos.
+    """
+
+    def __init__(self, origen, miembro, nombre, size):
+        self.origen = origen
+        self.miembro = miembro
+        self.name = nombre
+        self.size = size
+
+    def getvalue(self):
+        with zipfile.ZipFile(self.origen if isinstance(self.origen, str) else BytesIO(self.origen)) as zip_:
+            return zip_.read(self.miembro)
+
+
+def abrir_archivo(archivo):
+    """Objeto de archivo legible; los miembros de ZIP se descomprimen y los del disco se leen aquí."""
+    if isinstance(archivo, (MiembroZip, ArchivoLocal)):
+        return ArchivoEnMemoria(archivo.name, archivo.getvalue())
+    return archivo
+
+
+def copiar_archivo(archivo):
+    if isinstance(archivo, (MiembroZip, ArchivoLocal)):
+        # Se leen de su ruta al procesarlos; la copia no necesita cargar nada.
+        return archivo
+    return ArchivoEnMemoria(archivo.name, leer_contenido(archivo))
+
+
+def leer_contenido(archivo):
+    if hasattr(archivo, "getvalue"):
+        return archivo.getvalue()
+    archivo.seek(0)
+    return archivo.read()
+
+
+def miembros_zip(origen, nombre_zip):
+    """Archivos soportados dentro del ZIP, en su orden; los demás se ignoran.
+
+    Cada miembro se llama ``<zip>/<ruta dentro del zip>`` para que dos archivos
+    con el mismo nombre en carpetas distintas no se confundan.
+    """
+    miembros = []
+    with zipfile.ZipFile(origen if isinstance(origen, str) else BytesIO(origen)) as zip_:
+        for info in zip_.infolist():
+            base = posixpath.basename(info.filename)
+            # Se descartan las carpetas y los metadatos que agrega macOS al comprimir.
+            if info.is_dir() or base.startswith(".") or info.filename.startswith("__MACOSX/"):
+                continue
+            if info.filename.lower().endswith(EXTENSIONES):
+                miembros.append(MiembroZip(origen, info.filename, f"{nombre_zip}/{info.filename}", info.file_size))
+    return miembros
+
+
+def _expandir(origen, nombre):
+    try:
+        miembros = miembros_zip(origen, nombre)
+    except zipfile.BadZipFile:
+        avisar(f"El archivo {nombre} no es un ZIP válido; no se procesará.")
+        return []
+    if not miembros:
+        avisar(f"El archivo {nombre} no contiene archivos PDF, Excel o CSV.")
+    return miembros
+
+
+def expandir_zip(archivos):
+    """Reemplaza cada ZIP cargado por los archivos soportados que contiene."""
+    expandidos = []
+    for archivo in archivos:
+        if archivo.name.lower().endswith(EXTENSION_ZIP):
+            expandidos.extend(_expandir(leer_contenido(archivo), archivo.name))
+        else:
+            expandidos.append(archivo)
+    return expandidos
+
+
+def abrir_rutas(rutas):
+    """Archivos de las rutas; los ZIP se leen desde el disco miembro por miembro."""
+    archivos = []
+    for ruta in rutas:
+        if ruta.lower().endswith(EXTENSION_ZIP):
+            archivos.extend(_expandir(ruta, os.path.basename(ruta)))
+        else:
+            archivos.append(ArchivoLocal(ruta))
+    return archivos
+
+
+def buscar_archivos(patrones):
+    """Expande directorios y patrones glob en la lista ordenada de archivos soportados."""
+    rutas = []
+    for patron in patrones:
+        if os.path.isdir(patron):
+            candidatos = sorted(os.path.join(patron, n) for n in os.listdir(patron))
+        else:
+            candidatos = sorted(glob.glob(patron))
+        rutas.extend(r for r in candidatos if os.path.isfile(r) and r.lower().endswith(EXTENSIONES + (EXTENSION_ZIP,)))
+    return rutas
@@ -0,0 +1,38 @@
+"""Mensajes para el usuario emitidos por los procesadores.
+
+Sin interfaz los avisos van al log; la aplicación de Streamlit registra su
+propio manejador para mostrarlos en pantalla. Los trabajos en segundo plano
+capturan los avisos de su hilo con ``capturar_avisos``.
+"""
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger("lector_cartera")
+
+_manejador = None
+_local = threading.local()
+
+
+def registrar_manejador(funcion):
+    global _manejador
+    _manejador = funcion
+
+
+@contextmanager
+def capturar_avisos(funcion):
+    """Envía a ``funcion`` los avisos emitidos en este hilo mientras dure el bloque."""
+    anterior = getattr(_local, "manejador", None)
+    _local.manejador = funcion
+    try:
+        yield
+    finally:
+        _local.manejador = anterior
+
+
+def avisar(mensaje, nivel="warning"):
+    manejador = getattr(_local, "manejador", None) or _manejador
+    if manejador is not None:
+        manejador(mensaje, nivel)
+    else:
+        logger.log(logging.ERROR if nivel == "error" else logging.WARNING, mensaje)
@@ -0,0 +1,161 @@
+"""Caché en disco de las filas producidas por cada archivo procesado.
+
+La llave combina el hash del contenido, el procesador, la versión del parser y
+los datos de la entidad, así que volver a cargar el mismo archivo no lo vuelve
+a leer. Las entradas se eliminan por tamaño, empezando por la menos usada.
+
+Cada caché solo administra sus carpetas de dos dígitos hexadecimales: el
+catálogo compilado (``catalogo/``) y las carteras indexadas (``carteras/``)
+viven en el mismo directorio sin que el recorte o la limpieza los toquen.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+from pathlib import Path
+
+from lector_cartera import instrumentacion
+from lector_cartera.archivos import leer_contenido
+from lector_cartera.esquema import unir, vacio
+
+# Subir este número cuando cambie la salida de cualquier procesador.
+VERSION_PARSER = 7
+
+DIRECTORIO_CACHE = Path(os.environ.get("CARTERA_CACHE_DIR", Path.home() / ".cache" / "lector_cartera"))
+LIMITE_CACHE_MB = int(os.environ.get("CARTERA_CACHE_MB", "512"))
+# Entradas de una caché: una carpeta por los dos primeros dígitos de la llave.
+PATRON_ENTRADAS = "[0-9a-f][0-9a-f]/*.pkl"
+
+COLUMNAS_ARCHIVO = ("ARCHIVO", "Archivo", "ARCHIVOS")
+
+
+class CacheResultados:
+    def __init__(self, directorio=DIRECTORIO_CACHE, limite_mb=LIMITE_CACHE_MB):
+        self.directorio = Path(directorio)
+        self.limite_bytes = limite_mb * 1024 * 1024
+
+    def llave(self, contenido, funcion, nombre, nit, selection_entidad, plan_entidad, opciones=None):
+        h = hashlib.blake2b(contenido, digest_size=20)
+        h.update(f"|{funcion.__name__}|{VERSION_PARSER}|{nombre}|{nit}|{selection_entidad}|{plan_entidad}".encode("utf-8"))
+        if opciones:
+            h.update(repr(sorted(opciones.items())).encode("utf-8"))
+        return h.hexdigest()
+
+    def _ruta(self, llave):
+        return self.directorio / llave[:2] / f"{llave}.pkl"
+
+    def obtener(self, llave):
+        ruta = self._ruta(llave)
+        try:
+            with open(ruta, "rb") as f:
+                df = pickle.load(f)
+        except Exception:
+            # Una entrada ausente, truncada o de otra versión de pandas es un fallo de caché.
+            return None
+        # Se actualiza la fecha de acceso para la eliminación LRU; otro proceso pudo recortarla ya.
+        try:
+            os.utime(ruta)
+        except FileNotFoundError:
+            pass
+        return df
+
+    def guardar(self, llave, df):
+        ruta = self._ruta(llave)
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        # Un temporal propio por escritura: dos trabajos pueden guardar la misma llave a la vez.
+        descriptor, temporal = tempfile.mkstemp(dir=ruta.parent, prefix=f"{ruta.stem}.", suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "wb") as f:
+                pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporal, ruta)
+        except BaseException:
+            Path(temporal).unlink(missing_ok=True)
+            raise
+
+    def recortar(self):
+        """Elimina las entradas menos usadas hasta quedar bajo el límite; se llama una vez por lote guardado."""
+        entradas = []
+        for ruta in self.directorio.glob(PATRON_ENTRADAS):
+            try:
+                estado = ruta.stat()
+            except FileNotFoundError:
+                continue
+            entradas.append((estado.st_mtime, estado.st_size, ruta))
+        total = sum(tamano for _, tamano, _ in entradas)
+        for _, tamano, ruta in sorted(entradas):
+            if total <= self.limite_bytes:
+                break
+            ruta.unlink(missing_ok=True)
+            total -= tamano
+
+    def limpiar(self):
+        for ruta in self.directorio.glob(PATRON_ENTRADAS):
+            ruta.unlink(missing_ok=True)
+
+
+def _separar_por_archivo(df, nombres):
+    columna = next((c for c in COLUMNAS_ARCHIVO if c in df.columns), None)
+    if columna is None:
+        return {}
+    return {nombre: grupo.reset_index(drop=True) for nombre, grupo in df.groupby(columna, sort=False) if nombre in nombres}
+
+
+def procesar_con_cache(funcion, archivos, nit, selection_entidad, plan_entidad, cache=None, usar_cache=True, progreso=None, **opciones):
+    """Ejecuta el procesador solo sobre los archivos que no están en caché.
+
+    Las opciones adicionales (por ejemplo ``motor``) se pasan al procesador y
+    forman parte de la llave. ``progreso(nombre, df, segundos)`` se llama por
+    cada archivo; para los que salen de la caché ``segundos`` es None. Los
+    archivos que se leen bien pero no traen filas también se guardan, vacíos;
+    los que el procesador no reconoce o no puede leer no.
+    """
+    with instrumentacion.contexto(procesador=funcion.__name__):
+        opciones_proceso = dict(opciones, progreso=progreso) if progreso is not None else opciones
+        if not usar_cache:
+            return funcion(archivos, nit, selection_entidad, plan_entidad, **opciones_proceso)
+        cache = cache or CacheResultados()
+
+        nombres = [a.name for a in archivos]
+        if len(set(nombres)) < len(nombres):
+            # Con nombres repetidos no se puede saber qué filas son de cada archivo.
+            return funcion(archivos, nit, selection_entidad, plan_entidad, **opciones_proceso)
+
+        with instrumentacion.etapa("cache") as medicion:
+            llaves = [cache.llave(leer_contenido(a), funcion, a.name, nit, selection_entidad, plan_entidad, opciones) for a in archivos]
+            resultados = [cache.obtener(llave) for llave in llaves]
+            medicion.campos["aciertos"] = sum(df is not None for df in resultados)
+        pendientes = [a for a, df in zip(archivos, resultados) if df is None]
+        if progreso is not None:
+            for archivo, df in zip(archivos, resultados):
+                if df is not None:
+                    progreso(archivo.name, df, None)
+
+        if pendientes:
+            # El progreso de cada archivo dice cuáles se leyeron: los que no se
+            # reconocen o fallan llegan sin columnas.
+            leidos = set()
+
+            def progreso_archivo(nombre, df, segundos):
+                if len(df.columns):
+                    leidos.add(nombre)
+                if progreso is not None:
+                    progreso(nombre, df, segundos)
+
+            nuevo = funcion(pendientes, nit, selection_entidad, plan_entidad, **dict(opciones, progreso=progreso_archivo))
+            por_archivo = _separar_por_archivo(nuevo, {a.name for a in pendientes}) if nuevo is not None and not nuevo.empty else {}
+            guardados = 0
+            for i, (archivo, llave) in enumerate(zip(archivos, llaves)):
+                if resultados[i] is not None:
+                    continue
+                if archivo.name in por_archivo:
+                    resultados[i] = por_archivo[archivo.name]
+                elif archivo.name in leidos:
+                    resultados[i] = vacio()
+                else:
+                    continue
+                cache.guardar(llave, resultados[i])
+                guardados += 1
+            if guardados:
+                cache.recortar()
+
+        return unir(resultados)
@@ -0,0 +1,66 @@
+"""Clasificación automática de los archivos por formato de aseguradora.
+
+De los Excel/CSV solo se leen los encabezados y de los PDF solo el texto de la
+primera página, así que clasificar un lote cuesta una fracción de procesarlo.
+Cada formato (familia) tiene su procesador en ``FAMILIAS``; la entidad con la
+que se procesa cada familia la elige el usuario entre ``candidatas``.
+"""
+from lector_cartera.archivos import abrir_archivo, leer_contenido
+from lector_cartera.layouts import LAYOUTS, detectar_layout
+from lector_cartera.pdf import FACTURA_EQUIDAD, FECHA_EQUIDAD, MARCA_SISCO, MOTOR_POR_DEFECTO, primera_pagina
+from lector_cartera.procesadores import FAMILIAS, funcion_procesamiento
+
+
+def _familia_pdf(texto):
+    if MARCA_SISCO.search(texto):
+        return "SISCO"
+    if FECHA_EQUIDAD.search(texto) and ("equidad" in texto.lower() or FACTURA_EQUIDAD.search(texto)):
+        return "EQUIDAD"
+    return None
+
+
+def _familia_tabla(archivo):
+    # Si los encabezados encajan en layouts de varias familias gana el que exige
+    # más columnas, que es el más específico.
+    vistas = {}
+    mejor, columnas = None, 0
+    for familia, layouts in LAYOUTS.items():
+        layout, _, _ = detectar_layout(archivo, layouts, vistas)
+        if layout is not None and len(layout.columnas) > columnas:
+            mejor, columnas = familia, len(layout.columnas)
+    return mejor
+
+
+def clasificar(archivo, motor=MOTOR_POR_DEFECTO):
+    """Devuelve la familia del archivo o None si no se reconoce (o no se puede leer)."""
+    try:
+        if archivo.name.lower().endswith(".pdf"):
+            return _familia_pdf(primera_pagina(leer_contenido(archivo), motor))
+        abierto = abrir_archivo(archivo)
+        try:
+            return _familia_tabla(abierto)
+        finally:
+            abierto.seek(0)
+    except Exception:
+        return None
+
+
+def clasificar_archivos(archivos, motor=MOTOR_POR_DEFECTO):
+    """Reparte los archivos por familia: devuelve ({familia: [archivos]}, [sin clasificar])."""
+    por_familia = {}
+    sin_clasificar = []
+    for archivo in archivos:
+        familia = clasificar(archivo, motor)
+        if familia is None:
+            sin_clasificar.append(archivo)
+        else:
+            por_familia.setdefault(familia, []).append(archivo)
+    return por_familia, sin_clasificar
+
+
+def candidatas(familia, entidades=None):
+    """Entidades que se procesan con el procesador de la familia, en el orden de ``entidades``."""
+    nombres = [entidad for entidad, funcion in funcion_procesamiento.items() if funcion is FAMILIAS[familia]]
+    if entidades is None:
+        return nombres
+    return [entidad for entidad in dict.fromkeys(entidades) if entidad in nombres]
@@ -0,0 +1,180 @@
+"""Procesamiento por lotes sin interfaz gráfica.
+
+Ejemplo::
+
+    python -m lector_cartera "SEGUROS DEL ESTADO SA" /datos/remesas/*.pdf -o reporte.xlsx
+    python -m lector_cartera auto /datos/cierre_mes/ -o cierre.xlsx
+
+Con ``auto`` cada archivo se clasifica por su formato y cada aseguradora sale
+en su propia hoja del Excel.
+"""
+import argparse
+import logging
+import sys
+
+from lector_cartera.almacen import DIRECTORIO_ALMACEN, AlmacenCartera
+from lector_cartera.archivos import ArchivoLocal, abrir_rutas, buscar_archivos
+from lector_cartera.cache import procesar_con_cache
+from lector_cartera.clasificar import candidatas, clasificar_archivos
+from lector_cartera.conciliacion import cargar_cartera, conciliar, resumen_conciliacion
+from lector_cartera.entidades import RUTA_CLIENTES, buscar_entidad, cargar_entidades
+from lector_cartera.esquema import unir
+from lector_cartera.exportar import escribir_reporte, formato_de_ruta, formatos_disponibles, nombre_reporte
+from lector_cartera.instrumentacion import Registro, capturar, resumen
+from lector_cartera.pdf import MOTORES_TEXTO
+from lector_cartera.procesadores import FAMILIAS, FAMILIAS_PDF, funcion_procesamiento
+from lector_cartera.trabajos import ENTIDADES_VARIAS, Grupo
+
+ENTIDAD_AUTOMATICA = "auto"
+
+
+def crear_parser():
+    parser = argparse.ArgumentParser(prog="lector_cartera", description="Procesa soportes de pago de una entidad y genera el reporte consolidado.")
+    parser.add_argument("entidad", help="Razón social o NIT de la entidad, o 'auto' para detectar la aseguradora de cada archivo")
+    parser.add_argument("archivos", nargs="+", help="Archivos, ZIP, directorios o patrones glob a procesar")
+    parser.add_argument("-o", "--salida", help="Ruta del reporte (.xlsx, .csv, .csv.gz o .parquet); por defecto reporte_<entidad>.xlsx")
+    parser.add_argument("--plan", help="Plan de la entidad cuando el NIT o la razón social tienen varios")
+    parser.add_argument("--clientes", default=str(RUTA_CLIENTES), help="Ruta de lista_de_clientes.xlsx")
+    parser.add_argument("--motor-pdf", choices=MOTORES_TEXTO, help="Motor de texto para entidades que envían PDF")
+    parser.add_argument("--sin-cache", action="store_true", help="Procesa todos los archivos aunque ya estén en caché")
+    parser.add_argument("--entidad-familia", action="append", default=[], metavar="FAMILIA=ENTIDAD[:PLAN]", help=f"Con 'auto', entidad con la que se procesa un formato ({', '.join(FAMILIAS)}); por defecto la primera de la lista de clientes")
+    parser.add_argument("--cartera", metavar="RUTA", help="Cartera de facturas abiertas (.xlsx, .xls, .csv o .parquet) contra la que se concilian los pagos")
+    parser.add_argument("--almacen", nargs="?", const=str(DIRECTORIO_ALMACEN), metavar="DIRECTORIO", help="Agrega las filas al consolidado en Parquet (por defecto en CARTERA_ALMACEN_DIR); los archivos que ya están se omiten")
+    parser.add_argument("--reemplazar", action="store_true", help="Con --almacen, reemplaza en el consolidado las filas de los archivos que ya están")
+    parser.add_argument("--diagnostico", metavar="RUTA.jsonl", help="Agrega a este archivo un evento JSON por etapa y archivo, y resume los tiempos al final")
+    return parser
+
+
+def entidades_por_familia(valores, campo="--entidad-familia"):
+    """{familia: entidad[:plan]} de los valores FAMILIA=ENTIDAD[:PLAN]; ValueError si alguno no tiene esa forma."""
+    asignadas = {}
+    for valor in valores:
+        familia, igual, entidad = valor.partition("=")
+        if not igual or not familia.strip() or not entidad.strip():
+            raise ValueError(f"{campo} espera FAMILIA=ENTIDAD[:PLAN]: '{valor}'")
+        asignadas[familia] = entidad
+    return asignadas
+
+
+def grupos_automaticos(df_entidades, archivos, asignadas, opciones_pdf, logger):
+    """Clasifica los archivos y arma un grupo por familia con su entidad.
+
+    Devuelve (grupos, archivos sin clasificar). Lanza ValueError si una
+    entidad indicada en ``asignadas`` no existe o es ambigua.
+    """
+    por_familia, sin_clasificar = clasificar_archivos(archivos)
+    grupos = []
+    for familia, archivos_familia in por_familia.items():
+        if familia in asignadas:
+            entidad, _, plan = asignadas[familia].partition(":")
+            selection_entidad, nit, plan_entidad = buscar_entidad(df_entidades, entidad, plan or None)
+        else:
+            opciones = candidatas(familia, df_entidades["Razon Social"])
+            if not opciones:
+                logger.warning(f"{len(archivos_familia)} archivos con formato {familia}, pero ninguna entidad de la lista de clientes usa ese procesador.")
+                sin_clasificar.extend(archivos_familia)
+                continue
+            info = df_entidades[df_entidades["Razon Social"] == opciones[0]].iloc[0]
+            selection_entidad, nit, plan_entidad = info["Razon Social"], info["Nit"], info["Plan"]
+        if funcion_procesamiento.get(selection_entidad) is not FAMILIAS[familia]:
+            raise ValueError(f"'{selection_entidad}' no se procesa con el formato {familia}.")
+        opciones = opciones_pdf if familia in FAMILIAS_PDF else {}
+        grupos.append(Grupo(FAMILIAS[familia], archivos_familia, nit, selection_entidad, plan_entidad, opciones))
+        logger.info(f"{familia}: {len(archivos_familia)} archivos de {selection_entidad} (NIT {nit}, plan {plan_entidad})")
+    return grupos, sin_clasificar
+
+
+def main(argv=None):
+    parser = crear_parser()
+    args = parser.parse_args(argv)
+    if args.reemplazar and not args.almacen:
+        parser.error("--reemplazar solo aplica con --almacen")
+    try:
+        asignadas = entidades_por_familia(args.entidad_familia)
+    except ValueError as e:
+        parser.error(str(e))
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    logger = logging.getLogger("lector_cartera")
+    automatico = args.entidad.lower() == ENTIDAD_AUTOMATICA
+    opciones = {"motor": args.motor_pdf} if args.motor_pdf else {}
+
+    try:
+        df_entidades = cargar_entidades(args.clientes)
+        if not automatico:
+            selection_entidad, nit, plan_entidad = buscar_entidad(df_entidades, args.entidad, args.plan)
+    except (FileNotFoundError, ValueError) as e:
+        logger.error(str(e))
+        return 2
+    desconocidas = set(asignadas) - set(FAMILIAS)
+    if desconocidas:
+        logger.error(f"Formatos desconocidos en --entidad-familia: {', '.join(sorted(desconocidas))}. Opciones: {', '.join(FAMILIAS)}")
+        return 2
+    if not automatico and selection_entidad not in funcion_procesamiento:
+        logger.error(f"No hay una función de procesamiento definida para '{selection_entidad}'.")
+        return 2
+
+    salida = args.salida or nombre_reporte(ENTIDADES_VARIAS if automatico else selection_entidad)
+    formato = formato_de_ruta(salida)
+    if (formato == "parquet" or args.almacen) and "parquet" not in formatos_disponibles():
+        logger.error("Para escribir Parquet instala pyarrow.")
+        return 2
+
+    registro = Registro(args.diagnostico) if args.diagnostico else None
+    cartera = None
+    if args.cartera:
+        try:
+            with capturar(registro):
+                cartera = cargar_cartera(ArchivoLocal(args.cartera), usar_cache=not args.sin_cache)
+        except (FileNotFoundError, ValueError) as e:
+            logger.error(str(e))
+            return 2
+        logger.info(f"Cartera {args.cartera}: {len(cartera)} facturas")
+
+    archivos = abrir_rutas(buscar_archivos(args.archivos))
+    if not archivos:
+        logger.error("No se encontraron archivos para procesar.")
+        return 2
+
+    if automatico:
+        try:
+            grupos, sin_clasificar = grupos_automaticos(df_entidades, archivos, asignadas, opciones, logger)
+        except ValueError as e:
+            logger.error(str(e))
+            return 2
+        for archivo in sin_clasificar:
+            logger.warning(f"No se reconoció el formato de {archivo.name}; no se procesará.")
+    else:
+        logger.info(f"Procesando {len(archivos)} archivos de {selection_entidad} (NIT {nit}, plan {plan_entidad})")
+        grupos = [Grupo(funcion_procesamiento[selection_entidad], archivos, nit, selection_entidad, plan_entidad, opciones)]
+
+    def progreso(nombre, df, segundos):
+        origen = "caché" if segundos is None else f"{segundos:.2f} s"
+        logger.info(f"{nombre}: {len(df)} filas ({origen})")
+
+    with capturar(registro):
+        df_final = unir([procesar_con_cache(g.funcion, g.archivos, g.nit, g.selection_entidad, g.plan_entidad, usar_cache=not args.sin_cache, progreso=progreso, **g.opciones) for g in grupos])
+        vacio = df_final is None or df_final.empty
+        if args.almacen:
+            agregado = AlmacenCartera(args.almacen).agregar(df_final, grupos, reemplazar=args.reemplazar)
+            logger.info(f"Consolidado {args.almacen}: {agregado['archivos']} archivos agregados ({agregado['filas']} filas), {agregado['omitidos']} ya estaban, {agregado['sin_filas']} sin filas")
+        if not vacio and cartera is not None:
+            df_final = conciliar(df_final, cartera)
+            for estado in resumen_conciliacion(df_final).query("PAGOS > 0").itertuples(index=False):
+                logger.info(f"Conciliación {estado.CONCILIACION}: {estado.PAGOS} pagos por {estado.VALOR:,.0f}")
+        if not vacio:
+            escribir_reporte(df_final, salida, formato, "ASEGURADORA" if len(grupos) > 1 else None)
+    if registro is not None:
+        for etapa in resumen(registro.eventos).itertuples(index=False):
+            errores = f", {etapa.ERRORES} errores" if etapa.ERRORES else ""
+            logger.info(f"Etapa {etapa.ETAPA}: {etapa.SEGUNDOS:.2f} s en {etapa.EVENTOS} eventos{errores}")
+        logger.info(f"Eventos de diagnóstico en {args.diagnostico}")
+
+    if vacio:
+        logger.warning("El procesamiento finalizó, pero no se generaron datos.")
+        return 1
+    logger.info(f"{len(df_final)} filas escritas en {salida}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""Compara los motores de texto PDF sobre un corpus de ejemplo.
+
+Procesa cada PDF con todos los motores y verifica que produzcan exactamente las
+mismas filas de facturas que el motor por defecto. Ejemplo::
+
+    python -m lector_cartera.comparar_motores seg_estado muestras/sisco/
+"""
+import argparse
+import sys
+import time
+
+from lector_cartera.archivos import abrir_rutas, buscar_archivos, leer_contenido
+from lector_cartera.pdf import MOTOR_POR_DEFECTO, MOTORES_TEXTO, extraer_equidad, extraer_seg_estado
+
+EXTRACTORES = {
+    "seg_estado": extraer_seg_estado,
+    "equidad": extraer_equidad,
+}
+
+
+def _filas(columnas):
+    # Los extractores devuelven columnas; para mostrar diferencias se arman las filas.
+    return list(zip(*columnas.values()))
+
+
+def comparar_motores(extractor, archivos, motores=None):
+    """Devuelve (diferencias, tiempos) comparando cada motor contra el de referencia.
+
+    ``diferencias`` es una lista de (archivo, motor, filas de referencia, filas del motor)
+    y ``tiempos`` acumula los segundos de extracción por motor.
+    """
+    motores = list(motores or MOTORES_TEXTO)
+    if MOTOR_POR_DEFECTO not in motores:
+        motores.insert(0, MOTOR_POR_DEFECTO)
+    diferencias = []
+    tiempos = dict.fromkeys(motores, 0.0)
+    for archivo in archivos:
+        contenido = leer_contenido(archivo)
+        filas = {}
+        for motor in motores:
+            inicio = time.perf_counter()
+            filas[motor] = _filas(extractor(archivo.name, contenido, "NIT", "ENTIDAD", "PLAN", motor))
+            tiempos[motor] += time.perf_counter() - inicio
+        for motor in motores:
+            if filas[motor] != filas[MOTOR_POR_DEFECTO]:
+                diferencias.append((archivo.name, motor, filas[MOTOR_POR_DEFECTO], filas[motor]))
+    return diferencias, tiempos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="lector_cartera.comparar_motores", description=__doc__.splitlines()[0])
+    parser.add_argument("extractor", choices=EXTRACTORES)
+    parser.add_argument("archivos", nargs="+", help="PDF, ZIP, directorios o patrones glob del corpus")
+    parser.add_argument("--motor", action="append", choices=MOTORES_TEXTO, help="Motor a comparar (por defecto todos)")
+    args = parser.parse_args(argv)
+
+    archivos = [archivo for archivo in abrir_rutas(buscar_archivos(args.archivos)) if archivo.name.lower().endswith(".pdf")]
+    if not archivos:
+        print("No se encontraron PDF para comparar.")
+        return 2
+    diferencias, tiempos = comparar_motores(EXTRACTORES[args.extractor], archivos, args.motor)
+
+    for motor, segundos in tiempos.items():
+        print(f"{motor:>12}: {segundos:8.2f} s")
+    for nombre, motor, esperadas, obtenidas in diferencias:
+        print(f"DIFERENCIA {nombre} [{motor}]: {len(esperadas)} filas con {MOTOR_POR_DEFECTO}, {len(obtenidas)} con {motor}")
+        for esperada, obtenida in zip(esperadas, obtenidas):
+            if esperada != obtenida:
+                print(f"  {MOTOR_POR_DEFECTO}: {esperada}\n  {motor}: {obtenida}")
+                break
+    print(f"{len(archivos)} archivos, {len(diferencias)} diferencias")
+    return 1 if diferencias else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
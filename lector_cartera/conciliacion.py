@@ -0,0 +1,184 @@
+"""Conciliación de los pagos procesados contra la cartera de facturas abiertas.
+
+La cartera (Excel, CSV o Parquet con el número y el valor de cada factura) se
+lee una sola vez: la tabla con las claves normalizadas se guarda en la caché en
+disco junto a los resultados de los procesadores, así volver a conciliar contra
+el mismo archivo solo cruza índices. El cruce es vectorizado y no recorre las
+filas en Python.
+"""
+import codecs
+import hashlib
+import io
+
+import numpy as np
+import pandas as pd
+
+from lector_cartera import instrumentacion
+from lector_cartera.archivos import abrir_archivo, leer_contenido
+from lector_cartera.cache import DIRECTORIO_CACHE, VERSION_PARSER, CacheResultados
+from lector_cartera.esquema import texto_factura, valores
+from lector_cartera.excel import leer_columnas, leer_primeras_filas
+
+# Nombres con los que aparece cada columna en los archivos de cartera, en orden
+# de preferencia y comparados en mayúsculas y sin espacios sobrantes.
+ALIAS_CARTERA = {
+    "FACTURA": ("FACTURA", "NUMERO FACTURA", "NÚMERO FACTURA", "NRO FACTURA", "NO. FACTURA", "NO FACTURA", "N° FACTURA", "DOCUMENTO", "APLICA A FV"),
+    "VALOR": ("VR. FACTURA", "VALOR FACTURA", "VR FACTURA", "VALOR TOTAL", "VALOR"),
+    "SALDO": ("SALDO", "SALDO FACTURA", "SALDO PENDIENTE", "SALDO CARTERA"),
+}
+
+COLUMNAS_CONCILIACION = ["SALDO CARTERA", "CONCILIACION"]
+
+CONCILIADA = "CONCILIADA"
+PAGO_DUPLICADO = "PAGO DUPLICADO"
+REPETIDA_EN_CARTERA = "FACTURA REPETIDA EN CARTERA"
+NO_ESTA_EN_CARTERA = "NO ESTÁ EN CARTERA"
+SIN_FACTURA = "SIN NÚMERO DE FACTURA"
+ESTADOS = [CONCILIADA, PAGO_DUPLICADO, REPETIDA_EN_CARTERA, NO_ESTA_EN_CARTERA, SIN_FACTURA]
+
+
+def _nombre(columna):
+    return " ".join(str(columna).upper().split())
+
+
+def claves_factura(serie):
+    """Devuelve (clave completa, clave numérica) de cada número de factura.
+
+    La completa conserva el prefijo de letras (FE, FV...) pero no los signos ni
+    los ceros a la izquierda del número; la numérica tampoco tiene el prefijo.
+    """
+    completa = texto_factura(serie).str.upper().str.replace(r"\.0$", "", regex=True).str.replace(r"[^0-9A-Z]", "", regex=True)
+    completa = completa.str.replace(r"^([A-Z]*)0+(?=\d)", r"\1", regex=True)
+    numerica = completa.str.replace(r"^[A-Z]+", "", regex=True)
+    return completa.mask(completa == ""), numerica.mask(numerica == "")
+
+
+def _ubicar_columnas(filas):
+    """Fila del encabezado y nombre de cada columna de ALIAS_CARTERA que tiene (FACTURA y VALOR o SALDO)."""
+    for i, fila in enumerate(filas):
+        presentes = {_nombre(celda) for celda in fila if celda is not None}
+        columnas = {campo: next((a for a in alias if a in presentes), None) for campo, alias in ALIAS_CARTERA.items()}
+        if columnas["FACTURA"] and (columnas["VALOR"] or columnas["SALDO"]):
+            return i, {campo: nombre for campo, nombre in columnas.items() if nombre}
+    return None, {}
+
+
+def _leer_csv(archivo):
+    contenido = leer_contenido(archivo)
+    try:
+        codificacion = "utf-8-sig" if contenido.startswith(codecs.BOM_UTF8) else "utf-8"
+        contenido.decode(codificacion)
+    except UnicodeDecodeError:
+        codificacion = "latin-1"
+    muestra = contenido[:4096].decode(codificacion, errors="ignore")
+    # Los CSV exportados con configuración regional colombiana usan ';' y coma decimal.
+    regional = muestra.count(";") > muestra.count(",")
+    opciones = {"sep": ";", "decimal": ",", "thousands": "."} if regional else {"sep": ","}
+    encabezado = pd.read_csv(io.BytesIO(contenido), nrows=0, encoding=codificacion, **opciones).columns
+    _, columnas = _ubicar_columnas([encabezado])
+    originales = {_nombre(c): c for c in encabezado}
+    usar = [originales[nombre] for nombre in columnas.values()]
+    if not columnas:
+        return None, columnas
+    df = pd.read_csv(io.BytesIO(contenido), usecols=usar, dtype={originales[columnas["FACTURA"]]: str}, encoding=codificacion, **opciones)
+    df.columns = [_nombre(c) for c in df.columns]
+    return df, columnas
+
+
+def _leer_cartera(archivo):
+    nombre = archivo.name.lower()
+    if nombre.endswith(".csv"):
+        df, columnas = _leer_csv(archivo)
+    elif nombre.endswith(".parquet"):
+        df = pd.read_parquet(io.BytesIO(leer_contenido(archivo)))
+        df.columns = [_nombre(c) for c in df.columns]
+        _, columnas = _ubicar_columnas([df.columns])
+    else:
+        archivo = abrir_archivo(archivo)
+        fila, columnas = _ubicar_columnas(leer_primeras_filas(archivo))
+        df = leer_columnas(archivo, list(columnas.values()), header=fila, normalizar=_nombre) if columnas else None
+    if not columnas:
+        raise ValueError(f"La cartera {archivo.name} no tiene una columna de factura ({', '.join(ALIAS_CARTERA['FACTURA'])}) y una de valor o saldo.")
+    return df[list(columnas.values())].rename(columns={nombre: campo for campo, nombre in columnas.items()})
+
+
+def _tabla_cartera(df):
+    completa, numerica = claves_factura(df["FACTURA"])
+    valor = valores(df["VALOR"]) if "VALOR" in df.columns else valores(df["SALDO"])
+    saldo = valores(df["SALDO"]) if "SALDO" in df.columns else valor
+    tabla = pd.DataFrame({"FACTURA": texto_factura(df["FACTURA"]), "COMPLETA": completa, "NUMERICA": numerica, "VALOR": valor, "SALDO": saldo})
+    return tabla[tabla["NUMERICA"].notna()].reset_index(drop=True)
+
+
+def cargar_cartera(archivo, cache=None, usar_cache=True):
+    """Lee la cartera y devuelve la tabla de facturas con sus claves, usando la caché en disco.
+
+    Lanza ValueError si el archivo no tiene las columnas necesarias.
+    """
+    contenido = leer_contenido(archivo)
+    # Las carteras tienen su propia carpeta: el recorte de los resultados no las alcanza.
+    cache = cache or CacheResultados(DIRECTORIO_CACHE / "carteras")
+    llave = hashlib.blake2b(contenido + f"|cartera|{VERSION_PARSER}".encode("utf-8"), digest_size=20).hexdigest()
+    with instrumentacion.etapa("cartera", archivo=archivo.name) as medicion:
+        tabla = cache.obtener(llave) if usar_cache else None
+        medicion.campos["cache"] = tabla is not None
+        if tabla is None:
+            tabla = _tabla_cartera(_leer_cartera(archivo))
+            if usar_cache:
+                cache.guardar(llave, tabla)
+                cache.recortar()
+        medicion.filas = len(tabla)
+    return tabla
+
+
+def _posiciones(llaves, buscadas):
+    """Fila de ``llaves`` de cada clave buscada: -1 si no está y -2 si está más de una vez."""
+    repetidas = llaves.duplicated(keep=False).to_numpy()
+    filas = np.flatnonzero(~repetidas)
+    encontradas = pd.Index(llaves[~repetidas]).get_indexer(buscadas)
+    posiciones = np.where(encontradas >= 0, filas[np.maximum(encontradas, 0)], -1)
+    ambiguas = pd.Index(llaves[repetidas].dropna().unique()).get_indexer(buscadas) >= 0
+    posiciones[ambiguas] = -2
+    return posiciones
+
+
+def conciliar(df, cartera):
+    """Cruza los pagos con la cartera y devuelve una copia con el resultado.
+
+    Cada pago se busca primero por la clave completa de la factura y, si no
+    aparece, por la numérica. En las facturas encontradas se completa
+    "VR. FACTURA" (si el procesador no la trae) y se recalcula "DIFERENCIA";
+    además se agregan el saldo en cartera y el estado de la conciliación. Un
+    pago de la misma factura por el mismo valor que uno anterior del lote se
+    marca como duplicado.
+    """
+    with instrumentacion.etapa("conciliacion") as medicion:
+        df = df.copy()
+        completa, numerica = claves_factura(df["APLICA A FV"])
+        posiciones = _posiciones(cartera["COMPLETA"], completa)
+        pendientes = posiciones < 0
+        posiciones[pendientes] = _posiciones(cartera["NUMERICA"], numerica[pendientes])
+        encontradas = posiciones >= 0
+
+        valor = np.where(encontradas, cartera["VALOR"].to_numpy()[np.maximum(posiciones, 0)], np.nan)
+        saldo = np.where(encontradas, cartera["SALDO"].to_numpy()[np.maximum(posiciones, 0)], np.nan)
+        completar = encontradas & df["VR. FACTURA"].fillna(0).eq(0).to_numpy()
+        df["VR. FACTURA"] = df["VR. FACTURA"].mask(completar, valor)
+        df["DIFERENCIA"] = df["DIFERENCIA"].mask(completar, df["VR. FACTURA"] - df["VR. BRUTO"])
+        df["SALDO CARTERA"] = saldo
+
+        duplicados = pd.DataFrame({"CLAVE": numerica, "VALOR": df["VR. BRUTO"]}).duplicated(keep="first").to_numpy() & numerica.notna().to_numpy()
+        estado = np.select(
+            [numerica.isna().to_numpy(), posiciones == -1, posiciones == -2, duplicados],
+            [SIN_FACTURA, NO_ESTA_EN_CARTERA, REPETIDA_EN_CARTERA, PAGO_DUPLICADO],
+            CONCILIADA,
+        )
+        df["CONCILIACION"] = pd.Categorical(estado, categories=ESTADOS)
+        medicion.filas = len(df)
+        medicion.campos["conciliadas"] = int(encontradas.sum())
+    return df
+
+
+def resumen_conciliacion(df):
+    """Cantidad de pagos y valor bruto por estado de conciliación."""
+    return df.groupby("CONCILIACION", observed=False).agg(PAGOS=("VR. BRUTO", "size"), VALOR=("VR. BRUTO", "sum")).reset_index()
@@ -0,0 +1,113 @@
+"""Catálogo de entidades (NIT, razón social y plan) de lista_de_clientes.xlsx.
+
+El Excel se compila una vez a un archivo binario en la caché, con los índices
+que usa la interfaz; mientras el Excel no cambie, cada sesión nueva lee ese
+archivo en lugar de volver a abrir el libro.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+from io import BytesIO
+from pathlib import Path
+
+import pandas as pd
+
+from lector_cartera.cache import DIRECTORIO_CACHE
+
+RUTA_CLIENTES = Path(__file__).resolve().parent.parent / "lista_de_clientes.xlsx"
+HOJA_CLIENTES = "Base Clientes"
+
+# Subir este número cuando cambie lo que guarda Catalogo.
+VERSION_CATALOGO = 1
+
+
+class Catalogo:
+    """Entidades del catálogo y sus índices.
+
+    ``planes`` y ``razones`` están en el orden del archivo; ``por_plan`` da las
+    razones sociales de cada plan y ``por_razon`` el (NIT, plan) de la primera
+    fila de cada razón social.
+    """
+
+    def __init__(self, entidades):
+        self.entidades = entidades
+        self.planes = list(dict.fromkeys(entidades["Plan"])) if not entidades.empty else []
+        self.razones = list(dict.fromkeys(entidades["Razon Social"])) if not entidades.empty else []
+        self.por_plan = {}
+        self.por_razon = {}
+        for nit, razon, plan in entidades[["Nit", "Razon Social", "Plan"]].itertuples(index=False) if not entidades.empty else ():
+            razones = self.por_plan.setdefault(plan, [])
+            if razon not in razones:
+                razones.append(razon)
+            self.por_razon.setdefault(razon, (nit, plan))
+
+    @property
+    def vacio(self):
+        return not self.razones
+
+
+def _leer_clientes(origen):
+    entidades = pd.read_excel(origen, sheet_name=HOJA_CLIENTES)
+    entidades.columns = entidades.columns.str.strip()
+    return entidades
+
+
+def cargar_catalogo(ruta=RUTA_CLIENTES, directorio=DIRECTORIO_CACHE):
+    """Catálogo de ``ruta``, compilado o tomado de la caché en ``directorio``.
+
+    La copia compilada vale mientras el Excel tenga la misma fecha de
+    modificación y tamaño; si solo cambió la fecha, se compara el hash del
+    contenido antes de volver a leer el libro.
+    """
+    ruta = Path(ruta)
+    estado = ruta.stat()
+    compilado = Path(directorio) / "catalogo" / f"{hashlib.blake2b(str(ruta.resolve()).encode('utf-8'), digest_size=10).hexdigest()}.pkl"
+    try:
+        with open(compilado, "rb") as f:
+            version, modificado, tamano, huella, catalogo = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, ValueError):
+        version = None
+    if version == VERSION_CATALOGO and (modificado, tamano) == (estado.st_mtime_ns, estado.st_size):
+        return catalogo
+
+    contenido = ruta.read_bytes()
+    nueva_huella = hashlib.blake2b(contenido, digest_size=20).hexdigest()
+    if version != VERSION_CATALOGO or nueva_huella != huella:
+        catalogo = Catalogo(_leer_clientes(BytesIO(contenido)))
+    try:
+        compilado.parent.mkdir(parents=True, exist_ok=True)
+        # Un temporal propio por escritura: dos sesiones pueden compilar el catálogo a la vez.
+        descriptor, temporal = tempfile.mkstemp(dir=compilado.parent, prefix=f"{compilado.stem}.", suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "wb") as f:
+                pickle.dump((VERSION_CATALOGO, estado.st_mtime_ns, estado.st_size, nueva_huella, catalogo), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporal, compilado)
+        except BaseException:
+            Path(temporal).unlink(missing_ok=True)
+            raise
+    except OSError:
+        # Sin caché escribible el catálogo se compila en cada sesión.
+        pass
+    return catalogo
+
+
+def cargar_entidades(ruta=RUTA_CLIENTES):
+    return cargar_catalogo(ruta).entidades
+
+
+def buscar_entidad(df_entidades, entidad, plan=None):
+    """Devuelve (razón social, NIT, plan) a partir de la razón social o el NIT."""
+    valor = str(entidad).strip()
+    coincidencias = df_entidades[df_entidades["Razon Social"] == valor]
+    if coincidencias.empty:
+        coincidencias = df_entidades[df_entidades["Nit"].astype(str).str.strip() == valor]
+    if plan is not None:
+        coincidencias = coincidencias[coincidencias["Plan"] == plan]
+    if coincidencias.empty:
+        raise ValueError(f"No se encontró la entidad '{entidad}' en el catálogo de clientes.")
+    if coincidencias["Razon Social"].nunique() > 1 or (plan is None and coincidencias["Plan"].nunique() > 1):
+        opciones = "; ".join(f"{r['Razon Social']} ({r['Plan']})" for _, r in coincidencias.iterrows())
+        raise ValueError(f"'{entidad}' corresponde a varias entidades, especifique el plan: {opciones}")
+    info_entidad = coincidencias.iloc[0]
+    return info_entidad["Razon Social"], info_entidad["Nit"], info_entidad["Plan"]
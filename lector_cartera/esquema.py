@@ -0,0 +1,100 @@
+"""Esquema canónico del reporte de cartera que producen todos los procesadores."""
+import warnings
+
+import pandas as pd
+
+COLUMNAS = ["SEDE", "FECHA", "NIT", "ASEGURADORA", "PLAN", "CASO", "APLICA A FV", "VR. FACTURA", "VR. BRUTO", "(-) RETEF", "(-) ICA", "IVA", "SUMA RETENCIONES", "VR. RECAUDADO", "DIFERENCIA", "ARCHIVO"]
+COLUMNAS_VALOR = ["VR. FACTURA", "VR. BRUTO", "(-) RETEF", "(-) ICA", "IVA", "SUMA RETENCIONES", "VR. RECAUDADO", "DIFERENCIA"]
+COLUMNAS_CONSTANTES = ["SEDE", "NIT", "ASEGURADORA", "PLAN", "CASO", "ARCHIVO"]
+# Valores que se suman en los totales del resultado.
+COLUMNAS_TOTALES = ["VR. BRUTO", "SUMA RETENCIONES", "VR. RECAUDADO", "DIFERENCIA"]
+
+# Nombres que usaban versiones anteriores de los procesadores.
+NOMBRES_ANTERIORES = {
+    "APLICA FV": "APLICA A FV",
+    "VR. RECAUDO": "VR. RECAUDADO",
+    "Archivo": "ARCHIVO",
+    "ARCHIVOS": "ARCHIVO",
+}
+
+
+def texto_factura(serie):
+    """Convierte los números de factura a texto sin perder los ceros ni agregar '.0'."""
+    if pd.api.types.is_float_dtype(serie) and (serie.dropna() % 1 == 0).all():
+        serie = serie.astype("Int64")
+    return serie.astype("string")
+
+
+def valores(serie):
+    return pd.to_numeric(serie, errors="coerce").astype("float64")
+
+
+def unir(partes):
+    """Concatena resultados canónicos conservando las columnas constantes como categorías."""
+    partes = [p for p in partes if p is not None and not p.empty]
+    if not partes:
+        return pd.DataFrame()
+    df = pd.concat(partes, ignore_index=True)
+    for columna in COLUMNAS_CONSTANTES:
+        if columna in df.columns:
+            df[columna] = df[columna].astype("category")
+    return df
+
+
+def vacio():
+    """Resultado canónico sin filas: el de un archivo que se leyó bien pero no trae pagos."""
+    return pd.DataFrame(columns=COLUMNAS)
+
+
+def normalizar_esquema(df, formato_fecha=None):
+    """Lleva un DataFrame con las columnas del reporte al esquema canónico y sus tipos."""
+    if df.empty:
+        return pd.DataFrame()
+    df = df.rename(columns=NOMBRES_ANTERIORES).reindex(columns=COLUMNAS)
+    for columna in COLUMNAS_VALOR:
+        df[columna] = valores(df[columna])
+    if formato_fecha is not None:
+        df["FECHA"] = pd.to_datetime(df["FECHA"], format=formato_fecha, errors="coerce")
+    df["APLICA A FV"] = texto_factura(df["APLICA A FV"])
+    for columna in COLUMNAS_CONSTANTES:
+        df[columna] = df[columna].fillna("").astype("category")
+    return df
+
+
+def fechas_archivo(serie, forzar=False):
+    """Fechas de un archivo como datetime; si alguna no se entiende se deja el texto original.
+
+    Con ``forzar`` siempre se devuelven fechas y las que no se entienden quedan vacías (NaT).
+    """
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie
+    validas = serie.dropna()
+    # Los textos que no empiezan por el año vienen como dd/mm/aaaa, como en el resto de Colombia.
+    # Se mira el primer texto: en un Excel puede haber fechas ya convertidas antes.
+    primero = next((valor for valor in validas if isinstance(valor, str)), "")
+    dia_primero = bool(primero) and not primero[:4].isdigit()
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        fechas = pd.to_datetime(serie, errors="coerce", dayfirst=dia_primero)
+    return fechas if forzar or fechas.notna().sum() == len(validas) else serie
+
+
+def dias(df):
+    """FECHA de cada fila como texto AAAA-MM-DD, interpretada archivo por archivo.
+
+    Las fechas que no se entienden quedan como vienen, y las vacías como "Sin fecha".
+    """
+    partes = []
+    if {"ARCHIVO", "FECHA"} <= set(df.columns):
+        for _, serie in df.groupby("ARCHIVO", sort=False, observed=True)["FECHA"]:
+            fechas = fechas_archivo(serie)
+            partes.append(fechas.dt.strftime("%Y-%m-%d") if pd.api.types.is_datetime64_any_dtype(fechas) else fechas.astype("string"))
+    if not partes:
+        return pd.Series("Sin fecha", index=df.index, dtype="string", name="FECHA")
+    return pd.concat(partes).astype("string").reindex(df.index).fillna("Sin fecha")
+
+
+def totales(df, por):
+    """Cantidad de filas y suma de COLUMNAS_TOTALES por cada valor de ``por`` (columna o serie)."""
+    grupos = df.groupby(por, sort=False, observed=True, dropna=False)
+    return grupos.agg(FILAS=("VR. BRUTO", "size"), **{columna: (columna, "sum") for columna in COLUMNAS_TOTALES}).reset_index()
@@ -0,0 +1,233 @@
+"""Lectura de los estados de cuenta en Excel."""
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+FILAS_ENCABEZADO = 30
+
+
+def leer_primeras_filas(archivo, n=FILAS_ENCABEZADO, sheet_name=0):
+    """Lee solo las primeras ``n`` filas de la hoja, sin cargar el resto del libro."""
+    archivo.seek(0)
+    if archivo.name.lower().endswith(".xls"):
+        df = pd.read_excel(archivo, sheet_name=sheet_name, header=None, nrows=n)
+        filas = [tuple(None if pd.isna(v) else v for v in fila) for fila in df.itertuples(index=False)]
+    else:
+        # openpyxl (y PIL, que importa) se cargan solo al leer el primer libro.
+        from openpyxl import load_workbook
+
+        libro = load_workbook(archivo, read_only=True, data_only=True)
+        try:
+            hoja = libro.worksheets[sheet_name] if isinstance(sheet_name, int) else libro[sheet_name]
+            filas = [fila for fila, _ in zip(hoja.iter_rows(values_only=True), range(n))]
+        finally:
+            libro.close()
+    archivo.seek(0)
+    return filas
+
+
+def buscar_fila_encabezado(filas, columnas):
+    """Ubica la primera fila que contiene todas las ``columnas`` (sin espacios sobrantes).
+
+    Devuelve (índice de la fila, []) o, si ninguna fila las tiene todas,
+    (None, columnas que faltan en la fila más parecida).
+    """
+    requeridas = set(columnas)
+    faltantes = list(columnas)
+    for idx, fila in enumerate(filas):
+        presentes = {str(celda).strip() for celda in fila if celda is not None}
+        if requeridas <= presentes:
+            return idx, []
+        pendientes = [c for c in columnas if c not in presentes]
+        if len(pendientes) < len(faltantes):
+            faltantes = pendientes
+    return None, faltantes
+
+
+_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_NS_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_NS_PKG = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+
+def _numero(texto):
+    # Igual que pandas: los flotantes enteros de Excel se leen como enteros.
+    if "." in texto or "E" in texto or "e" in texto:
+        valor = float(texto)
+        return int(valor) if valor.is_integer() else valor
+    return int(texto)
+
+
+def _indice_columna(referencia):
+    indice = 0
+    for letra in referencia:
+        if letra.isdigit():
+            break
+        indice = indice * 26 + ord(letra) - 64
+    return indice - 1
+
+
+class _LibroXlsx:
+    """Acceso mínimo al XML de un .xlsx: hojas, cadenas compartidas y estilos de fecha."""
+
+    def __init__(self, archivo):
+        from xml.etree.ElementTree import fromstring
+
+        from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900, from_excel
+
+        self.zip = zipfile.ZipFile(archivo)
+        libro = fromstring(self.zip.read("xl/workbook.xml"))
+        relaciones = fromstring(self.zip.read("xl/_rels/workbook.xml.rels"))
+        destinos = {r.get("Id"): r.get("Target") for r in relaciones.iter(f"{_NS_PKG}Relationship")}
+        self.hojas = {}
+        for hoja in libro.iter(f"{_NS}sheet"):
+            destino = destinos[hoja.get(f"{_NS_REL}id")].lstrip("/")
+            self.hojas[hoja.get("name")] = destino if destino.startswith("xl/") else f"xl/{destino}"
+        propiedades = libro.find(f"{_NS}workbookPr")
+        fecha_1904 = propiedades is not None and propiedades.get("date1904") in ("1", "true")
+        self.epoca = CALENDAR_MAC_1904 if fecha_1904 else CALENDAR_WINDOWS_1900
+        self._desde_excel = from_excel
+        self.cadenas = self._leer_cadenas()
+        self.estilos_fecha = self._leer_estilos_fecha()
+
+    def _leer_cadenas(self):
+        from xml.etree.ElementTree import iterparse
+
+        if "xl/sharedStrings.xml" not in self.zip.namelist():
+            return []
+        cadenas = []
+        with self.zip.open("xl/sharedStrings.xml") as f:
+            for _, elemento in iterparse(f):
+                if elemento.tag == f"{_NS}si":
+                    cadenas.append("".join(t.text or "" for t in elemento.iter(f"{_NS}t")))
+                    elemento.clear()
+        return cadenas
+
+    def _leer_estilos_fecha(self):
+        from xml.etree.ElementTree import fromstring
+
+        from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+
+        if "xl/styles.xml" not in self.zip.namelist():
+            return set()
+        estilos = fromstring(self.zip.read("xl/styles.xml"))
+        formatos = dict(BUILTIN_FORMATS)
+        formatos.update({int(f.get("numFmtId")): f.get("formatCode") for f in estilos.iter(f"{_NS}numFmt")})
+        celdas = estilos.find(f"{_NS}cellXfs")
+        if celdas is None:
+            return set()
+        return {i for i, xf in enumerate(celdas.iter(f"{_NS}xf")) if is_date_format(formatos.get(int(xf.get("numFmtId", 0)), ""))}
+
+    def ruta_hoja(self, sheet_name):
+        if isinstance(sheet_name, int):
+            return list(self.hojas.values())[sheet_name]
+        return self.hojas[sheet_name]
+
+    def _valor(self, celda):
+        tipo = celda.get("t", "n")
+        if tipo == "inlineStr":
+            # pandas trata las cadenas vacías como valores faltantes.
+            return "".join(t.text or "" for t in celda.iter(f"{_NS}t")) or None
+        v = celda.find(f"{_NS}v")
+        if v is None or v.text is None:
+            return None
+        if tipo == "s":
+            return self.cadenas[int(v.text)] or None
+        if tipo == "n":
+            valor = _numero(v.text)
+            if int(celda.get("s", 0)) in self.estilos_fecha:
+                return self._desde_excel(valor, self.epoca)
+            return valor
+        if tipo == "b":
+            return v.text == "1"
+        if tipo == "e":
+            return None
+        return v.text or None
+
+    def filas(self, sheet_name, indices=None):
+        """Recorre las filas como diccionarios {índice de columna: valor}.
+
+        Solo se convierten las celdas de ``indices`` (todas si es None); las
+        filas que no existen en el XML se entregan vacías.
+        """
+        from xml.etree.ElementTree import iterparse
+
+        siguiente = 1
+        with self.zip.open(self.ruta_hoja(sheet_name)) as f:
+            for _, elemento in iterparse(f):
+                if elemento.tag != f"{_NS}row":
+                    continue
+                numero = int(elemento.get("r", siguiente))
+                for _ in range(siguiente, numero):
+                    yield {}
+                siguiente = numero + 1
+                fila = {}
+                for posicion, celda in enumerate(elemento.iter(f"{_NS}c")):
+                    referencia = celda.get("r")
+                    i = _indice_columna(referencia) if referencia else posicion
+                    if indices is None or i in indices:
+                        fila[i] = self._valor(celda)
+                    elif len(celda):
+                        # Basta con saber que la fila tiene datos para no descartarla.
+                        fila[-1] = True
+                yield fila
+                elemento.clear()
+
+
+def leer_columnas(archivo, columnas, header=0, sheet_name=0, dtype=None, normalizar=None):
+    """Lee del libro solo las ``columnas`` indicadas recorriendo el XML de la hoja.
+
+    Solo se convierten las celdas de esas columnas, así el tiempo y la memoria
+    bajan en proporción a las columnas que se ignoran. Las columnas que no
+    estén en el encabezado se omiten del resultado, así el llamador decide si es
+    un error. ``dtype`` fija el tipo de las columnas (normalmente float64 para
+    los valores); ``normalizar`` se aplica a los nombres del encabezado antes de
+    compararlos.
+    """
+    dtype = dtype or {}
+    archivo.seek(0)
+    if archivo.name.lower().endswith(".xls"):
+        df = pd.read_excel(archivo, sheet_name=sheet_name, header=header)
+        if normalizar is not None:
+            df.columns = [normalizar(str(c)) for c in df.columns]
+        df = df[[c for c in columnas if c in df.columns]]
+    else:
+        libro = _LibroXlsx(archivo)
+        try:
+            filas = libro.filas(sheet_name)
+            for _ in range(header):
+                next(filas, None)
+            encabezado = next(filas, {})
+            filas.close()
+            posiciones = {}
+            for i in sorted(encabezado):
+                nombre = encabezado[i]
+                if nombre is None or i < 0:
+                    continue
+                nombre = normalizar(str(nombre)) if normalizar is not None else nombre
+                posiciones.setdefault(nombre, i)
+            seleccion = [(c, posiciones[c]) for c in columnas if c in posiciones]
+            valores = {c: [] for c, _ in seleccion}
+            filas_con_datos = 0
+            filas = libro.filas(sheet_name, {i for _, i in seleccion})
+            for _ in range(header + 1):
+                next(filas, None)
+            for n, fila in enumerate(filas, start=1):
+                for c, i in seleccion:
+                    valores[c].append(fila.get(i))
+                # pandas descarta las filas vacías del final de la hoja.
+                if any(v is not None for v in fila.values()):
+                    filas_con_datos = n
+        finally:
+            libro.zip.close()
+        df = pd.DataFrame({c: v[:filas_con_datos] for c, v in valores.items()})
+        for columna in df.columns[df.dtypes == object]:
+            df[columna] = df[columna].where(df[columna].notna(), np.nan)
+    for columna, tipo in dtype.items():
+        if columna in df.columns:
+            try:
+                df[columna] = df[columna].astype(tipo)
+            except (ValueError, TypeError):
+                pass
+    archivo.seek(0)
+    return df
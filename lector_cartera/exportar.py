@@ -0,0 +1,126 @@
+"""Generación del reporte consolidado en Excel, CSV comprimido o Parquet."""
+import importlib.util
+import os
+import tempfile
+
+from lector_cartera import instrumentacion
+
+HOJA_REPORTE = "Procesado"
+FORMATO_FECHA = "dd/mm/yyyy"
+# Filas de datos que caben en una hoja de Excel (1.048.576 con el encabezado).
+FILAS_HOJA = 1_048_575
+
+
+def _columna_para_excel(serie):
+    """Convierte una columna en una lista de valores de Python; los faltantes quedan como None."""
+    valores = serie.astype(object).where(serie.notna(), None)
+    return valores.tolist()
+
+
+def _nombre_hoja(valor, usados):
+    # Excel limita los nombres de hoja a 31 caracteres y prohíbe []:*?/\
+    nombre = "".join(" " if c in '[]:*?/\\' else c for c in str(valor)).strip()[:31].strip() or HOJA_REPORTE
+    base, n = nombre, 2
+    while nombre.lower() in usados:
+        sufijo = f" ({n})"
+        nombre, n = base[:31 - len(sufijo)] + sufijo, n + 1
+    usados.add(nombre.lower())
+    return nombre
+
+
+def _escribir_hoja(libro, nombre, df_final, encabezado, usados):
+    # xlsxwriter descarta sin error las filas que no caben en la hoja; las que
+    # pasan de FILAS_HOJA siguen en hojas "<nombre> (2)", "<nombre> (3)"...
+    for inicio in range(0, max(len(df_final), 1), FILAS_HOJA):
+        parte = df_final.iloc[inicio:inicio + FILAS_HOJA]
+        hoja = libro.add_worksheet(_nombre_hoja(nombre, usados))
+        hoja.write_row(0, 0, [str(c) for c in parte.columns], encabezado)
+        columnas = [_columna_para_excel(parte[c]) for c in parte.columns]
+        for fila, valores in enumerate(zip(*columnas), start=1):
+            hoja.write_row(fila, 0, valores)
+
+
+def escribir_excel(df_final, destino, separar_por=None):
+    """Escribe el reporte fila por fila con xlsxwriter en modo de memoria constante.
+
+    Con ``separar_por`` se escribe una hoja por cada valor de esa columna (por
+    ejemplo, una por aseguradora) en el orden en que aparecen. Las filas que no
+    caben en una hoja siguen en la siguiente.
+    """
+    import xlsxwriter
+
+    libro = xlsxwriter.Workbook(destino, {"constant_memory": True, "default_date_format": FORMATO_FECHA})
+    try:
+        encabezado = libro.add_format({"bold": True, "border": 1})
+        usados = set()
+        if separar_por is None:
+            _escribir_hoja(libro, HOJA_REPORTE, df_final, encabezado, usados)
+        else:
+            for valor, grupo in df_final.groupby(separar_por, sort=False, observed=True):
+                _escribir_hoja(libro, valor, grupo, encabezado, usados)
+    finally:
+        libro.close()
+
+
+def escribir_csv(df_final, destino):
+    df_final.to_csv(destino, index=False, chunksize=50_000)
+
+
+def escribir_csv_gz(df_final, destino):
+    df_final.to_csv(destino, index=False, compression="gzip", chunksize=50_000)
+
+
+def escribir_parquet(df_final, destino):
+    # Parquet exige un solo tipo por columna; las columnas mixtas se guardan como texto.
+    mixtas = {columna: "string" for columna in df_final.columns[df_final.dtypes == object]}
+    (df_final.astype(mixtas) if mixtas else df_final).to_parquet(destino, index=False)
+
+
+FORMATOS = {
+    "xlsx": (escribir_excel, "Excel", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv": (escribir_csv, "CSV", "text/csv"),
+    "csv.gz": (escribir_csv_gz, "CSV comprimido", "application/gzip"),
+    "parquet": (escribir_parquet, "Parquet", "application/vnd.apache.parquet"),
+}
+
+
+def formatos_disponibles():
+    formatos = ["xlsx", "csv.gz"]
+    if importlib.util.find_spec("pyarrow") is not None:
+        formatos.append("parquet")
+    return formatos
+
+
+def escribir_reporte(df_final, destino, formato="xlsx", separar_por=None):
+    """Escribe el reporte; ``separar_por`` solo aplica al Excel, los demás formatos son una sola tabla."""
+    with instrumentacion.etapa("exportacion", formato=formato) as medicion:
+        medicion.filas = len(df_final)
+        if formato == "xlsx":
+            escribir_excel(df_final, destino, separar_por)
+        else:
+            FORMATOS[formato][0](df_final, destino)
+
+
+def exportar(df_final, formato="xlsx", separar_por=None):
+    """Devuelve los bytes del reporte; se escribe a un archivo temporal para no duplicarlo en memoria."""
+    descriptor, ruta = tempfile.mkstemp(suffix=f".{formato}")
+    os.close(descriptor)
+    try:
+        escribir_reporte(df_final, ruta, formato, separar_por)
+        with open(ruta, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(ruta)
+
+
+def formato_de_ruta(ruta):
+    ruta = ruta.lower()
+    if ruta.endswith((".csv", ".csv.gz")):
+        return "csv.gz" if ruta.endswith(".gz") else "csv"
+    if ruta.endswith(".parquet"):
+        return "parquet"
+    return "xlsx"
+
+
+def nombre_reporte(selection_entidad, extension="xlsx"):
+    return f'reporte_{selection_entidad.replace(" ", "_")}.{extension}'
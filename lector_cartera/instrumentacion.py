@@ -0,0 +1,165 @@
+"""Eventos de diagnóstico por etapa del procesamiento.
+
+Cada evento es un diccionario con la etapa, la duración en segundos y, según
+el caso, el archivo, el procesador, las filas y el error. Los eventos van al
+``Registro`` capturado en el hilo actual (por ejemplo, el de un trabajo) y al
+registro global, que se activa con la variable CARTERA_DIAGNOSTICO apuntando a
+un archivo JSON lines. Sin ningún registro activo las mediciones no hacen nada.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("lector_cartera")
+
+_local = threading.local()
+
+
+class Registro:
+    """Acumula eventos en memoria y, si se indica ``ruta``, los agrega a un archivo JSON lines."""
+
+    def __init__(self, ruta=None, en_memoria=True):
+        self.ruta = ruta
+        self.en_memoria = en_memoria
+        self.eventos = []
+        self._candado = threading.Lock()
+
+    def agregar(self, evento):
+        with self._candado:
+            if self.en_memoria:
+                self.eventos.append(evento)
+            if self.ruta:
+                with open(self.ruta, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(evento, ensure_ascii=False, default=str) + "\n")
+
+
+REGISTRO_GLOBAL = Registro(os.environ["CARTERA_DIAGNOSTICO"], en_memoria=False) if os.environ.get("CARTERA_DIAGNOSTICO") else None
+
+
+class _Medicion:
+    __slots__ = ("filas", "campos")
+
+    def __init__(self):
+        self.filas = None
+        self.campos = {}
+
+
+def _registros():
+    registro = getattr(_local, "registro", None)
+    if getattr(_local, "aislado", False):
+        return [registro]
+    return [r for r in (registro, REGISTRO_GLOBAL) if r is not None]
+
+
+def activo():
+    return getattr(_local, "registro", None) is not None or REGISTRO_GLOBAL is not None
+
+
+@contextmanager
+def capturar(registro, aislado=False):
+    """Envía a ``registro`` los eventos de este hilo mientras dure el bloque (None no cambia nada).
+
+    Con ``aislado`` los eventos no llegan al registro global ni heredan el
+    contexto actual; sirve cuando se van a reemitir después con el contexto de
+    quien los recibe, como los de los procesos hijos.
+    """
+    if registro is None:
+        yield None
+        return
+    anterior = getattr(_local, "registro", None), getattr(_local, "aislado", False), getattr(_local, "contexto", {})
+    _local.registro, _local.aislado = registro, aislado
+    if aislado:
+        _local.contexto = {}
+    try:
+        yield registro
+    finally:
+        _local.registro, _local.aislado, _local.contexto = anterior
+
+
+@contextmanager
+def contexto(**campos):
+    """Agrega ``campos`` (archivo, procesador, trabajo...) a los eventos emitidos dentro del bloque."""
+    anterior = getattr(_local, "contexto", {})
+    _local.contexto = {**anterior, **campos}
+    try:
+        yield
+    finally:
+        _local.contexto = anterior
+
+
+def _emitir(evento):
+    for registro in _registros():
+        registro.agregar(evento)
+
+
+def registrar(etapa, segundos, filas=None, error=None, **campos):
+    """Emite un evento ya medido; no hace nada si no hay registros activos."""
+    if not activo():
+        return
+    evento = {"momento": time.time(), **getattr(_local, "contexto", {}), **campos, "etapa": etapa, "segundos": round(segundos, 6)}
+    if filas is not None:
+        evento["filas"] = filas
+    if error is not None:
+        evento["error"] = error
+    _emitir(evento)
+
+
+def fallo(etapa, error, **campos):
+    """Reporta un error recuperable: al log y, si hay registros activos, como evento."""
+    contexto_actual = {**getattr(_local, "contexto", {}), **campos}
+    donde = " ".join(f"{k}={v}" for k, v in contexto_actual.items())
+    logger.warning(f"Error en {etapa} ({donde}): {error}" if donde else f"Error en {etapa}: {error}")
+    registrar(etapa, 0.0, error=f"{type(error).__name__}: {error}" if isinstance(error, Exception) else str(error), **campos)
+
+
+@contextmanager
+def etapa(nombre, **campos):
+    """Mide el bloque como una etapa; ``medicion.filas`` y ``medicion.campos`` se agregan al evento."""
+    if not activo():
+        yield _Medicion()
+        return
+    medicion = _Medicion()
+    inicio = time.perf_counter()
+    error = None
+    try:
+        yield medicion
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        registrar(nombre, time.perf_counter() - inicio, medicion.filas, error, **campos, **medicion.campos)
+
+
+def reemitir(eventos):
+    """Vuelve a emitir en este hilo los eventos recogidos en otro proceso, con el contexto actual."""
+    actual = getattr(_local, "contexto", {})
+    for evento in eventos:
+        _emitir({**actual, **evento})
+
+
+def resumen(eventos):
+    """Tabla con el total de eventos, segundos, filas y errores por etapa."""
+    import pandas as pd
+
+    if not eventos:
+        return pd.DataFrame(columns=["ETAPA", "EVENTOS", "SEGUNDOS", "PROMEDIO", "MAXIMO", "FILAS", "ERRORES"])
+    df = pd.DataFrame(eventos)
+    for columna in ("filas", "error"):
+        if columna not in df.columns:
+            df[columna] = None
+    tabla = df.groupby("etapa", sort=False).agg(
+        EVENTOS=("segundos", "size"),
+        SEGUNDOS=("segundos", "sum"),
+        PROMEDIO=("segundos", "mean"),
+        MAXIMO=("segundos", "max"),
+        FILAS=("filas", "sum"),
+        ERRORES=("error", "count"),
+    )
+    return tabla.rename_axis("ETAPA").reset_index()
+
+
+def a_jsonl(eventos):
+    return "".join(json.dumps(evento, ensure_ascii=False, default=str) + "\n" for evento in eventos).encode("utf-8")
@@ -0,0 +1,490 @@
+"""Motor de procesamiento de estados de cuenta Excel/CSV guiado por layouts.
+
+Cada formato de aseguradora es un ``Layout``: las columnas que lo identifican,
+cómo se renombran al esquema canónico y las fórmulas de las columnas
+calculadas. Un formato nuevo se agrega como un Layout más en LAYOUTS, sin
+escribir un procesador.
+
+Los CSV se leen por bloques de FILAS_BLOQUE_CSV filas, solo con las columnas
+del layout y con los valores ya como float64; cada bloque se convierte al
+esquema canónico antes de leer el siguiente, así la memoria de la lectura no
+crece con el tamaño del archivo.
+"""
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from lector_cartera import instrumentacion
+from lector_cartera.archivos import abrir_archivo
+from lector_cartera.avisos import avisar
+from lector_cartera.esquema import COLUMNAS, COLUMNAS_CONSTANTES, COLUMNAS_VALOR, fechas_archivo, texto_factura, valores
+from lector_cartera.excel import FILAS_ENCABEZADO, buscar_fila_encabezado, leer_columnas, leer_primeras_filas
+
+EXTENSIONES_EXCEL = (".xlsx", ".xls")
+EXTENSIONES_CSV = (".csv",)
+
+# Filas de cada bloque al leer un CSV (CARTERA_CSV_FILAS_BLOQUE).
+FILAS_BLOQUE_CSV = int(os.environ.get("CARTERA_CSV_FILAS_BLOQUE", "200000"))
+
+
+@dataclass(frozen=True)
+class Layout:
+    nombre: str
+    # Columnas de origen que identifican el formato; son también las que se leen.
+    columnas: tuple
+    # Columna de origen -> columna canónica.
+    renombrar: dict
+    # Columna canónica -> constante o función del DataFrame ya renombrado; se evalúan en orden.
+    calculadas: dict = field(default_factory=dict)
+    extensiones: tuple = EXTENSIONES_EXCEL
+    hoja: object = 0
+    opciones_csv: dict = field(default_factory=dict)
+    # Conversión de columnas de origen antes de renombrar (por ejemplo, valores con "$").
+    convertir: dict = field(default_factory=dict)
+    # Etiquetas del preámbulo cuyo valor (la celda a la derecha) se vuelve columna: canónica -> etiqueta.
+    campos: dict = field(default_factory=dict)
+    # Columnas de origen con valores que solo se usan en las fórmulas.
+    valores: tuple = ()
+    formato_fecha: Optional[str] = None
+    descartar_incompletas: bool = False
+
+    @property
+    def columnas_valor(self):
+        return [origen for origen, destino in self.renombrar.items() if destino in COLUMNAS_VALOR] + list(self.valores)
+
+
+def _moneda(serie):
+    return serie.astype(str).str.replace("$", "", regex=False).str.replace(",", "", regex=False).astype(float).round(0)
+
+
+# Espacios que separan palabras para str.split() en un texto latin-1; \s solo no incluye el espacio duro.
+_ESPACIO = r"[\s\x0b\x1c-\x1f\x85\xa0]"
+
+
+def _primera_palabra(serie):
+    # Igual que serie.str.split(n=1).str[0], sin armar la lista de palabras de cada fila.
+    return serie.str.extract(rf"^{_ESPACIO}*([^\s\x0b\x1c-\x1f\x85\xa0]+)", expand=False)
+
+
+_RETENCIONES_AXA = {
+    "VR. FACTURA": lambda d: d["VR. BRUTO"],
+    "SUMA RETENCIONES": lambda d: d["VR. BRUTO"] - d["VR. RECAUDADO"],
+    "(-) RETEF": lambda d: (d["VR. BRUTO"] * 0.02).round(),
+    "(-) ICA": lambda d: d["SUMA RETENCIONES"] - d["(-) RETEF"],
+    "IVA": 0,
+    "DIFERENCIA": lambda d: d["VR. FACTURA"] - d["VR. BRUTO"],
+}
+
+_RETENCIONES_PREVISORA = {
+    "SUMA RETENCIONES": lambda d: d["(-) RETEF"] + d["(-) ICA"],
+    "VR. RECAUDADO": lambda d: d["VR. BRUTO"] - d["SUMA RETENCIONES"],
+    "DIFERENCIA": lambda d: d["VR. FACTURA"] - d["VR. BRUTO"],
+}
+
+_RENOMBRAR_PREVISORA = {
+    "FECHA DE TRANSFERENCIA": "FECHA",
+    "N°. Doc. de cobro": "APLICA A FV",
+    "Valor Reclamado": "VR. FACTURA",
+    "Valor pagado": "VR. BRUTO",
+    "I.V.A.": "IVA",
+    "Retención en la fuente": "(-) RETEF",
+    "I.C.A. - ImP. Ind y Ccio": "(-) ICA",
+}
+
+_LIBERTY = {
+    "VR. BRUTO": lambda d: d["VR. FACTURA"],
+    "IVA": 0,
+    "(-) ICA": 0,
+    "SUMA RETENCIONES": lambda d: d["(-) RETEF"] + d["(-) ICA"],
+    "DIFERENCIA": lambda d: d["VR. FACTURA"] - d["VR. BRUTO"],
+}
+
+_BOLIVAR = {
+    "VR. FACTURA": 0,
+    "IVA": 0,
+    "VR. BRUTO": lambda d: d["VR. RECAUDADO"] / 0.98,
+    "(-) RETEF": lambda d: (d["VR. BRUTO"] * 0.02).round(),
+    "SUMA RETENCIONES": lambda d: d["(-) RETEF"] + d["(-) ICA"],
+    "DIFERENCIA": lambda d: d["VR. FACTURA"] - d["VR. BRUTO"],
+}
+
+_SURA = dict(
+    columnas=("Factura", "Fecha Consignacion", "Vlr Factura", "Vlr Orden de Pago", "RteFete", "RteICA", "RteIVA", "Vlr Consignado"),
+    renombrar={
+        "Fecha Consignacion": "FECHA",
+        "Factura": "APLICA A FV",
+        "Vlr Factura": "VR. FACTURA",
+        "RteFete": "(-) RETEF",
+        "RteICA": "(-) ICA",
+        "RteIVA": "IVA",
+        "Vlr Consignado": "VR. RECAUDADO",
+    },
+    calculadas={
+        "SUMA RETENCIONES": lambda d: d["(-) RETEF"].fillna(0) + d["(-) ICA"].fillna(0),
+        "VR. BRUTO": lambda d: d["VR. FACTURA"],
+        "DIFERENCIA": lambda d: d["VR. FACTURA"] - d["VR. BRUTO"],
+    },
+    formato_fecha="%Y%m%d",
+)
+
+LAYOUTS = {
+    "AXA": [
+        Layout(
+            "AXA",
+            columnas=("Fecha de Pago", "N° Factura", "Valor Pagado Antes de Imp.", "Valor Pagado Despues de Imp."),
+            renombrar={"Fecha de Pago": "FECHA", "N° Factura": "APLICA A FV", "Valor Pagado Antes de Imp.": "VR. BRUTO", "Valor Pagado Despues de Imp.": "VR. RECAUDADO"},
+            calculadas=_RETENCIONES_AXA,
+        ),
+        Layout(
+            "AXA mayúsculas",
+            columnas=("No. FACTURA", "FECHA DE PAGO", "VALOR PAGADO DESPUES DE IMPUESTO", "VALOR PAGADO ANTES DE IMPUESTO"),
+            renombrar={"FECHA DE PAGO": "FECHA", "No. FACTURA": "APLICA A FV", "VALOR PAGADO ANTES DE IMPUESTO": "VR. BRUTO", "VALOR PAGADO DESPUES DE IMPUESTO": "VR. RECAUDADO"},
+            calculadas=_RETENCIONES_AXA,
+        ),
+        Layout(
+            "AXA con retenciones",
+            columnas=("FECHA_PAGO", "N° Factura", "Valor Pagado Antes de Imp.", "Valor Pagado Despues de Imp.", "RTE_FUENTE", "RETE_ICA", "RETE_IVA"),
+            renombrar={"FECHA_PAGO": "FECHA", "N° Factura": "APLICA A FV", "Valor Pagado Antes de Imp.": "VR. BRUTO", "Valor Pagado Despues de Imp.": "VR. RECAUDADO", "RTE_FUENTE": "(-) RETEF", "RETE_ICA": "(-) ICA", "RETE_IVA": "IVA"},
+            calculadas={
+                "VR. FACTURA": lambda d: d["VR. BRUTO"],
+                "SUMA RETENCIONES": lambda d: d["VR. BRUTO"] - d["VR. RECAUDADO"],
+                "DIFERENCIA": lambda d: d["VR. FACTURA"] - d["VR. BRUTO"],
+            },
+        ),
+    ],
+    "ADRES": [
+        Layout(
+            "ADRES",
+            hoja="Hoja1",
+            columnas=("Numero Paquete", "Factura", "Valor Reclamado", "Valor aprobado", "Valor glosado", "Servicios médicos", "Honorarios", "Compras"),
+            renombrar={"Factura": "APLICA A FV", "Valor Reclamado": "VR. FACTURA", "Valor aprobado": "VR. BRUTO"},
+            valores=("Servicios médicos", "Honorarios", "Compras"),
+            calculadas={
+                "SUMA RETENCIONES": lambda d: (d["Servicios médicos"] * 0.02) + (d["Honorarios"] * 0.11) + (d["Compras"] * 0.025),
+                "VR. RECAUDADO": lambda d: d["VR. BRUTO"] - d["SUMA RETENCIONES"],
+                "(-) RETEF": 0,
+                "(-) ICA": 0,
+                "IVA": 0,
+                "DIFERENCIA": lambda d: d["VR. FACTURA"] - d["VR. BRUTO"],
+            },
+        ),
+    ],
+    "PREVISORA": [
+        Layout(
+            "Previsora liquidación",
+            columnas=("N°. Doc. de cobro", "Valor Reclamado", "Valor pagado", "Valor Objetado", "I.V.A.", "Retención en la fuente", "I.C.A. - ImP. Ind y Ccio"),
+            campos={"FECHA DE TRANSFERENCIA": "FECHA DE TRANSFERENCIA O DE CHEQUE:"},
+            renombrar=_RENOMBRAR_PREVISORA,
+            calculadas=_RETENCIONES_PREVISORA,
+            descartar_incompletas=True,
+        ),
+        Layout(
+            "Previsora",
+            columnas=("Fecha", "Factura", "Valor_Factura", "Este_Pago", "ImpValorIVA", "ImpValorReteICA", "ImpValorReteFuente"),
+            renombrar={"Fecha": "FECHA", "Factura": "APLICA A FV", "ImpValorIVA": "IVA", "ImpValorReteICA": "(-) ICA", "ImpValorReteFuente": "(-) RETEF", "Este_Pago": "VR. BRUTO", "Valor_Factura": "VR. FACTURA"},
+            calculadas=_RETENCIONES_PREVISORA,
+        ),
+    ],
+    "MUNDIAL": [
+        Layout(
+            "Mundial",
+            columnas=("FECHA PAGO", "FACTURA", "VALOR RECLAMADO", "VALOR APROBADO", "Rete-Fuente", "ICA"),
+            renombrar={"FECHA PAGO": "FECHA", "FACTURA": "APLICA A FV", "VALOR RECLAMADO": "VR. FACTURA", "VALOR APROBADO": "VR. BRUTO", "Rete-Fuente": "(-) RETEF", "ICA": "(-) ICA"},
+            calculadas={
+                "SUMA RETENCIONES": lambda d: d["(-) RETEF"] + d["(-) ICA"],
+                "VR. RECAUDADO": lambda d: d["VR. BRUTO"] - d["SUMA RETENCIONES"],
+                "IVA": 0,
+                "DIFERENCIA": lambda d: d["VR. FACTURA"] - d["VR. BRUTO"],
+            },
+        ),
+    ],
+    "SURA": [
+        Layout("Sura CSV", extensiones=EXTENSIONES_CSV, opciones_csv=dict(encoding="latin-1", sep=";", header=1, index_col=False), **_SURA),
+        Layout("Sura", **_SURA),
+    ],
+    "LIBERTY": [
+        Layout(
+            "Liberty",
+            columnas=("FECHA GIRO", "NRO FACTURA", "VALOR LIQUIDADO", "VALOR RETEFUENTE", "VALOR PAGADO"),
+            renombrar={"FECHA GIRO": "FECHA", "NRO FACTURA": "APLICA A FV", "VALOR LIQUIDADO": "VR. FACTURA", "VALOR RETEFUENTE": "(-) RETEF", "VALOR PAGADO": "VR. RECAUDADO"},
+            calculadas=_LIBERTY,
+        ),
+        Layout(
+            "Liberty CSV",
+            extensiones=EXTENSIONES_CSV,
+            columnas=("Fecha_Pago", "No_Factura", "Valor_Pagado", "Valor_Ret", "Valor_Base"),
+            renombrar={"Fecha_Pago": "FECHA", "No_Factura": "APLICA A FV", "Valor_Base": "VR. FACTURA", "Valor_Ret": "(-) RETEF", "Valor_Pagado": "VR. RECAUDADO"},
+            calculadas=_LIBERTY,
+        ),
+    ],
+    "BOLIVAR": [
+        Layout(
+            "Bolívar",
+            columnas=("Fecha de Pago", "Detalle", "Rte. ICA", "Rte Fuente", "Valor pago"),
+            renombrar={"Fecha de Pago": "FECHA", "Detalle": "APLICA A FV", "Valor pago": "VR. RECAUDADO", "Rte. ICA": "(-) ICA"},
+            calculadas=_BOLIVAR,
+        ),
+        Layout(
+            "Bolívar CSV",
+            extensiones=EXTENSIONES_CSV,
+            opciones_csv=dict(encoding="latin-1", sep=";"),
+            columnas=("Fecha de Pago", "Detalles", "Rte. ICA", "Rte Fuente", "Valor pago"),
+            convertir={"Valor pago": _moneda},
+            renombrar={"Fecha de Pago": "FECHA", "Valor pago": "VR. RECAUDADO", "Rte. ICA": "(-) ICA"},
+            calculadas={"APLICA A FV": lambda d: _primera_palabra(d["Detalles"]), **_BOLIVAR},
+        ),
+    ],
+    "NUEVA EPS": [
+        Layout(
+            "Nueva EPS",
+            columnas=("Fecha Legalización", "Número Factura", "Valor Aplicación"),
+            renombrar={"Fecha Legalización": "FECHA", "Número Factura": "APLICA A FV", "Valor Aplicación": "VR. BRUTO"},
+            calculadas={"(-) RETEF": lambda d: d["VR. BRUTO"] * 0.02},
+        ),
+    ],
+}
+
+
+def _columnas_csv(archivo, layout):
+    archivo.seek(0)
+    columnas = pd.read_csv(archivo, nrows=0, **layout.opciones_csv).columns
+    archivo.seek(0)
+    return [str(c).strip() for c in columnas]
+
+
+def _valor_campo(filas, etiqueta):
+    for fila in filas:
+        for i, celda in enumerate(fila):
+            if isinstance(celda, str) and celda.strip() == etiqueta:
+                return next((v for v in fila[i + 1:] if v is not None), None)
+    return None
+
+
+def detectar_layout(archivo, layouts, vistas=None):
+    """Devuelve (layout, fila de encabezado, filas de vista previa) o (None, columnas faltantes, None).
+
+    ``vistas`` guarda las primeras filas de cada hoja ya leída; quien prueba
+    varios grupos de layouts sobre el mismo archivo puede compartirlo.
+    """
+    nombre = archivo.name.lower()
+    vistas = {} if vistas is None else vistas
+    mejor = None
+    for layout in layouts:
+        if not nombre.endswith(layout.extensiones):
+            continue
+        if layout.extensiones == EXTENSIONES_CSV:
+            filas = [_columnas_csv(archivo, layout)]
+        else:
+            if layout.hoja not in vistas:
+                try:
+                    vistas[layout.hoja] = leer_primeras_filas(archivo, FILAS_ENCABEZADO, layout.hoja)
+                except (KeyError, ValueError, IndexError):
+                    vistas[layout.hoja] = []
+            filas = vistas[layout.hoja]
+        fila, faltantes = buscar_fila_encabezado(filas, layout.columnas)
+        if fila is not None:
+            return layout, fila, filas
+        if mejor is None or len(faltantes) < len(mejor):
+            mejor = faltantes
+    return None, mejor or [], None
+
+
+class _ValorNoNumerico(ValueError):
+    pass
+
+
+def _tipos_csv(layout, columnas, tipar_valores):
+    # Los valores se leen ya como float64 y lo que pasa por ``convertir`` como
+    # texto; fechas y facturas quedan a la inferencia de pandas, como al leer
+    # el archivo entero (una fecha AAAAMMDD se lee y convierte más rápido como número).
+    tipos = {}
+    for original in columnas:
+        columna = str(original).strip()
+        if columna in layout.convertir:
+            tipos[original] = str
+        elif tipar_valores and columna in layout.columnas_valor:
+            tipos[original] = "float64"
+    return tipos
+
+
+def _bloques_csv(archivo, layout, tipar_valores):
+    archivo.seek(0)
+    encabezado = pd.read_csv(archivo, nrows=0, **layout.opciones_csv).columns
+    archivo.seek(0)
+    usecols = [c for c in encabezado if str(c).strip() in layout.columnas]
+    with pd.read_csv(archivo, usecols=usecols, dtype=_tipos_csv(layout, usecols, tipar_valores), chunksize=FILAS_BLOQUE_CSV, **layout.opciones_csv) as lector:
+        while True:
+            try:
+                bloque = next(lector)
+            except StopIteration:
+                return
+            except ValueError as e:
+                # Un texto en una columna tipada como float64.
+                if not tipar_valores:
+                    raise
+                raise _ValorNoNumerico(e) from e
+            bloque.columns = bloque.columns.astype(str).str.strip()
+            if not tipar_valores:
+                for columna in layout.columnas_valor:
+                    if columna not in layout.convertir:
+                        bloque[columna] = valores(bloque[columna])
+            yield bloque
+
+
+def _leer(archivo, layout, fila):
+    return leer_columnas(archivo, list(layout.columnas), header=fila, sheet_name=layout.hoja, dtype=dict.fromkeys(layout.columnas_valor, "float64"), normalizar=str.strip)
+
+
+def _bloques(archivo, layout, fila, tipar_valores=True):
+    if layout.extensiones == EXTENSIONES_CSV:
+        yield from _bloques_csv(archivo, layout, tipar_valores)
+    else:
+        yield _leer(archivo, layout, fila)
+
+
+def _fechas_partes(partes, nombre):
+    # FECHA se interpreta una sola vez por archivo, no por bloque, para que todos
+    # usen la misma regla de día o año primero. Las que no se entienden quedan
+    # vacías, con un aviso por archivo: un texto suelto dejaría como texto la
+    # columna FECHA de todo el lote.
+    originales = pd.concat([parte["FECHA"] for parte in partes], ignore_index=True)
+    fechas = fechas_archivo(originales, forzar=True)
+    perdidas = originales[fechas.isna() & originales.notna()]
+    perdidas = perdidas[perdidas.astype(str).str.strip() != ""]
+    if not perdidas.empty:
+        avisar(f"Archivo {nombre}: {len(perdidas)} fechas no reconocidas quedan vacías (por ejemplo '{perdidas.iloc[0]}').")
+    inicio = 0
+    for parte in partes:
+        parte["FECHA"] = fechas.iloc[inicio:inicio + len(parte)].to_numpy()
+        inicio += len(parte)
+
+
+def transformar_archivo(archivo, layout, fila, filas=None):
+    """Lee el archivo con su layout y devuelve sus filas canónicas, una parte por bloque leído.
+
+    Cada bloque se transforma antes de leer el siguiente. Si una columna de
+    valores de un CSV trae texto que no es número, el archivo se vuelve a leer
+    sin tipar los valores y ese texto queda vacío, como al leerlo entero. Sin
+    ``formato_fecha``, FECHA se convierte al final con ``fechas_archivo``; las
+    que no se entienden quedan vacías y se avisa.
+    """
+    lectura = transformacion = 0.0
+    leidas = 0
+    partes = []
+    etapa, error = "lectura", None
+    try:
+        for tipar_valores in (True, False):
+            bloques = _bloques(archivo, layout, fila, tipar_valores)
+            partes, leidas = [], 0
+            try:
+                while True:
+                    etapa, inicio = "lectura", time.perf_counter()
+                    bloque = next(bloques, None)
+                    lectura += time.perf_counter() - inicio
+                    if bloque is None:
+                        if layout.formato_fecha is None:
+                            etapa, inicio = "transformacion", time.perf_counter()
+                            _fechas_partes(partes, archivo.name)
+                            transformacion += time.perf_counter() - inicio
+                        return partes
+                    leidas += len(bloque)
+                    etapa, inicio = "transformacion", time.perf_counter()
+                    partes.append(aplicar_layout(bloque, layout, filas))
+                    transformacion += time.perf_counter() - inicio
+                    del bloque
+            except _ValorNoNumerico:
+                continue
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        # Una sola medición por archivo y etapa: el tiempo de los bloques se acumula.
+        instrumentacion.registrar("lectura", lectura, leidas, error if etapa == "lectura" else None)
+        instrumentacion.registrar("transformacion", transformacion, sum(len(p) for p in partes), error if etapa == "transformacion" else None)
+
+
+def aplicar_layout(df, layout, filas=None):
+    """Convierte el DataFrame de origen en las columnas de datos del esquema canónico."""
+    for columna, funcion in layout.convertir.items():
+        df[columna] = funcion(df[columna])
+    for destino, etiqueta in layout.campos.items():
+        df[destino] = _valor_campo(filas or [], etiqueta)
+    if layout.descartar_incompletas:
+        df = df.dropna(subset=list(layout.columnas))
+    df = df.rename(columns=layout.renombrar)
+    for columna, formula in layout.calculadas.items():
+        df[columna] = formula(df) if callable(formula) else formula
+    datos = {}
+    for columna in COLUMNAS:
+        if columna in COLUMNAS_CONSTANTES:
+            continue
+        serie = df[columna] if columna in df.columns else pd.Series(index=df.index, dtype="float64" if columna in COLUMNAS_VALOR else object)
+        if columna in COLUMNAS_VALOR:
+            serie = valores(serie)
+        elif columna == "APLICA A FV":
+            serie = texto_factura(serie)
+        elif columna == "FECHA" and layout.formato_fecha is not None:
+            serie = pd.to_datetime(serie, format=layout.formato_fecha, errors="coerce")
+        datos[columna] = serie.reset_index(drop=True)
+    return pd.DataFrame(datos)
+
+
+def columna_constante(valor, n):
+    return pd.Categorical.from_codes(np.zeros(n, dtype=np.int8), categories=["" if valor is None else valor])
+
+
+def _agregar_constantes(df, nit, selection_entidad, plan_entidad):
+    n = len(df)
+    for columna, valor in {"SEDE": "", "NIT": nit, "ASEGURADORA": selection_entidad, "PLAN": plan_entidad, "CASO": ""}.items():
+        df[columna] = columna_constante(valor, n)
+
+
+def procesar_layouts(layouts, archivos, nit, selection_entidad, plan_entidad, etiqueta, progreso=None):
+    """Procesa los archivos con el primer layout que reconozca cada uno.
+
+    Las columnas de datos de todos los archivos se concatenan una sola vez; las
+    constantes (NIT, entidad, archivo...) se agregan al final como categorías.
+    Si se indica, ``progreso(nombre, df, segundos)`` recibe el resultado
+    canónico de cada archivo apenas se termina de leer; el de un archivo sin
+    layout reconocido no tiene columnas.
+    """
+    partes = []
+    nombres = []
+    for archivo in archivos:
+        inicio = time.perf_counter()
+        with instrumentacion.contexto(archivo=archivo.name):
+            # Los miembros de un ZIP se descomprimen aquí y se sueltan al pasar al siguiente archivo.
+            abierto = abrir_archivo(archivo)
+            with instrumentacion.etapa("deteccion") as medicion:
+                layout, fila, filas = detectar_layout(abierto, layouts)
+                medicion.campos["layout"] = layout.nombre if layout else None
+            if layout is None:
+                faltantes = f" Faltan columnas: {', '.join(fila)}" if fila else ""
+                avisar(f"Archivo {archivo.name} no tiene una estructura de columnas reconocida para {etiqueta}.{faltantes}")
+                if progreso is not None:
+                    progreso(archivo.name, pd.DataFrame(), time.perf_counter() - inicio)
+                continue
+            partes_archivo = transformar_archivo(abierto, layout, fila, filas)
+            del abierto
+        # Los bloques de un CSV grande quedan como partes separadas hasta el ensamblado.
+        partes.extend(partes_archivo)
+        nombres.extend([archivo.name] * len(partes_archivo))
+        if progreso is not None:
+            df_archivo = pd.concat(partes_archivo, ignore_index=True) if len(partes_archivo) > 1 else partes_archivo[0].copy()
+            _agregar_constantes(df_archivo, nit, selection_entidad, plan_entidad)
+            df_archivo["ARCHIVO"] = columna_constante(archivo.name, len(df_archivo))
+            progreso(archivo.name, df_archivo[COLUMNAS], time.perf_counter() - inicio)
+    if not partes:
+        return pd.DataFrame()
+    with instrumentacion.etapa("ensamblado") as medicion:
+        df = pd.concat(partes, ignore_index=True)
+        _agregar_constantes(df, nit, selection_entidad, plan_entidad)
+        categorias = list(dict.fromkeys(nombres))
+        codigos = np.repeat([categorias.index(nombre) for nombre in nombres], [len(p) for p in partes])
+        df["ARCHIVO"] = pd.Categorical.from_codes(codigos, categories=categorias)
+        medicion.filas = len(df)
+    return df[COLUMNAS]
@@ -0,0 +1,453 @@
+"""Extracción de facturas desde PDF (SISCO y Equidad) en un pool de procesos.
+
+El texto de cada página lo entrega un motor intercambiable (ver MOTORES_TEXTO):
+"pdfplumber" hace el análisis de layout completo y es el motor por defecto;
+"pdfium" lee el texto plano con PDFium, mucho más rápido, y sirve para los
+procesadores que solo aplican expresiones regulares sobre el texto.
+"""
+import multiprocessing
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import closing
+from io import BytesIO
+from itertools import islice
+from typing import NamedTuple
+
+from lector_cartera import instrumentacion
+from lector_cartera.archivos import leer_contenido
+
+# Número de procesos por defecto; se puede fijar con la variable CARTERA_PDF_WORKERS.
+WORKERS_POR_DEFECTO = int(os.environ.get("CARTERA_PDF_WORKERS", "0")) or (os.cpu_count() or 1)
+
+MOTOR_POR_DEFECTO = "pdfplumber"
+
+# Marcas del formato en el texto; también las usa la clasificación automática.
+MARCA_SISCO = re.compile(r"www\.sis\.co[\.,]", re.IGNORECASE)
+FECHA_EQUIDAD = re.compile(r"Fecha:\s*(\d{2}\.\d{2}\.\d{4})")
+FACTURA_EQUIDAD = re.compile(r"""(\d{10})\D+(\d{4})\D+(\w{2})\D+(\d+)\D+(\d+)\D+(\d+)\D+(\S+)\D+(\d+)\D+([-\d.,]+)""", re.VERBOSE)
+
+# Filas de facturas y fecha del documento en los PDF de SISCO.
+FACTURA_SISCO = re.compile(r"(\d{5,8})\s+\$\s*([\d.,]+)\s+\$\s*([\d.,]+)")
+FECHA_SISCO = re.compile(r"""(?:Bogotá, D\.C\.,\s*)?(\d{1,2}\s+de\s+[a-z]+\s+de\s+\d{4})|(Fecha\s*[^:]*:\s*(\d{2}-\d{2}-\d{4}))|(\b\d{1,2}[/-]\d{1,2}[/-]\d{4}\b)""", re.IGNORECASE | re.VERBOSE)
+MESES = {'enero': '01', 'febrero': '02', 'marzo': '03', 'abril': '04', 'mayo': '05', 'junio': '06', 'julio': '07', 'agosto': '08', 'septiembre': '09', 'octubre': '10', 'noviembre': '11', 'diciembre': '12'}
+
+# Tabla de facturas de Equidad: documento, año, clase, tres números, código,
+# factura y valor neto (con el signo menos al final). Las filas son las líneas
+# que empiezan con el número de documento: solo dígitos, de 6 en adelante, para
+# no confundirlo con el número de página ni depender del largo exacto.
+DOCUMENTO_EQUIDAD = re.compile(r"\d{6,}")
+VALOR_EQUIDAD = re.compile(r"-?[\d.,]*\d[\d.,]*-?")
+COLUMNAS_EQUIDAD = 9
+COLUMNA_FACTURA_EQUIDAD = 7
+COLUMNA_NETO_EQUIDAD = 8
+# Diferencia de altura, en puntos, entre palabras que se consideran de la misma línea.
+TOLERANCIA_LINEA = 3
+# Caracteres del final de cada página que se vuelven a buscar junto con la
+# siguiente; una coincidencia más larga no se encuentra si la corta un salto de página.
+ARRASTRE = 500
+
+
+class LecturaPdf(NamedTuple):
+    """Hasta dónde lee un extractor cada PDF.
+
+    ``max_paginas`` es el presupuesto de páginas (None: todas). Si hay
+    ``marca`` y la primera página no la tiene, el PDF no es del formato y no se
+    lee nada más.
+    """
+    max_paginas: object = None
+    marca: object = None
+
+
+# Lectura de cada formato PDF (las llaves son las de FAMILIAS_PDF).
+LECTURA_PDF = {
+    "SISCO": LecturaPdf(2, MARCA_SISCO),
+    "EQUIDAD": LecturaPdf(),
+}
+
+
+def _texto_pdfplumber(pagina):
+    return pagina.extract_text() or ""
+
+
+def _palabras_pdfplumber(pagina):
+    return [(p["x0"], p["x1"], p["top"], p["text"]) for p in pagina.extract_words()]
+
+
+def _paginas_pdfplumber(contenido, leer=_texto_pdfplumber):
+    # pdfplumber se importa aquí para que solo lo carguen las entidades que leen PDF.
+    import pdfplumber
+
+    inicio = time.perf_counter()
+    with pdfplumber.open(BytesIO(contenido)) as pdf:
+        instrumentacion.registrar("apertura", time.perf_counter() - inicio)
+        texto, paginas = 0.0, 0
+        try:
+            for pagina in pdf.pages:
+                inicio = time.perf_counter()
+                try:
+                    text = leer(pagina)
+                finally:
+                    # pdfplumber guarda los objetos y el layout de cada página hasta
+                    # cerrar el documento; se sueltan apenas se leyó la página.
+                    pagina.close()
+                texto += time.perf_counter() - inicio
+                paginas += 1
+                yield text
+        finally:
+            # Una sola medición por archivo: el tiempo de las páginas se acumula.
+            instrumentacion.registrar("texto", texto, paginas=paginas)
+
+
+def _texto_pdfium(pagina, textpage):
+    return textpage.get_text_range().replace("\r\n", "\n")
+
+
+def _palabras_pdfium(pagina, textpage):
+    # PDFium entrega caracteres sueltos con su caja; las palabras se arman
+    # cortando en los espacios. La altura se mide desde arriba, como en pdfplumber.
+    alto = pagina.get_height()
+    texto = textpage.get_text_range()
+    palabras = []
+    for palabra in re.finditer(r"\S+", texto):
+        # Basta la caja de la primera y la última letra de cada palabra.
+        izquierda, _, _, arriba = textpage.get_charbox(palabra.start())
+        _, _, derecha, _ = textpage.get_charbox(palabra.end() - 1)
+        palabras.append((izquierda, derecha, alto - arriba, palabra.group()))
+    return palabras
+
+
+def _paginas_pdfium(contenido, leer=_texto_pdfium):
+    import pypdfium2 as pdfium
+
+    inicio = time.perf_counter()
+    pdf = pdfium.PdfDocument(contenido)
+    instrumentacion.registrar("apertura", time.perf_counter() - inicio)
+    texto, paginas = 0.0, 0
+    try:
+        for i in range(len(pdf)):
+            inicio = time.perf_counter()
+            pagina = pdf[i]
+            textpage = pagina.get_textpage()
+            try:
+                text = leer(pagina, textpage)
+                texto += time.perf_counter() - inicio
+                paginas += 1
+                yield text
+            finally:
+                textpage.close()
+                pagina.close()
+    finally:
+        pdf.close()
+        instrumentacion.registrar("texto", texto, paginas=paginas)
+
+
+MOTORES_TEXTO = {
+    "pdfplumber": _paginas_pdfplumber,
+    "pdfium": _paginas_pdfium,
+}
+
+# Lector de las palabras con su posición para cada motor de MOTORES_TEXTO.
+LECTORES_PALABRAS = {
+    "pdfplumber": _palabras_pdfplumber,
+    "pdfium": _palabras_pdfium,
+}
+
+
+def paginas_texto(contenido, motor=MOTOR_POR_DEFECTO):
+    """Genera el texto de cada página con el motor indicado."""
+    return MOTORES_TEXTO[motor](contenido)
+
+
+def paginas_palabras(contenido, motor=MOTOR_POR_DEFECTO):
+    """Genera las palabras de cada página como tuplas (x0, x1, top, texto)."""
+    return MOTORES_TEXTO[motor](contenido, LECTORES_PALABRAS[motor])
+
+
+def primera_pagina(contenido, motor=MOTOR_POR_DEFECTO):
+    """Texto de la primera página, sin extraer las demás."""
+    with closing(paginas_texto(contenido, motor)) as paginas:
+        return next(paginas, "")
+
+
+def paginas_leidas(paginas, lectura, texto=str):
+    """Las páginas que corresponden a ``lectura``; ``texto(pagina)`` es el texto donde se busca la marca."""
+    for i, pagina in enumerate(islice(paginas, lectura.max_paginas)):
+        if i == 0 and lectura.marca is not None and not lectura.marca.search(texto(pagina)):
+            return
+        yield pagina
+
+
+class BusquedaPorPagina:
+    """Busca un patrón en un texto que llega de a una página.
+
+    Las coincidencias se entregan con cada página, salvo las que llegan a los
+    últimos ARRASTRE caracteres: ese final (cortado en un inicio de línea) se
+    busca otra vez unido a la página siguiente. Así una fila partida por el
+    salto de página se encuentra como en el texto completo, que nunca se arma.
+    """
+
+    def __init__(self, patron, arrastre=ARRASTRE):
+        self.patron = patron
+        self.arrastre = arrastre
+        self.resto = ""
+
+    def agregar(self, pagina):
+        texto = self.resto + pagina
+        limite = max(texto.rfind("\n", 0, len(texto) - self.arrastre), 0)
+        listas = []
+        inicio = limite
+        for coincidencia in self.patron.finditer(texto):
+            if coincidencia.end() > limite:
+                inicio = min(limite, coincidencia.start())
+                break
+            listas.append(coincidencia)
+        self.resto = texto[inicio:]
+        return listas
+
+    def terminar(self):
+        """Las coincidencias que quedaban pendientes al final del documento."""
+        texto, self.resto = self.resto, ""
+        return list(self.patron.finditer(texto))
+
+
+def _columnas(nombre, fecha, **textos):
+    """Columnas crudas de un archivo: listas paralelas con el texto de cada factura."""
+    filas = len(next(iter(textos.values())))
+    return {"FECHA": [fecha] * filas, **textos, "Archivo": [nombre] * filas}
+
+
+def _fecha_sisco(match_fecha):
+    if match_fecha.group(1):
+        day, month, year = re.match(r"(\d{1,2})\s+de\s+(\w+)\s+de\s+(\d{4})", match_fecha.group(1)).groups()
+        return f"{day.zfill(2)}/{MESES[month.lower()]}/{year}"
+    if match_fecha.group(3):
+        day, month, year = match_fecha.group(3).split('-')
+        return f"{day}/{month}/{year}"
+    separador = '/' if '/' in match_fecha.group(4) else '-'
+    day, month, year = match_fecha.group(4).split(separador)
+    return f"{day}/{month}/{year}"
+
+
+def extraer_seg_estado(nombre, contenido, nit, selection_entidad, plan_entidad, motor=MOTOR_POR_DEFECTO):
+    """Columnas crudas (FECHA, APLICA FV, BRUTO, NETO, Archivo) de un PDF de SISCO.
+
+    Las páginas se leen según LECTURA_PDF["SISCO"] y las filas se buscan en
+    cada una a medida que llega. Los valores quedan como el texto del PDF; los
+    convierte y calcula las retenciones, para todo el lote a la vez,
+    procesadores.filas_seg_estado. Si el PDF no se puede leer devuelve {}.
+    """
+    facturas, brutos, netos = [], [], []
+    fecha_doc = None
+    try:
+        filas = BusquedaPorPagina(FACTURA_SISCO)
+        fechas = BusquedaPorPagina(FECHA_SISCO)
+        match_fecha = None
+        analisis = 0.0
+
+        def agregar(coincidencias):
+            for coincidencia in coincidencias:
+                factura, bruto, neto = coincidencia.groups()
+                facturas.append(factura)
+                brutos.append(bruto)
+                netos.append(neto)
+
+        with closing(paginas_texto(contenido, motor)) as paginas:
+            for text in paginas_leidas(paginas, LECTURA_PDF["SISCO"]):
+                inicio = time.perf_counter()
+                pagina = f"\n{text}"
+                if match_fecha is None:
+                    match_fecha = next(iter(fechas.agregar(pagina)), None)
+                agregar(filas.agregar(pagina))
+                analisis += time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        match_fecha = match_fecha or next(iter(fechas.terminar()), None)
+        agregar(filas.terminar())
+        if match_fecha:
+            try:
+                fecha_doc = _fecha_sisco(match_fecha)
+            except Exception as e:
+                instrumentacion.fallo("fecha", e)
+        instrumentacion.registrar("analisis", analisis + time.perf_counter() - inicio, len(facturas))
+    except Exception as e:
+        instrumentacion.fallo("extraccion", e)
+        return {}
+    return _columnas(nombre, fecha_doc, **{"APLICA FV": facturas, "BRUTO": brutos, "NETO": netos})
+
+
+def _lineas(palabras, tolerancia=TOLERANCIA_LINEA):
+    """Agrupa las palabras en líneas por su altura, de arriba abajo y cada una de izquierda a derecha."""
+    por_altura = {}
+    for palabra in palabras:
+        altura = round(palabra[2])
+        cercana = next((a for a in range(altura - tolerancia, altura + tolerancia + 1) if a in por_altura), altura)
+        por_altura.setdefault(cercana, []).append(palabra)
+    return [sorted(linea) for _, linea in sorted(por_altura.items())]
+
+
+def _columnas_equidad(filas):
+    """Rango horizontal (x0, x1) de cada columna de la tabla, tomado de las filas completas."""
+    completas = [fila for fila in filas if len(fila) == COLUMNAS_EQUIDAD]
+    if not completas:
+        return None
+    return [(min(fila[i][0] for fila in completas), max(fila[i][1] for fila in completas)) for i in range(COLUMNAS_EQUIDAD)]
+
+
+def _celdas_equidad(fila, columnas):
+    """Texto de cada columna de la fila; las celdas vacías quedan como ''."""
+    if len(fila) == COLUMNAS_EQUIDAD:
+        return [palabra[3] for palabra in fila]
+    if columnas is None:
+        return None
+    celdas = [""] * COLUMNAS_EQUIDAD
+    for x0, x1, _, texto in fila:
+        # Cada palabra va a la columna que contiene su centro o, si cae entre dos, a la más cercana.
+        centro = (x0 + x1) / 2
+        distancias = [max(inicio - centro, centro - fin, 0) for inicio, fin in columnas]
+        i = distancias.index(min(distancias))
+        celdas[i] = f"{celdas[i]} {texto}".lstrip()
+    return celdas
+
+
+def extraer_equidad(nombre, contenido, nit, selection_entidad, plan_entidad, motor=MOTOR_POR_DEFECTO):
+    """Columnas crudas (FECHA, APLICA FV, NETO, Archivo) de la tabla de facturas de la liquidación.
+
+    La tabla se lee por la posición de las palabras. Las filas son las líneas
+    que empiezan con el número de documento. Las columnas se toman de las
+    filas completas de la página (o de la anterior), así una celda vacía no
+    corre los valores a la izquierda. Si el PDF no se puede leer devuelve {}.
+    """
+    facturas, netos = [], []
+    fecha = None
+    try:
+        columnas = None
+        analisis = 0.0
+        with closing(paginas_palabras(contenido, motor)) as paginas:
+            for palabras in paginas_leidas(paginas, LECTURA_PDF["EQUIDAD"], lambda palabras: " ".join(p[3] for p in palabras)):
+                inicio = time.perf_counter()
+                lineas = _lineas(palabras)
+                if fecha is None:
+                    fecha = next((m.group(1) for m in (FECHA_EQUIDAD.search(" ".join(p[3] for p in linea)) for linea in lineas) if m), None)
+                filas = [linea for linea in lineas if DOCUMENTO_EQUIDAD.fullmatch(linea[0][3])]
+                columnas = _columnas_equidad(filas) or columnas
+                for fila in filas:
+                    celdas = _celdas_equidad(fila, columnas)
+                    if celdas is None or not celdas[COLUMNA_FACTURA_EQUIDAD].isdigit() or not VALOR_EQUIDAD.fullmatch(celdas[COLUMNA_NETO_EQUIDAD]):
+                        instrumentacion.fallo("factura", "fila sin número de factura o valor neto", documento=fila[0][3])
+                        continue
+                    facturas.append(celdas[COLUMNA_FACTURA_EQUIDAD])
+                    netos.append(celdas[COLUMNA_NETO_EQUIDAD])
+                analisis += time.perf_counter() - inicio
+        instrumentacion.registrar("analisis", analisis, len(facturas))
+    except Exception as e:
+        instrumentacion.fallo("extraccion", e)
+        return {}
+    fecha = fecha.replace(".", "/") if fecha else "Fecha no Econtrada"
+    return _columnas(nombre, fecha, **{"APLICA FV": facturas, "NETO": netos})
+
+
+_pool = None
+_candado_pool = threading.Lock()
+
+
+def _contexto_procesos():
+    # Los pools se crean desde hilos (Streamlit, ColaTrabajos): un fork copiaría
+    # candados tomados por otros hilos (logging, PDFium) y el hijo podría quedar
+    # bloqueado. Los procesos nuevos arrancan limpios desde forkserver o spawn.
+    metodo = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(metodo)
+
+
+def pool_compartido():
+    """Pool de procesos único para todo el proceso; lo comparten los trabajos simultáneos."""
+    global _pool
+    with _candado_pool:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=WORKERS_POR_DEFECTO, mp_context=_contexto_procesos())
+        return _pool
+
+
+def _descartar_pool(pool):
+    global _pool
+    with _candado_pool:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _extraer(tarea):
+    funcion, nombre, contenido, nit, selection_entidad, plan_entidad, motor, instrumentar = tarea
+    # En el proceso hijo no existe el registro del trabajo: los eventos se juntan
+    # aquí y viajan de vuelta con las filas.
+    registro = instrumentacion.Registro() if instrumentar else None
+    inicio = time.perf_counter()
+    with instrumentacion.capturar(registro, aislado=True), instrumentacion.contexto(archivo=nombre):
+        columnas = funcion(nombre, contenido, nit, selection_entidad, plan_entidad, motor)
+    return columnas, time.perf_counter() - inicio, registro.eventos if registro else []
+
+
+def _mapear_en_ventana(pool, funcion, tareas, ventana):
+    # Como pool.map, pero con a lo sumo ``ventana`` tareas enviadas a la vez: los
+    # PDF se leen a medida que hay lugar y no todos antes de empezar.
+    pendientes = deque()
+    try:
+        for tarea in tareas:
+            if len(pendientes) >= ventana:
+                yield pendientes.popleft().result()
+            pendientes.append(pool.submit(funcion, tarea))
+        while pendientes:
+            yield pendientes.popleft().result()
+    finally:
+        for futuro in pendientes:
+            futuro.cancel()
+
+
+def procesar_en_paralelo(funcion, archivos, nit, selection_entidad, plan_entidad, max_workers=None, motor=MOTOR_POR_DEFECTO, progreso=None):
+    """Reparte los PDF entre procesos y junta las columnas crudas de todos, en el orden de carga.
+
+    El contenido de cada PDF se lee justo antes de enviarlo a un proceso, así
+    que en memoria solo están los archivos en curso (unos dos por proceso).
+    Si se indica, ``progreso(nombre, columnas, segundos)`` se llama por cada
+    archivo a medida que llegan sus resultados.
+    """
+    if motor not in MOTORES_TEXTO:
+        raise ValueError(f"Motor de texto PDF desconocido: '{motor}'. Opciones: {', '.join(MOTORES_TEXTO)}")
+    instrumentar = instrumentacion.activo()
+    tareas = ((funcion, archivo.name, leer_contenido(archivo), nit, selection_entidad, plan_entidad, motor, instrumentar) for archivo in archivos)
+    nombres = [archivo.name for archivo in archivos]
+    workers = min(max_workers or WORKERS_POR_DEFECTO, len(nombres))
+    ventana = workers * 2
+    data = {}
+
+    def recoger(resultados):
+        try:
+            for nombre, (columnas, segundos, eventos) in zip(nombres, resultados):
+                instrumentacion.reemitir(eventos)
+                if progreso is not None:
+                    progreso(nombre, columnas, segundos)
+                for columna, textos in columnas.items():
+                    data.setdefault(columna, []).extend(textos)
+        finally:
+            # Si el llamador se interrumpe (por ejemplo, al cancelar un trabajo) se cancelan los PDF pendientes.
+            if hasattr(resultados, "close"):
+                resultados.close()
+
+    # Los resultados se recogen en el orden de las tareas aunque terminen desordenadas.
+    if workers <= 1:
+        recoger(map(_extraer, tareas))
+    elif max_workers is None:
+        # Sin un límite propio se usa el pool compartido, así los lotes simultáneos no multiplican los procesos.
+        pool = pool_compartido()
+        try:
+            recoger(_mapear_en_ventana(pool, _extraer, tareas, ventana))
+        except BrokenProcessPool:
+            _descartar_pool(pool)
+            raise
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=_contexto_procesos()) as pool:
+            recoger(_mapear_en_ventana(pool, _extraer, tareas, ventana))
+    return data
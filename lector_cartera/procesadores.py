@@ -0,0 +1,164 @@
+"""Funciones de procesamiento por entidad, independientes de la interfaz."""
+import numpy as np
+import pandas as pd
+
+from lector_cartera import instrumentacion
+from lector_cartera.esquema import normalizar_esquema, vacio
+from lector_cartera.layouts import LAYOUTS, procesar_layouts
+from lector_cartera.pdf import MOTOR_POR_DEFECTO, extraer_equidad, extraer_seg_estado, procesar_en_paralelo
+
+# Motor de texto PDF por entidad; las que no aparecen usan MOTOR_POR_DEFECTO.
+# Antes de cambiar una entidad, validar con: python -m lector_cartera.comparar_motores
+MOTOR_PDF = {}
+
+def procesar_axa(archivos, nit, selection_entidad, plan_entidad, progreso=None):
+    return procesar_layouts(LAYOUTS["AXA"], archivos, nit, selection_entidad, plan_entidad, "AXA", progreso)
+
+def procesar_adres(archivos, nit, selection_entidad, plan_entidad, progreso=None):
+    return procesar_layouts(LAYOUTS["ADRES"], archivos, nit, selection_entidad, plan_entidad, "ADRES", progreso)
+
+def procesar_previsora(archivos, nit, selection_entidad, plan_entidad, progreso=None):
+    return procesar_layouts(LAYOUTS["PREVISORA"], archivos, nit, selection_entidad, plan_entidad, "Previsora", progreso)
+
+def procesar_mundial(archivos, nit, selection_entidad, plan_entidad, progreso=None):
+    return procesar_layouts(LAYOUTS["MUNDIAL"], archivos, nit, selection_entidad, plan_entidad, "Mundial", progreso)
+
+def procesar_sura(archivos, nit, selection_entidad, plan_entidad, progreso=None):
+    return procesar_layouts(LAYOUTS["SURA"], archivos, nit, selection_entidad, plan_entidad, "Sura", progreso)
+
+def procesar_liberty(archivos, nit, selection_entidad, plan_entidad, progreso=None):
+    return procesar_layouts(LAYOUTS["LIBERTY"], archivos, nit, selection_entidad, plan_entidad, "Liberty", progreso)
+
+def procesar_bolivar(archivos, nit, selection_entidad, plan_entidad, progreso=None):
+    return procesar_layouts(LAYOUTS["BOLIVAR"], archivos, nit, selection_entidad, plan_entidad, "Bolívar", progreso)
+
+def procesar_nueva_eps(archivos, nit, selection_entidad, plan_entidad, progreso=None):
+    return procesar_layouts(LAYOUTS["NUEVA EPS"], archivos, nit, selection_entidad, plan_entidad, "Nueva EPS", progreso)
+
+# Número en el formato de los PDF una vez quitados los puntos de miles y con la
+# coma decimal cambiada por punto: lo mismo que acepta float().
+NUMERO_PDF = r"\d+\.?\d*|\.\d+"
+
+def montos_pdf(textos):
+    """Convierte montos con formato colombiano (1.234.567,89) a float; los que no son un número quedan en NaN."""
+    textos = pd.Series(textos, dtype=object).str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+    validos = textos.str.fullmatch(NUMERO_PDF).fillna(False).astype(bool)
+    montos = pd.Series(np.nan, index=textos.index)
+    # astype(float) convierte igual que float(); pd.to_numeric redondea distinto algunos decimales.
+    montos[validos] = textos[validos].astype("float64")
+    return montos
+
+def redondear(valores, decimales=0):
+    """Como round() de Python, valor por valor, pero vectorizado.
+
+    Con decimales np.round multiplica por 10**decimales y puede caer al otro
+    lado de la mitad que round(); los pocos valores tan cerca de la mitad se
+    redondean con round().
+    """
+    redondeados = np.round(valores, decimales)
+    if decimales:
+        escalados = valores * 10 ** decimales
+        dudosos = np.abs(escalados - np.floor(escalados) - 0.5) <= 8 * np.spacing(np.abs(escalados))
+        redondeados[dudosos] = [round(valor, decimales) for valor in valores[dudosos].tolist()]
+    return redondeados
+
+def _descartar_invalidas(columnas, validas, avisar):
+    if avisar:
+        for factura, archivo in zip(np.asarray(columnas["APLICA FV"], dtype=object)[~validas], np.asarray(columnas["Archivo"], dtype=object)[~validas]):
+            instrumentacion.fallo("factura", "valor no numérico", factura=factura, archivo=archivo)
+    return {columna: np.asarray(textos, dtype=object)[validas] for columna, textos in columnas.items()}
+
+def filas_seg_estado(columnas, nit, selection_entidad, plan_entidad, avisar=True):
+    """Filas del reporte a partir de las columnas crudas de extraer_seg_estado, para todo el lote a la vez."""
+    bruto = montos_pdf(columnas["BRUTO"])
+    neto = montos_pdf(columnas["NETO"])
+    validas = (bruto.notna() & neto.notna()).to_numpy()
+    columnas = _descartar_invalidas(columnas, validas, avisar)
+    bruto = bruto.to_numpy()[validas]
+    neto = neto.to_numpy()[validas]
+    return pd.DataFrame({
+        "SEDE": "", "FECHA": columnas["FECHA"], "NIT": nit, "ASEGURADORA": selection_entidad, "PLAN": plan_entidad, "CASO": "", "APLICA FV": columnas["APLICA FV"], "VR. FACTURA": 0, "VR. BRUTO": bruto, "(-) RETEF": redondear(bruto * 0.02, 2), "(-) ICA": redondear(bruto * 0.0066), "IVA": 0, "SUMA RETENCIONES": redondear((bruto * 0.02) + (bruto * 0.0066)), "VR. RECAUDADO": neto, "DIFERENCIA": 0 - bruto, "Archivo": columnas["Archivo"]
+    })
+
+def filas_equidad(columnas, nit, selection_entidad, plan_entidad, avisar=True):
+    """Filas del reporte a partir de las columnas crudas de extraer_equidad; el neto trae el signo al final."""
+    neto = montos_pdf(pd.Series(columnas["NETO"], dtype=object).str.replace("-", "", regex=False))
+    validas = neto.notna().to_numpy()
+    columnas = _descartar_invalidas(columnas, validas, avisar)
+    neto = neto.to_numpy()[validas]
+    bruto = neto / 0.98
+    return pd.DataFrame({
+        "SEDE": "", "FECHA": columnas["FECHA"], "NIT": nit, "ASEGURADORA": selection_entidad, "PLAN": plan_entidad, "CASO": "", "APLICA FV": columnas["APLICA FV"], "VR. FACTURA": 0, "VR. BRUTO": bruto, "(-) RETEF": redondear(bruto * 0.02), "(-) ICA": 0, "IVA": 0, "SUMA RETENCIONES": redondear(bruto * 0.02), "VR. RECAUDADO": neto, "DIFERENCIA": 0 - bruto, "Archivo": columnas["Archivo"]
+    })
+
+def _progreso_pdf(progreso, filas, nit, selection_entidad, plan_entidad):
+    # Entrega al llamador las filas de cada PDF ya en el esquema canónico; los
+    # valores inválidos se reportan una sola vez, al armar el lote completo.
+    # Como en los layouts, un PDF que no se pudo leer llega sin columnas y uno
+    # leído sin facturas llega con las columnas canónicas y sin filas.
+    if progreso is None:
+        return None
+
+    def reportar(nombre, columnas, segundos):
+        if not columnas:
+            progreso(nombre, pd.DataFrame(), segundos)
+            return
+        df = normalizar_esquema(filas(columnas, nit, selection_entidad, plan_entidad, avisar=False), formato_fecha="%d/%m/%Y")
+        progreso(nombre, vacio() if df.empty else df, segundos)
+
+    return reportar
+
+def _procesar_pdf(extractor, filas, archivos, nit, selection_entidad, plan_entidad, max_workers, motor, progreso):
+    motor = motor or MOTOR_PDF.get(selection_entidad, MOTOR_POR_DEFECTO)
+    columnas = procesar_en_paralelo(extractor, archivos, nit, selection_entidad, plan_entidad, max_workers, motor, _progreso_pdf(progreso, filas, nit, selection_entidad, plan_entidad))
+    with instrumentacion.etapa("normalizacion") as medicion:
+        df = normalizar_esquema(filas(columnas, nit, selection_entidad, plan_entidad), formato_fecha="%d/%m/%Y") if columnas else pd.DataFrame()
+        medicion.filas = len(df)
+    return df
+
+def procesar_seg_estado(archivos, nit, selection_entidad, plan_entidad, max_workers=None, motor=None, progreso=None):
+    return _procesar_pdf(extraer_seg_estado, filas_seg_estado, archivos, nit, selection_entidad, plan_entidad, max_workers, motor, progreso)
+
+def procesar_equidad(archivos, nit, selection_entidad, plan_entidad, max_workers=None, motor=None, progreso=None):
+    return _procesar_pdf(extraer_equidad, filas_equidad, archivos, nit, selection_entidad, plan_entidad, max_workers, motor, progreso)
+
+# --- FORMATOS RECONOCIBLES ---
+# Procesador de cada formato que la clasificación automática sabe reconocer; las
+# llaves de Excel/CSV son las de LAYOUTS.
+FAMILIAS = {
+    "AXA": procesar_axa,
+    "ADRES": procesar_adres,
+    "PREVISORA": procesar_previsora,
+    "MUNDIAL": procesar_mundial,
+    "SURA": procesar_sura,
+    "LIBERTY": procesar_liberty,
+    "BOLIVAR": procesar_bolivar,
+    "NUEVA EPS": procesar_nueva_eps,
+    "SISCO": procesar_seg_estado,
+    "EQUIDAD": procesar_equidad,
+}
+FAMILIAS_PDF = ("SISCO", "EQUIDAD")
+
+# --- DICCIONARIO DE MAPEADO ---
+funcion_procesamiento = {
+    "AXA COLPATRIA SEGUROS SA": procesar_axa,
+    "AXA COLPATRIA SEGUROS DE VIDA SA": procesar_axa,
+    "AXA COLPATRIA MEDICINA PREPAGADA": procesar_axa,
+    "ADMINISTRADORA DE LOS RECURSOS DEL SISTEMA GENERAL DE SEGURIDAD SOCIAL EN SALUD - ADRES":procesar_adres,
+    "LA PREVISORA SA COMPAÑÍA DE SEGUROS":procesar_previsora,
+    "FIDEICOMISOS PATRIMONIOS AUTÓNOMOS FIDUCIARIA LA PREVISORA S.A.": procesar_previsora,
+    "LA PREVISORA S A COMPANIA DE SEGURO": procesar_previsora,
+    "COMPAÑIA MUNDIAL DE SEGUROS SA": procesar_mundial,
+    "SEGUROS GENERALES SURAMERICANA SA": procesar_sura,
+    "EPS SURAMERICANA SA": procesar_sura,
+    "EPS Y MEDICINA PREPAGADA SURAMETICANA S A":procesar_sura,
+    "SEGUROS DE VIDA SURAMERICANA SA": procesar_sura,
+    "LIBERTY SEGUROS SA": procesar_liberty,
+    "LIBERTY SEGUROS DE VIDA SA": procesar_liberty,
+    "SEGUROS COMERCIALES BOLIVAR": procesar_bolivar,
+    "ARL SEGUROS BOLIVAR":procesar_bolivar,
+    "SEGUROS DEL ESTADO SA":procesar_seg_estado,
+    "SEGUROS DE VIDA DEL ESTADO S A":procesar_seg_estado,
+    "LA EQUIDAD SEGUROS GENERALES":procesar_equidad,
+    "LA EQUIDAD SEGUROS DE VIDA ORGANISMO CORPORATIVO": procesar_equidad
+}
@@ -0,0 +1,366 @@
+"""Servicio HTTP local para enviar lotes sin pasar por la aplicación de Streamlit.
+
+Los lotes se encolan en la misma ``ColaTrabajos`` que usa la aplicación y se
+consultan por su identificador. Ejemplo::
+
+    python -m lector_cartera.servicio --puerto 8765
+    curl -F entidad="SEGUROS DEL ESTADO SA" -F archivo=@remesa.pdf http://127.0.0.1:8765/trabajos
+    curl -N http://127.0.0.1:8765/trabajos/<id>/filas
+    curl -o reporte.xlsx "http://127.0.0.1:8765/trabajos/<id>/reporte?formato=xlsx"
+
+Rutas:
+
+- ``POST /trabajos``: formulario multipart con ``entidad`` (razón social, NIT
+  o ``auto``), opcionalmente ``plan``, ``motor``, ``sin_cache``, ``almacen``
+  (agrega el resultado al consolidado), ``reemplazar`` (con ``almacen``,
+  reemplaza los archivos que ya están) y uno o más ``entidad_familia``, y los
+  archivos (PDF, Excel, CSV o ZIP) en cualquier campo. Responde 202 con el
+  identificador del trabajo.
+- ``GET /trabajos`` y ``GET /trabajos/<id>``: estado, progreso por archivo y avisos.
+- ``GET /trabajos/<id>/filas``: las filas del reporte en JSON, una por línea,
+  a medida que termina cada archivo. El flujo se cierra cuando termina el
+  trabajo; el estado final se consulta en ``GET /trabajos/<id>``.
+- ``GET /trabajos/<id>/reporte?formato=xlsx``: el reporte (xlsx, csv.gz o parquet).
+- ``DELETE /trabajos/<id>``: cancela el trabajo.
+
+El servicio solo escucha en 127.0.0.1 salvo que se indique otra dirección, no
+necesita red para funcionar y ``crear_servidor`` acepta puerto 0 para
+levantarlo en un puerto libre, por ejemplo dentro de una prueba.
+"""
+import argparse
+import email
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from email.message import Message
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from lector_cartera.almacen import DIRECTORIO_ALMACEN, AlmacenCartera
+from lector_cartera.archivos import EXTENSION_ZIP, EXTENSIONES, ArchivoEnMemoria, expandir_zip
+from lector_cartera.cli import ENTIDAD_AUTOMATICA, entidades_por_familia, grupos_automaticos
+from lector_cartera.entidades import RUTA_CLIENTES, buscar_entidad, cargar_entidades
+from lector_cartera.exportar import FORMATOS, escribir_reporte, formatos_disponibles, nombre_reporte
+from lector_cartera.pdf import MOTORES_TEXTO
+from lector_cartera.procesadores import FAMILIAS, funcion_procesamiento
+from lector_cartera.trabajos import ESTADOS_FINALES, TRABAJOS_SIMULTANEOS, ColaTrabajos, Grupo
+
+logger = logging.getLogger("lector_cartera")
+
+PUERTO = int(os.environ.get("CARTERA_API_PUERTO", "8765"))
+# Tamaño máximo del cuerpo de un envío, con todos sus archivos.
+MAX_MB = int(os.environ.get("CARTERA_API_MAX_MB", "200"))
+# Trabajos en cola o en proceso a la vez; por encima se responde 503.
+MAX_ACTIVOS = int(os.environ.get("CARTERA_API_MAX_ACTIVOS", "10"))
+
+VERDADEROS = ("1", "true", "si", "sí", "yes")
+
+
+class ErrorSolicitud(Exception):
+    """Error que se responde al cliente con su código HTTP y mensaje."""
+
+    def __init__(self, estado, mensaje):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+def leer_multipart(tipo, cuerpo):
+    """Devuelve ({campo: [valores]}, [archivos]) de un cuerpo multipart/form-data."""
+    encabezado = Message()
+    encabezado["Content-Type"] = tipo or ""
+    limite = encabezado.get_param("boundary")
+    if encabezado.get_content_type() != "multipart/form-data" or not limite:
+        raise ErrorSolicitud(HTTPStatus.UNSUPPORTED_MEDIA_TYPE, "El envío debe ser multipart/form-data.")
+    campos, archivos = {}, []
+    # La primera parte es el preámbulo y la última el cierre "--".
+    for parte in cuerpo.split(b"--" + limite.encode("latin-1"))[1:-1]:
+        # Cada parte va entre el CRLF que sigue al delimitador y el que precede al siguiente.
+        cabeceras, _, contenido = parte[2:-2].partition(b"\r\n\r\n")
+        disposicion = email.message_from_bytes(cabeceras)
+        nombre_archivo = disposicion.get_filename()
+        if nombre_archivo:
+            # Algunos clientes envían la ruta completa, incluso con separadores de Windows.
+            archivos.append(ArchivoEnMemoria(os.path.basename(nombre_archivo.replace("\\", "/")), contenido))
+        else:
+            campo = disposicion.get_param("name", header="content-disposition")
+            campos.setdefault(campo, []).append(contenido.decode("utf-8", errors="replace").strip())
+    return campos, archivos
+
+
+def estado_trabajo(trabajo, cola):
+    return {
+        "id": trabajo.id,
+        "estado": trabajo.estado,
+        "entidad": trabajo.selection_entidad,
+        "archivos": trabajo.total,
+        "procesados": trabajo.procesados,
+        "posicion": cola.posicion(trabajo.id),
+        "filas": len(trabajo.resultado) if trabajo.resultado is not None else None,
+        "error": trabajo.error,
+        "almacenado": trabajo.almacenado,
+        "sin_clasificar": trabajo.sin_clasificar,
+        "detalle": trabajo.detalle,
+        "avisos": [{"mensaje": mensaje, "nivel": nivel} for mensaje, nivel in trabajo.avisos],
+    }
+
+
+class ServidorCartera(ThreadingHTTPServer):
+    """Servidor HTTP con la cola de trabajos, el catálogo de clientes y los límites del servicio."""
+
+    daemon_threads = True
+
+    def __init__(self, direccion, cola=None, ruta_clientes=RUTA_CLIENTES, max_mb=MAX_MB, max_activos=MAX_ACTIVOS, almacen=None):
+        super().__init__(direccion, ManejadorCartera)
+        self.cola = cola or ColaTrabajos()
+        self.almacen = almacen or AlmacenCartera()
+        self.ruta_clientes = ruta_clientes
+        self.max_bytes = max_mb * 1024 * 1024
+        self.max_activos = max_activos
+        self._envios = threading.Lock()
+        self._reportes = {}
+        self._generando = threading.Lock()
+        self._directorio = tempfile.TemporaryDirectory(prefix="lector_cartera_api_")
+
+    def server_close(self):
+        super().server_close()
+        self._directorio.cleanup()
+
+    def grupos(self, campos, archivos):
+        """Grupos a procesar según la entidad del formulario y los nombres de los archivos sin clasificar."""
+        entidad = (campos.get("entidad") or [""])[0]
+        if not entidad:
+            raise ErrorSolicitud(HTTPStatus.BAD_REQUEST, "Falta el campo 'entidad' (razón social, NIT o 'auto').")
+        motor = (campos.get("motor") or [None])[0]
+        if motor and motor not in MOTORES_TEXTO:
+            raise ErrorSolicitud(HTTPStatus.BAD_REQUEST, f"Motor desconocido '{motor}'. Opciones: {', '.join(MOTORES_TEXTO)}")
+        opciones = {"motor": motor} if motor else {}
+        try:
+            # El catálogo compilado solo se vuelve a leer si cambió el Excel.
+            df_entidades = cargar_entidades(self.ruta_clientes)
+            if entidad.lower() == ENTIDAD_AUTOMATICA:
+                asignadas = entidades_por_familia(campos.get("entidad_familia", []), "entidad_familia")
+                desconocidas = set(asignadas) - set(FAMILIAS)
+                if desconocidas:
+                    raise ErrorSolicitud(HTTPStatus.BAD_REQUEST, f"Formatos desconocidos en entidad_familia: {', '.join(sorted(desconocidas))}. Opciones: {', '.join(FAMILIAS)}")
+                grupos, sin_clasificar = grupos_automaticos(df_entidades, archivos, asignadas, opciones, logger)
+                return grupos, [archivo.name for archivo in sin_clasificar]
+            selection_entidad, nit, plan_entidad = buscar_entidad(df_entidades, entidad, (campos.get("plan") or [None])[0])
+        except ValueError as e:
+            raise ErrorSolicitud(HTTPStatus.BAD_REQUEST, str(e))
+        if selection_entidad not in funcion_procesamiento:
+            raise ErrorSolicitud(HTTPStatus.BAD_REQUEST, f"No hay una función de procesamiento definida para '{selection_entidad}'.")
+        return [Grupo(funcion_procesamiento[selection_entidad], archivos, nit, selection_entidad, plan_entidad, opciones)], []
+
+    def enviar(self, campos, archivos):
+        """Encola el envío y devuelve el trabajo; lanza ErrorSolicitud si no se puede."""
+        soportados = [a for a in archivos if a.name.lower().endswith(EXTENSIONES + (EXTENSION_ZIP,))]
+        archivos = expandir_zip(soportados)
+        if not archivos:
+            raise ErrorSolicitud(HTTPStatus.BAD_REQUEST, "El envío no tiene archivos PDF, Excel, CSV o ZIP para procesar.")
+        grupos, sin_clasificar = self.grupos(campos, archivos)
+        if not grupos:
+            raise ErrorSolicitud(HTTPStatus.UNPROCESSABLE_ENTITY, "No se reconoció el formato de ningún archivo.")
+        usar_cache = (campos.get("sin_cache") or [""])[0].lower() not in VERDADEROS
+        almacen = self.almacen if (campos.get("almacen") or [""])[0].lower() in VERDADEROS else None
+        reemplazar = (campos.get("reemplazar") or [""])[0].lower() in VERDADEROS
+        if reemplazar and almacen is None:
+            raise ErrorSolicitud(HTTPStatus.BAD_REQUEST, "El campo reemplazar solo aplica con almacen.")
+        with self._envios:
+            activos = sum(not t.terminado for t in self.cola.trabajos())
+            if activos >= self.max_activos:
+                raise ErrorSolicitud(HTTPStatus.SERVICE_UNAVAILABLE, f"Hay {activos} trabajos pendientes; intente más tarde.")
+            id_trabajo = self.cola.enviar_grupos(grupos, usar_cache, sin_clasificar, almacen=almacen, reemplazar=reemplazar)
+        return self.cola.obtener(id_trabajo)
+
+    def reporte(self, trabajo, formato):
+        """Ruta del reporte del trabajo en ``formato``; se escribe una sola vez por trabajo y formato."""
+        with self._generando:
+            # Se borran los reportes de los trabajos que la cola ya descartó.
+            for llave in [llave for llave in self._reportes if self.cola.obtener(llave[0]) is None]:
+                Path(self._reportes.pop(llave)).unlink(missing_ok=True)
+            if (trabajo.id, formato) not in self._reportes:
+                ruta = os.path.join(self._directorio.name, f"{trabajo.id}.{formato}")
+                separar_por = "ASEGURADORA" if len(trabajo.grupos) > 1 else None
+                escribir_reporte(trabajo.resultado, ruta, formato, separar_por)
+                self._reportes[(trabajo.id, formato)] = ruta
+            return self._reportes[(trabajo.id, formato)]
+
+
+class ManejadorCartera(BaseHTTPRequestHandler):
+    server_version = "LectorCartera"
+
+    def log_message(self, formato, *args):
+        logger.info(f"{self.address_string()} {formato % args}")
+
+    def _json(self, estado, contenido, cabeceras=()):
+        cuerpo = json.dumps(contenido, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(estado)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        for nombre, valor in cabeceras:
+            self.send_header(nombre, valor)
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def _error(self, e):
+        cabeceras = [("Retry-After", "30")] if e.estado == HTTPStatus.SERVICE_UNAVAILABLE else []
+        self._json(e.estado, {"error": str(e)}, cabeceras)
+
+    def _error_interno(self, e):
+        # El cliente recibe un 500 en JSON en vez de una conexión cortada; el detalle queda en el log.
+        logger.exception(f"Error atendiendo {self.command} {self.path}")
+        self._error(ErrorSolicitud(HTTPStatus.INTERNAL_SERVER_ERROR, f"Error interno: {type(e).__name__}: {e}"))
+
+    def _ruta(self):
+        partes = urlsplit(self.path)
+        return [p for p in partes.path.split("/") if p], parse_qs(partes.query)
+
+    def _trabajo(self, id_trabajo):
+        trabajo = self.server.cola.obtener(id_trabajo)
+        if trabajo is None:
+            raise ErrorSolicitud(HTTPStatus.NOT_FOUND, f"No existe el trabajo {id_trabajo} o ya se descartó.")
+        return trabajo
+
+    def do_POST(self):
+        try:
+            ruta, _ = self._ruta()
+            if ruta != ["trabajos"]:
+                raise ErrorSolicitud(HTTPStatus.NOT_FOUND, "Ruta desconocida.")
+            largo = self.headers.get("Content-Length")
+            if largo is None:
+                raise ErrorSolicitud(HTTPStatus.LENGTH_REQUIRED, "Falta la cabecera Content-Length.")
+            try:
+                largo = int(largo)
+            except ValueError:
+                largo = -1
+            if largo < 0:
+                # Sin un largo válido no se sabe dónde termina el cuerpo: no se lee y se cierra la conexión.
+                self.close_connection = True
+                raise ErrorSolicitud(HTTPStatus.BAD_REQUEST, "La cabecera Content-Length debe ser un entero no negativo.")
+            if largo > self.server.max_bytes:
+                # No se lee el cuerpo: se cierra la conexión al responder.
+                self.close_connection = True
+                raise ErrorSolicitud(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"El envío supera el máximo de {self.server.max_bytes // (1024 * 1024)} MB.")
+            campos, archivos = leer_multipart(self.headers.get("Content-Type"), self.rfile.read(largo))
+            trabajo = self.server.enviar(campos, archivos)
+        except ErrorSolicitud as e:
+            self._error(e)
+            return
+        except Exception as e:
+            self._error_interno(e)
+            return
+        self._json(HTTPStatus.ACCEPTED, estado_trabajo(trabajo, self.server.cola))
+
+    def do_GET(self):
+        try:
+            ruta, consulta = self._ruta()
+            if ruta == ["trabajos"]:
+                self._json(HTTPStatus.OK, [estado_trabajo(t, self.server.cola) for t in self.server.cola.trabajos()])
+            elif len(ruta) == 2 and ruta[0] == "trabajos":
+                self._json(HTTPStatus.OK, estado_trabajo(self._trabajo(ruta[1]), self.server.cola))
+            elif len(ruta) == 3 and ruta[0] == "trabajos" and ruta[2] == "filas":
+                self._filas(self._trabajo(ruta[1]))
+            elif len(ruta) == 3 and ruta[0] == "trabajos" and ruta[2] == "reporte":
+                self._reporte(self._trabajo(ruta[1]), (consulta.get("formato") or ["xlsx"])[0])
+            else:
+                raise ErrorSolicitud(HTTPStatus.NOT_FOUND, "Ruta desconocida.")
+        except ErrorSolicitud as e:
+            self._error(e)
+        except Exception as e:
+            # _filas y _reporte atrapan lo que pase después de enviar las cabeceras.
+            self._error_interno(e)
+
+    def do_DELETE(self):
+        try:
+            ruta, _ = self._ruta()
+            if len(ruta) != 2 or ruta[0] != "trabajos":
+                raise ErrorSolicitud(HTTPStatus.NOT_FOUND, "Ruta desconocida.")
+            trabajo = self._trabajo(ruta[1])
+        except ErrorSolicitud as e:
+            self._error(e)
+            return
+        trabajo.cancelar()
+        self._json(HTTPStatus.ACCEPTED, estado_trabajo(trabajo, self.server.cola))
+
+    def _filas(self, trabajo):
+        # Sin Content-Length el cliente lee hasta que se cierra la conexión.
+        self.close_connection = True
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+        self.end_headers()
+        try:
+            for df in trabajo.partes():
+                lineas = df.to_json(orient="records", lines=True, date_format="iso", date_unit="s", force_ascii=False)
+                self.wfile.write(lineas.rstrip("\n").encode("utf-8") + b"\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            logger.info(f"El cliente cerró el flujo de filas del trabajo {trabajo.id}.")
+        except Exception:
+            # Las cabeceras ya salieron: el cliente ve el flujo cortado y el error queda en el log.
+            logger.exception(f"Error en el flujo de filas del trabajo {trabajo.id}")
+
+    def _reporte(self, trabajo, formato):
+        if formato not in FORMATOS or formato not in formatos_disponibles():
+            raise ErrorSolicitud(HTTPStatus.BAD_REQUEST, f"Formato '{formato}' no disponible. Opciones: {', '.join(formatos_disponibles())}")
+        if trabajo.estado not in ESTADOS_FINALES:
+            raise ErrorSolicitud(HTTPStatus.CONFLICT, f"El trabajo está {trabajo.estado}; el reporte estará disponible cuando termine.")
+        if trabajo.resultado is None or trabajo.resultado.empty:
+            raise ErrorSolicitud(HTTPStatus.NOT_FOUND, "El trabajo no generó datos.")
+        try:
+            ruta = self.server.reporte(trabajo, formato)
+        except Exception as e:
+            self._error_interno(e)
+            return
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", FORMATOS[formato][2])
+        self.send_header("Content-Length", str(os.path.getsize(ruta)))
+        self.send_header("Content-Disposition", f'attachment; filename="{nombre_reporte(trabajo.selection_entidad, formato)}"')
+        self.end_headers()
+        try:
+            with open(ruta, "rb") as f:
+                shutil.copyfileobj(f, self.wfile)
+        except (BrokenPipeError, ConnectionResetError):
+            logger.info(f"El cliente cortó la descarga del reporte del trabajo {trabajo.id}.")
+
+
+def crear_servidor(host="127.0.0.1", puerto=PUERTO, **opciones):
+    """Crea el servidor sin iniciarlo; con ``puerto=0`` el sistema elige uno libre (``server_address``)."""
+    return ServidorCartera((host, puerto), **opciones)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="lector_cartera.servicio", description="Servicio HTTP local para procesar soportes de pago.")
+    parser.add_argument("--host", default="127.0.0.1", help="Dirección en la que escucha (por defecto solo conexiones locales)")
+    parser.add_argument("--puerto", type=int, default=PUERTO)
+    parser.add_argument("--clientes", default=str(RUTA_CLIENTES), help="Ruta de lista_de_clientes.xlsx")
+    parser.add_argument("--simultaneos", type=int, default=TRABAJOS_SIMULTANEOS, help="Trabajos que se procesan a la vez")
+    parser.add_argument("--max-activos", type=int, default=MAX_ACTIVOS, help="Trabajos en cola o en proceso antes de responder 503")
+    parser.add_argument("--almacen", default=str(DIRECTORIO_ALMACEN), metavar="DIRECTORIO", help="Consolidado al que se agregan los envíos con el campo 'almacen'")
+    parser.add_argument("--max-mb", type=int, default=MAX_MB, help="Tamaño máximo de cada envío en MB")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    try:
+        cargar_entidades(args.clientes)
+    except (FileNotFoundError, ValueError) as e:
+        logger.error(str(e))
+        return 2
+    servidor = crear_servidor(args.host, args.puerto, cola=ColaTrabajos(args.simultaneos), ruta_clientes=args.clientes, max_mb=args.max_mb, max_activos=args.max_activos, almacen=AlmacenCartera(args.almacen))
+    logger.info(f"Servicio escuchando en http://{servidor.server_address[0]}:{servidor.server_address[1]}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
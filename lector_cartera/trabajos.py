@@ -0,0 +1,261 @@
+"""Cola de trabajos de procesamiento en segundo plano.
+
+Los lotes se ejecutan en un número acotado de hilos que comparten todas las
+sesiones de la aplicación. Cada trabajo tiene un identificador con el que una
+sesión, o la misma después de recargar la página, vuelve a consultar su
+progreso y su resultado. La cancelación se atiende entre un archivo y el
+siguiente.
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+from lector_cartera import instrumentacion
+from lector_cartera.archivos import copiar_archivo
+from lector_cartera.avisos import capturar_avisos
+from lector_cartera.cache import procesar_con_cache
+from lector_cartera.esquema import unir
+
+logger = logging.getLogger("lector_cartera")
+
+# Lotes que se procesan a la vez; los demás esperan en la cola.
+TRABAJOS_SIMULTANEOS = int(os.environ.get("CARTERA_TRABAJOS_SIMULTANEOS", "2"))
+# Trabajos terminados que se conservan para que las sesiones los recuperen.
+TRABAJOS_GUARDADOS = int(os.environ.get("CARTERA_TRABAJOS_GUARDADOS", "20"))
+
+EN_COLA = "en cola"
+PROCESANDO = "procesando"
+TERMINADO = "terminado"
+CANCELADO = "cancelado"
+FALLIDO = "fallido"
+ESTADOS_FINALES = (TERMINADO, CANCELADO, FALLIDO)
+
+# Nombre del trabajo cuando reúne archivos de varias entidades.
+ENTIDADES_VARIAS = "CONSOLIDADO"
+
+
+class Grupo(NamedTuple):
+    """Archivos que se procesan juntos con el procesador y los datos de una entidad."""
+    funcion: object
+    archivos: list
+    nit: object
+    selection_entidad: str
+    plan_entidad: object
+    opciones: dict = {}
+
+
+class TrabajoCancelado(Exception):
+    pass
+
+
+class Trabajo:
+    """Uno o varios grupos de archivos y el estado de su procesamiento.
+
+    ``detalle`` tiene una entrada por archivo terminado (archivo, filas,
+    segundos y origen) y ``avisos`` los mensajes (texto, nivel) de los
+    procesadores. Con ``diagnostico`` se guardan además en ``eventos`` los
+    tiempos de cada etapa. Al cancelar se conserva como resultado lo ya procesado.
+    Con un ``almacen`` el resultado de un trabajo terminado se agrega al
+    consolidado (con ``reemplazar``, reemplazando los archivos que ya estaban)
+    y ``almacenado`` queda con lo que se agregó.
+    """
+
+    def __init__(self, grupos, usar_cache=True, sin_clasificar=(), diagnostico=False, almacen=None, reemplazar=False):
+        self.id = uuid.uuid4().hex[:12]
+        self.grupos = grupos
+        self.selection_entidad = grupos[0].selection_entidad if len(grupos) == 1 else ENTIDADES_VARIAS
+        self.usar_cache = usar_cache
+        self.sin_clasificar = list(sin_clasificar)
+        self.total = sum(len(grupo.archivos) for grupo in grupos)
+        self.estado = EN_COLA
+        self.creado = time.time()
+        self.inicio = None
+        self.fin = None
+        self.detalle = []
+        self.avisos = []
+        self.resultado = None
+        self.error = None
+        self.registro = instrumentacion.Registro() if diagnostico else None
+        self.almacen = almacen
+        self.reemplazar = reemplazar
+        self.almacenado = None
+        self._partes = []
+        self._cancelar = threading.Event()
+        self._cambio = threading.Condition()
+        self._futuro = None
+
+    @property
+    def terminado(self):
+        return self.estado in ESTADOS_FINALES
+
+    @property
+    def procesados(self):
+        return len(self.detalle)
+
+    @property
+    def eventos(self):
+        return self.registro.eventos if self.registro is not None else []
+
+    def resultado_parcial(self, ultimas=None):
+        """Filas ya procesadas; con ``ultimas``, solo esa cantidad de las más recientes."""
+        if self.terminado:
+            resultado = self.resultado
+        else:
+            partes = list(self._partes)
+            if ultimas is not None:
+                # Solo se unen los últimos archivos que alcanzan para las filas pedidas.
+                desde, filas = len(partes), 0
+                while desde > 0 and filas < ultimas:
+                    desde -= 1
+                    filas += len(partes[desde])
+                partes = partes[desde:]
+            resultado = unir(partes)
+        if ultimas is None or resultado is None:
+            return resultado
+        return resultado.tail(ultimas)
+
+    def partes(self, espera=1.0):
+        """Genera el resultado de cada archivo a medida que termina, hasta que termine el trabajo.
+
+        Si el trabajo ya había terminado genera el resultado completo de una
+        vez. Entre un archivo y otro se revisa el estado cada ``espera`` segundos.
+        """
+        with self._cambio:
+            partes = None if self.terminado else self._partes
+        if partes is None:
+            if self.resultado is not None and not self.resultado.empty:
+                yield self.resultado
+            return
+        # Se conserva la lista aunque el trabajo termine y la suelte: sigue teniendo todas las partes.
+        enviadas = 0
+        while True:
+            with self._cambio:
+                if enviadas == len(partes) and not self.terminado:
+                    self._cambio.wait(espera)
+                nuevas, terminado = partes[enviadas:], self.terminado
+            enviadas += len(nuevas)
+            yield from (df for df in nuevas if not df.empty)
+            if terminado and enviadas == len(partes):
+                return
+
+    def cancelar(self):
+        self._cancelar.set()
+        if self._futuro is not None and self._futuro.cancel():
+            self._finalizar(CANCELADO)
+
+    def _progreso(self, nombre, df, segundos):
+        with self._cambio:
+            self._partes.append(df)
+            self.detalle.append({"ARCHIVO": nombre, "FILAS": len(df), "SEGUNDOS": segundos, "ORIGEN": "caché" if segundos is None else "procesado"})
+            self._cambio.notify_all()
+        if self._cancelar.is_set():
+            raise TrabajoCancelado()
+
+    def _aviso(self, mensaje, nivel):
+        self.avisos.append((mensaje, nivel))
+
+    def ejecutar(self):
+        if self._cancelar.is_set():
+            self._finalizar(CANCELADO)
+            return
+        self.estado = PROCESANDO
+        self.inicio = time.time()
+        try:
+            resultados = []
+            with capturar_avisos(self._aviso), instrumentacion.capturar(self.registro), instrumentacion.contexto(trabajo=self.id):
+                for grupo in self.grupos:
+                    resultados.append(procesar_con_cache(grupo.funcion, grupo.archivos, grupo.nit, grupo.selection_entidad, grupo.plan_entidad, usar_cache=self.usar_cache, progreso=self._progreso, **grupo.opciones))
+        except TrabajoCancelado:
+            self.resultado = unir(self._partes)
+            self._finalizar(CANCELADO)
+        except Exception as e:
+            logger.exception(f"Falló el trabajo {self.id} de {self.selection_entidad}")
+            self.error = str(e) or type(e).__name__
+            self._finalizar(FALLIDO)
+        else:
+            self.resultado = unir(resultados)
+            if self.almacen is not None:
+                self._almacenar()
+            self._finalizar(TERMINADO)
+
+    def _almacenar(self):
+        # Un fallo al guardar el consolidado no invalida el reporte del trabajo.
+        try:
+            with capturar_avisos(self._aviso), instrumentacion.capturar(self.registro), instrumentacion.contexto(trabajo=self.id):
+                self.almacenado = self.almacen.agregar(self.resultado, self.grupos, self.reemplazar)
+        except (OSError, ImportError) as e:
+            logger.exception(f"No se pudo agregar el trabajo {self.id} al consolidado")
+            self._aviso(f"No se pudo agregar el lote al consolidado: {e}", "error")
+
+    def _finalizar(self, estado):
+        # Los bytes de los archivos y las partes ya no hacen falta.
+        self.grupos = [grupo._replace(archivos=[]) for grupo in self.grupos]
+        self.fin = time.time()
+        if self.inicio is not None:
+            with instrumentacion.capturar(self.registro), instrumentacion.contexto(trabajo=self.id):
+                filas = len(self.resultado) if self.resultado is not None else None
+                instrumentacion.registrar("trabajo", self.fin - self.inicio, filas, self.error, estado=estado, archivos=self.procesados)
+        with self._cambio:
+            self._partes = []
+            self.estado = estado
+            self._cambio.notify_all()
+
+
+class ColaTrabajos:
+    """Cola de trabajos con un máximo de ``max_simultaneos`` en ejecución."""
+
+    def __init__(self, max_simultaneos=TRABAJOS_SIMULTANEOS, max_guardados=TRABAJOS_GUARDADOS):
+        self.max_guardados = max_guardados
+        self._pool = ThreadPoolExecutor(max_workers=max_simultaneos, thread_name_prefix="lector_cartera")
+        self._trabajos = {}
+        self._candado = threading.Lock()
+
+    def enviar(self, funcion, archivos, nit, selection_entidad, plan_entidad, usar_cache=True, diagnostico=False, almacen=None, reemplazar=False, **opciones):
+        """Encola el lote de una entidad y devuelve el identificador del trabajo."""
+        return self.enviar_grupos([Grupo(funcion, archivos, nit, selection_entidad, plan_entidad, opciones)], usar_cache, diagnostico=diagnostico, almacen=almacen, reemplazar=reemplazar)
+
+    def enviar_grupos(self, grupos, usar_cache=True, sin_clasificar=(), diagnostico=False, almacen=None, reemplazar=False):
+        """Encola varios grupos como un solo trabajo y devuelve su identificador.
+
+        Los archivos se copian en memoria para que el trabajo siga aunque la
+        sesión que los cargó se cierre. ``sin_clasificar`` son los nombres de
+        los archivos que no se pudieron asignar a ningún grupo. Con
+        ``diagnostico`` el trabajo guarda los tiempos de cada etapa y con
+        ``almacen`` (un AlmacenCartera) agrega su resultado al consolidado;
+        con ``reemplazar`` cambia las filas de los archivos que ya estaban.
+        """
+        grupos = [grupo._replace(archivos=[copiar_archivo(a) for a in grupo.archivos]) for grupo in grupos]
+        trabajo = Trabajo(grupos, usar_cache, sin_clasificar, diagnostico, almacen, reemplazar)
+        with self._candado:
+            self._trabajos[trabajo.id] = trabajo
+            self._recortar()
+            trabajo._futuro = self._pool.submit(trabajo.ejecutar)
+        return trabajo.id
+
+    def obtener(self, id_trabajo):
+        return self._trabajos.get(id_trabajo)
+
+    def cancelar(self, id_trabajo):
+        trabajo = self.obtener(id_trabajo)
+        if trabajo is not None:
+            trabajo.cancelar()
+
+    def posicion(self, id_trabajo):
+        """Cuántos trabajos en cola hay antes de este (0 si ya empezó)."""
+        with self._candado:
+            en_cola = [i for i, t in self._trabajos.items() if t.estado == EN_COLA]
+        return en_cola.index(id_trabajo) if id_trabajo in en_cola else 0
+
+    def trabajos(self):
+        with self._candado:
+            return list(self._trabajos.values())
+
+    def _recortar(self):
+        # Se descartan los trabajos terminados más antiguos; los activos nunca.
+        terminados = [i for i, t in self._trabajos.items() if t.terminado]
+        for id_trabajo in terminados[:max(0, len(self._trabajos) - self.max_guardados)]:
+            del self._trabajos[id_trabajo]
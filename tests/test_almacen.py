@@ -0,0 +1,104 @@
+"""Consolidado en Parquet: lotes repetidos, reemplazos y archivos sin filas."""
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import pandas as pd
+
+from lector_cartera import almacen as modulo_almacen
+from lector_cartera import cli
+from lector_cartera.almacen import AlmacenCartera
+from lector_cartera.archivos import ArchivoEnMemoria
+from lector_cartera.procesadores import procesar_bolivar, procesar_liberty
+from lector_cartera.trabajos import Grupo
+from tests.util import liberty_csv
+
+LIBERTY = "LIBERTY SEGUROS SA"
+BOLIVAR = "SEGUROS COMERCIALES BOLIVAR"
+
+
+def _bolivar_csv(nombre):
+    contenido = "Fecha de Pago;Detalles;Rte. ICA;Rte Fuente;Valor pago\n05/03/2025;FE1 pago;1;2;$ 100\n06/04/2025;FE2 pago;1;2;$ 200\n"
+    return ArchivoEnMemoria(nombre, contenido.encode("latin-1"))
+
+
+def procesar_liberty_otro(archivos, nit, selection_entidad, plan_entidad, progreso=None):
+    return procesar_liberty(archivos, nit, selection_entidad, plan_entidad, progreso)
+
+
+class PruebaAlmacen(unittest.TestCase):
+    def setUp(self):
+        temporal = tempfile.TemporaryDirectory(prefix="lector_cartera_almacen_")
+        self.addCleanup(temporal.cleanup)
+        self.directorio = Path(temporal.name)
+        self.almacen = AlmacenCartera(self.directorio)
+
+    def agregar(self, funcion, archivos, entidad=LIBERTY, reemplazar=False):
+        grupos = [Grupo(funcion, archivos, 1, entidad, "PLAN")]
+        return self.almacen.agregar(funcion(archivos, 1, entidad, "PLAN"), grupos, reemplazar)
+
+    def test_repetir_el_lote_no_agrega_nada(self):
+        archivos = [liberty_csv("marzo.csv", 3), liberty_csv("abril.csv", 2, mes=4)]
+        self.assertEqual(self.agregar(procesar_liberty, archivos), {"archivos": 2, "omitidos": 0, "sin_filas": 0, "filas": 5})
+        self.assertEqual(self.agregar(procesar_liberty, archivos), {"archivos": 0, "omitidos": 2, "sin_filas": 0, "filas": 0})
+        self.assertEqual(len(self.almacen.extraer()), 5)
+        self.assertEqual(len(self.almacen.extraer(desde="2025-04")), 2)
+        resumen = self.almacen.resumen()
+        self.assertEqual(resumen[["MES", "ARCHIVOS", "FILAS"]].values.tolist(), [["2025-03", 1, 3], ["2025-04", 1, 2]])
+
+    def test_archivo_sin_filas_no_se_registra(self):
+        archivos = [liberty_csv("pagos.csv", 1), ArchivoEnMemoria("otro.csv", b"Columna,Otra\n1,2\n")]
+        self.assertEqual(self.agregar(procesar_liberty, archivos), {"archivos": 1, "omitidos": 0, "sin_filas": 1, "filas": 1})
+        self.assertEqual(self.agregar(procesar_liberty, archivos), {"archivos": 0, "omitidos": 1, "sin_filas": 1, "filas": 0})
+        self.assertEqual(len(self.almacen.registros()), 1)
+
+    def test_archivo_enviado_con_otra_aseguradora(self):
+        archivo = _bolivar_csv("bolivar.csv")
+        self.assertEqual(self.agregar(procesar_liberty, [archivo])["sin_filas"], 1)
+        self.assertEqual(self.agregar(procesar_bolivar, [archivo], BOLIVAR), {"archivos": 1, "omitidos": 0, "sin_filas": 0, "filas": 2})
+        self.assertEqual(set(self.almacen.extraer()["ASEGURADORA"]), {BOLIVAR})
+
+    def test_reemplazar(self):
+        archivo = liberty_csv("pagos.csv", 4)
+        self.agregar(procesar_liberty, [archivo])
+        self.assertEqual(self.agregar(procesar_liberty, [archivo], reemplazar=True), {"archivos": 1, "omitidos": 0, "sin_filas": 0, "filas": 4})
+        self.assertEqual(len(self.almacen.extraer()), 4)
+        self.assertEqual(len(self.almacen.registros()), 1)
+        self.assertEqual(len(list(self.directorio.glob("ASEGURADORA=*/MES=*/*.parquet"))), 1)
+
+    def test_reemplazar_con_un_archivo_que_ahora_falla_conserva_las_filas(self):
+        archivo = liberty_csv("pagos.csv", 4)
+        self.agregar(procesar_liberty, [archivo])
+        self.assertEqual(self.agregar(procesar_bolivar, [archivo], BOLIVAR, reemplazar=True)["sin_filas"], 1)
+        self.assertEqual(len(self.almacen.extraer()), 4)
+
+    def test_otra_version_u_otro_procesador_reemplazan(self):
+        archivo = liberty_csv("pagos.csv", 4)
+        self.agregar(procesar_liberty, [archivo])
+        with mock.patch.object(modulo_almacen, "VERSION_PARSER", modulo_almacen.VERSION_PARSER + 1):
+            self.assertEqual(self.agregar(procesar_liberty, [archivo])["archivos"], 1)
+            self.assertEqual(self.agregar(procesar_liberty, [archivo])["omitidos"], 1)
+            self.assertEqual(self.agregar(procesar_liberty_otro, [archivo])["archivos"], 1)
+        self.assertEqual(len(self.almacen.extraer()), 4)
+        self.assertEqual([r["procesador"] for r in self.almacen.registros()], ["procesar_liberty_otro"])
+
+
+class PruebaAlmacenCli(unittest.TestCase):
+    def test_reemplazar_desde_la_linea_de_comandos(self):
+        entidades = pd.DataFrame({"Razon Social": [LIBERTY], "Nit": [1], "Plan": ["PLAN"]})
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = Path(directorio) / "pagos.csv"
+            ruta.write_bytes(liberty_csv("pagos.csv", 3).getvalue())
+            argumentos = [LIBERTY, str(ruta), "-o", str(Path(directorio) / "reporte.csv"), "--sin-cache", "--almacen", str(Path(directorio) / "almacen")]
+            with mock.patch.object(cli, "cargar_entidades", return_value=entidades), mock.patch.object(AlmacenCartera, "agregar", autospec=True, side_effect=AlmacenCartera.agregar) as agregar:
+                for extra in ([], [], ["--reemplazar"]):
+                    self.assertEqual(cli.main(argumentos + extra), 0)
+            self.assertEqual([llamada.kwargs["reemplazar"] for llamada in agregar.call_args_list], [False, False, True])
+            self.assertEqual(len(AlmacenCartera(Path(directorio) / "almacen").extraer()), 3)
+            with self.assertRaises(SystemExit):
+                cli.main(argumentos[:-2] + ["--reemplazar"])
+
+
+if __name__ == "__main__":
+    unittest.main()
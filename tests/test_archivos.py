@@ -0,0 +1,86 @@
+"""ZIP cargados y rutas del disco: archivos que se leen solo al abrirlos."""
+import io
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+from unittest import mock
+
+from lector_cartera.archivos import ArchivoEnMemoria, ArchivoLocal, MiembroZip, abrir_archivo, abrir_rutas, copiar_archivo, expandir_zip, leer_contenido
+from lector_cartera.avisos import capturar_avisos
+
+
+def _zip(miembros):
+    salida = io.BytesIO()
+    with zipfile.ZipFile(salida, "w", zipfile.ZIP_DEFLATED) as zip_:
+        for nombre, contenido in miembros.items():
+            if nombre.endswith("/"):
+                zip_.writestr(zipfile.ZipInfo(nombre), b"")
+            else:
+                zip_.writestr(nombre, contenido)
+    return salida.getvalue()
+
+
+MIEMBROS = {
+    "marzo/": b"",
+    "marzo/pagos.csv": b"a,b\n1,2\n",
+    "abril/pagos.csv": b"a,b\n3,4\n",
+    "abril/remesa.PDF": b"%PDF-1.4",
+    "abril/notas.txt": b"ignorar",
+    "abril/.DS_Store": b"ignorar",
+    "__MACOSX/abril/._pagos.csv": b"ignorar",
+}
+
+
+class PruebaZip(unittest.TestCase):
+    def test_miembros_soportados_con_la_ruta_del_zip(self):
+        miembros = expandir_zip([ArchivoEnMemoria("cierre.zip", _zip(MIEMBROS)), ArchivoEnMemoria("suelto.csv", b"x")])
+        self.assertEqual([m.name for m in miembros], ["cierre.zip/marzo/pagos.csv", "cierre.zip/abril/pagos.csv", "cierre.zip/abril/remesa.PDF", "suelto.csv"])
+        self.assertEqual([m.size for m in miembros[:2]], [8, 8])
+        self.assertEqual(leer_contenido(miembros[1]), b"a,b\n3,4\n")
+
+    def test_el_contenido_no_se_guarda(self):
+        miembro = expandir_zip([ArchivoEnMemoria("cierre.zip", _zip(MIEMBROS))])[0]
+        self.assertIs(copiar_archivo(miembro), miembro)
+        with mock.patch("lector_cartera.archivos.zipfile.ZipFile", wraps=zipfile.ZipFile) as abrir:
+            for _ in range(2):
+                abierto = abrir_archivo(miembro)
+                self.assertEqual(abierto.read(), b"a,b\n1,2\n")
+                self.assertEqual(abierto.name, miembro.name)
+        # Cada lectura descomprime de nuevo: el miembro no retiene los bytes descomprimidos.
+        self.assertEqual(abrir.call_count, 2)
+
+    def test_zip_en_disco_se_lee_desde_la_ruta(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = Path(directorio) / "cierre.zip"
+            ruta.write_bytes(_zip(MIEMBROS))
+            miembros = abrir_rutas([str(ruta)])
+            self.assertTrue(all(isinstance(m, MiembroZip) and m.origen == str(ruta) for m in miembros))
+            self.assertEqual(miembros[2].getvalue(), b"%PDF-1.4")
+
+    def test_archivo_del_disco_se_lee_al_abrirlo(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = Path(directorio) / "pagos.csv"
+            ruta.write_bytes(b"a,b\n1,2\n")
+            archivo = abrir_rutas([str(ruta)])[0]
+            self.assertIsInstance(archivo, ArchivoLocal)
+            self.assertEqual((archivo.name, archivo.size), ("pagos.csv", 8))
+            self.assertIs(copiar_archivo(archivo), archivo)
+            # El contenido no queda en el objeto: lo que cambie en el disco se ve al abrirlo.
+            ruta.write_bytes(b"a,b\n3,4\n")
+            abierto = abrir_archivo(archivo)
+            self.assertEqual((abierto.name, abierto.read()), ("pagos.csv", b"a,b\n3,4\n"))
+            self.assertEqual(leer_contenido(archivo), b"a,b\n3,4\n")
+
+    def test_zip_invalido_o_sin_archivos_se_avisa(self):
+        avisos = []
+        with capturar_avisos(lambda mensaje, nivel: avisos.append(mensaje)):
+            archivos = expandir_zip([ArchivoEnMemoria("roto.zip", b"no es un zip"), ArchivoEnMemoria("vacio.zip", _zip({"notas.txt": b"x"}))])
+        self.assertEqual(archivos, [])
+        self.assertEqual(len(avisos), 2)
+        self.assertIn("roto.zip no es un ZIP válido", avisos[0])
+        self.assertIn("vacio.zip no contiene", avisos[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+"""Recorte y limpieza de la caché de resultados."""
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import mock
+
+import pandas as pd
+
+from lector_cartera.archivos import ArchivoEnMemoria
+from lector_cartera.cache import CacheResultados, procesar_con_cache
+from lector_cartera.procesadores import procesar_liberty
+from tests.util import liberty_csv
+
+
+class PruebaCache(unittest.TestCase):
+    def setUp(self):
+        temporal = tempfile.TemporaryDirectory(prefix="lector_cartera_cache_")
+        self.addCleanup(temporal.cleanup)
+        self.directorio = Path(temporal.name)
+        # Lo que otras partes del paquete guardan en el mismo directorio.
+        self.ajenos = [self.directorio / "catalogo" / "clientes.pkl", self.directorio / "carteras" / "ab" / "cartera.pkl"]
+        for ruta in self.ajenos:
+            ruta.parent.mkdir(parents=True)
+            ruta.write_bytes(b"x" * 4096)
+
+    def test_recorte_y_limpieza_solo_tocan_los_resultados(self):
+        cache = CacheResultados(self.directorio, limite_mb=0)
+        cache.guardar("ab" + "0" * 38, pd.DataFrame({"a": [1]}))
+        cache.recortar()
+        self.assertEqual(list(self.directorio.glob("ab/*.pkl")), [])
+        cache.guardar("cd" + "0" * 38, pd.DataFrame({"a": [1]}))
+        cache.limpiar()
+        self.assertEqual(list(self.directorio.glob("cd/*.pkl")), [])
+        self.assertTrue(all(ruta.exists() for ruta in self.ajenos))
+
+    def test_un_recorte_por_lote(self):
+        cache = CacheResultados(self.directorio)
+        archivos = [liberty_csv(f"pagos_{i}.csv", 5) for i in range(6)]
+        with mock.patch.object(CacheResultados, "recortar", autospec=True) as recortar:
+            df = procesar_con_cache(procesar_liberty, archivos, 1, "LIBERTY SEGUROS SA", "PLAN", cache=cache)
+        self.assertEqual(len(df), 30)
+        self.assertEqual(recortar.call_count, 1)
+        self.assertEqual(len(list(self.directorio.glob("[0-9a-f][0-9a-f]/*.pkl"))), 6)
+        self.assertTrue(all(ruta.exists() for ruta in self.ajenos))
+        # Todo sale de la caché: no hay nada que guardar ni que recortar.
+        with mock.patch.object(CacheResultados, "recortar", autospec=True) as recortar:
+            procesar_con_cache(procesar_liberty, archivos, 1, "LIBERTY SEGUROS SA", "PLAN", cache=cache)
+        self.assertEqual(recortar.call_count, 0)
+
+    def test_guardados_simultaneos_de_la_misma_llave(self):
+        cache = CacheResultados(self.directorio)
+        llave = "ef" + "0" * 38
+        df = pd.DataFrame({"a": range(1000)})
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(lambda _: cache.guardar(llave, df), range(120)))
+        pd.testing.assert_frame_equal(cache.obtener(llave), df)
+        self.assertEqual(list(self.directorio.glob("ef/*.tmp")), [])
+
+    def test_entrada_danada_es_un_fallo(self):
+        cache = CacheResultados(self.directorio)
+        llave = "ef" + "1" * 38
+        cache.guardar(llave, pd.DataFrame({"a": [1]}))
+        ruta = next(self.directorio.glob("ef/*.pkl"))
+        ruta.write_bytes(ruta.read_bytes()[:20])
+        self.assertIsNone(cache.obtener(llave))
+        ruta.write_bytes(b"no es un pickle")
+        self.assertIsNone(cache.obtener(llave))
+
+    def test_entrada_recortada_antes_de_marcar_el_acceso(self):
+        cache = CacheResultados(self.directorio)
+        llave = "ef" + "2" * 38
+        cache.guardar(llave, pd.DataFrame({"a": [1]}))
+        with mock.patch("lector_cartera.cache.os.utime", side_effect=FileNotFoundError):
+            self.assertEqual(len(cache.obtener(llave)), 1)
+
+    def test_archivo_sin_filas_se_guarda_y_el_no_reconocido_no(self):
+        cache = CacheResultados(self.directorio)
+        archivos = [liberty_csv("pagos.csv", 3), liberty_csv("sin_pagos.csv", 0), ArchivoEnMemoria("otro.csv", b"Columna,Otra\n1,2\n")]
+        df = procesar_con_cache(procesar_liberty, archivos, 1, "LIBERTY SEGUROS SA", "PLAN", cache=cache)
+        self.assertEqual(len(df), 3)
+        self.assertEqual(len(list(self.directorio.glob("[0-9a-f][0-9a-f]/*.pkl"))), 2)
+        origen = {}
+        df = procesar_con_cache(procesar_liberty, archivos, 1, "LIBERTY SEGUROS SA", "PLAN", cache=cache, progreso=lambda nombre, df, segundos: origen.__setitem__(nombre, segundos))
+        self.assertEqual(len(df), 3)
+        self.assertIsNone(origen["pagos.csv"])
+        self.assertIsNone(origen["sin_pagos.csv"])
+        self.assertIsNotNone(origen["otro.csv"])
+
+
+if __name__ == "__main__":
+    unittest.main()
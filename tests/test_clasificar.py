@@ -0,0 +1,58 @@
+"""Clasificación automática: cada formato sintético va a su familia y los desconocidos quedan aparte."""
+import io
+import tempfile
+import unittest
+
+import pandas as pd
+
+from benchmarks.sinteticos import GENERADORES, contenido_pdf, generar
+from lector_cartera.archivos import ArchivoEnMemoria, ArchivoLocal
+from lector_cartera.clasificar import candidatas, clasificar, clasificar_archivos
+from lector_cartera.procesadores import FAMILIAS
+
+
+def _xlsx(df):
+    salida = io.BytesIO()
+    df.to_excel(salida, index=False)
+    return salida.getvalue()
+
+
+class PruebaClasificar(unittest.TestCase):
+    def test_un_archivo_por_escenario(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            for escenario, (familia, _, _) in GENERADORES.items():
+                with self.subTest(escenario=escenario):
+                    self.assertEqual(clasificar(ArchivoLocal(generar(escenario, directorio, 5)[0])), familia)
+        self.assertEqual({familia for familia, _, _ in GENERADORES.values()}, set(FAMILIAS))
+
+    def test_desconocidos_quedan_sin_clasificar(self):
+        desconocidos = [
+            ArchivoEnMemoria("inventario.xlsx", _xlsx(pd.DataFrame({"PRODUCTO": ["x"], "CANTIDAD": [1]}))),
+            ArchivoEnMemoria("notas.csv", b"fecha;comentario\n2025-03-01;nada\n"),
+            ArchivoEnMemoria("carta.pdf", contenido_pdf([["Bogota, marzo de 2025", "Cordial saludo"]])),
+            ArchivoEnMemoria("roto.xlsx", b"no es un libro"),
+        ]
+        for archivo in desconocidos:
+            with self.subTest(archivo=archivo.name):
+                self.assertIsNone(clasificar(archivo))
+
+    def test_reparte_el_lote_por_familia(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            archivos = [ArchivoLocal(generar(escenario, directorio, 5)[0]) for escenario in ("axa", "liberty_csv", "nueva_eps", "liberty")]
+            desconocido = ArchivoEnMemoria("inventario.xlsx", _xlsx(pd.DataFrame({"PRODUCTO": ["x"]})))
+            por_familia, sin_clasificar = clasificar_archivos([*archivos, desconocido])
+        self.assertEqual({familia: [a.name for a in lista] for familia, lista in por_familia.items()}, {
+            "AXA": ["axa_0.xlsx"],
+            "LIBERTY": ["liberty_csv_0.csv", "liberty_0.xlsx"],
+            "NUEVA EPS": ["nueva_eps_0.xlsx"],
+        })
+        self.assertEqual(sin_clasificar, [desconocido])
+
+    def test_candidatas_en_el_orden_del_catalogo(self):
+        self.assertIn("COMPAÑIA MUNDIAL DE SEGUROS SA", candidatas("MUNDIAL"))
+        catalogo = ["SEGUROS DE VIDA SURAMERICANA SA", "COMPAÑIA MUNDIAL DE SEGUROS SA", "EPS SURAMERICANA SA", "EPS SURAMERICANA SA"]
+        self.assertEqual(candidatas("SURA", catalogo), ["SEGUROS DE VIDA SURAMERICANA SA", "EPS SURAMERICANA SA"])
+
+
+if __name__ == "__main__":
+    unittest.main()
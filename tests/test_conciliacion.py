@@ -0,0 +1,77 @@
+"""Conciliación de los pagos contra la cartera de facturas abiertas."""
+import tempfile
+import unittest
+
+import pandas as pd
+
+from lector_cartera.archivos import ArchivoEnMemoria
+from lector_cartera.cache import CacheResultados
+from lector_cartera.conciliacion import (
+    CONCILIADA,
+    NO_ESTA_EN_CARTERA,
+    PAGO_DUPLICADO,
+    REPETIDA_EN_CARTERA,
+    SIN_FACTURA,
+    cargar_cartera,
+    claves_factura,
+    conciliar,
+    resumen_conciliacion,
+)
+
+
+def _pagos(facturas, brutos, vr_factura=None):
+    return pd.DataFrame({
+        "APLICA A FV": pd.Series(facturas, dtype="string"),
+        "VR. FACTURA": vr_factura if vr_factura is not None else [0.0] * len(facturas),
+        "VR. BRUTO": brutos,
+        "DIFERENCIA": [-b for b in brutos],
+    })
+
+
+class PruebaConciliacion(unittest.TestCase):
+    def setUp(self):
+        temporal = tempfile.TemporaryDirectory(prefix="lector_cartera_conciliacion_")
+        self.addCleanup(temporal.cleanup)
+        self.cache = CacheResultados(temporal.name)
+        # FE10 está dos veces; 0007 se encuentra por la clave numérica; la fila sin factura se descarta.
+        contenido = "Factura;Valor Factura;Saldo\nFE10;1.000,00;1.000,00\nFE10;2.000,00;0\n0007;3.500,50;500\nFE20;4.000;4.000\n;9;9\n"
+        self.cartera = cargar_cartera(ArchivoEnMemoria("cartera.csv", contenido.encode("utf-8")), cache=self.cache)
+
+    def test_claves_sin_ceros_ni_signos(self):
+        completa, numerica = claves_factura(pd.Series(["FE-0012", "12.0", "fv 000", None, "--"]))
+        self.assertEqual(completa.tolist(), ["FE12", "12", "FV0", pd.NA, pd.NA])
+        self.assertEqual(numerica.tolist(), ["12", "12", "0", pd.NA, pd.NA])
+
+    def test_cartera_regional_y_en_cache(self):
+        self.assertEqual(self.cartera["COMPLETA"].tolist(), ["FE10", "FE10", "7", "FE20"])
+        self.assertEqual(self.cartera["VALOR"].tolist(), [1000.0, 2000.0, 3500.5, 4000.0])
+        self.assertEqual(self.cartera["SALDO"].tolist(), [1000.0, 0.0, 500.0, 4000.0])
+        self.assertEqual(len(list(self.cache.directorio.glob("[0-9a-f][0-9a-f]/*.pkl"))), 1)
+
+    def test_estados(self):
+        df = conciliar(_pagos(["FE10", "FV7", "FE20", "FE20", "FE99", None], [100.0, 3500.5, 4000.0, 4000.0, 10.0, 5.0]), self.cartera)
+        self.assertEqual(df["CONCILIACION"].tolist(), [REPETIDA_EN_CARTERA, CONCILIADA, CONCILIADA, PAGO_DUPLICADO, NO_ESTA_EN_CARTERA, SIN_FACTURA])
+        # Solo las facturas encontradas una vez completan el valor y la diferencia.
+        pd.testing.assert_series_equal(df["VR. FACTURA"], pd.Series([0.0, 3500.5, 4000.0, 4000.0, 0.0, 0.0], name="VR. FACTURA"))
+        pd.testing.assert_series_equal(df["DIFERENCIA"], pd.Series([-100.0, 0.0, 0.0, 0.0, -10.0, -5.0], name="DIFERENCIA"))
+        self.assertEqual(df["SALDO CARTERA"].fillna(-1).tolist(), [-1, 500.0, 4000.0, 4000.0, -1, -1])
+
+    def test_valor_del_procesador_se_conserva(self):
+        df = conciliar(_pagos(["FE20"], [4000.0], vr_factura=[4100.0]), self.cartera)
+        self.assertEqual(df["VR. FACTURA"].tolist(), [4100.0])
+        self.assertEqual(df["DIFERENCIA"].tolist(), [-4000.0])
+
+    def test_resumen_por_estado(self):
+        df = conciliar(_pagos(["FE20", "FE20", "FE99"], [4000.0, 4000.0, 10.0]), self.cartera)
+        resumen = resumen_conciliacion(df).set_index("CONCILIACION")
+        self.assertEqual(resumen.loc[CONCILIADA, "PAGOS"], 1)
+        self.assertEqual(resumen.loc[PAGO_DUPLICADO, "VALOR"], 4000.0)
+        self.assertEqual(resumen.loc[REPETIDA_EN_CARTERA, "PAGOS"], 0)
+
+    def test_cartera_sin_columnas(self):
+        with self.assertRaises(ValueError):
+            cargar_cartera(ArchivoEnMemoria("otra.csv", b"Nombre,Ciudad\nA,B\n"), usar_cache=False)
+
+
+if __name__ == "__main__":
+    unittest.main()
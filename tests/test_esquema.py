@@ -0,0 +1,31 @@
+"""Totales por fecha del resultado, con y sin fechas."""
+import unittest
+
+import pandas as pd
+
+from lector_cartera.esquema import COLUMNAS_TOTALES, dias, totales
+
+
+def resultado(**columnas):
+    return pd.DataFrame({**{columna: [1.0, 2.0, 3.0] for columna in COLUMNAS_TOTALES}, **columnas})
+
+
+class PruebaDias(unittest.TestCase):
+    def test_fechas_de_cada_archivo(self):
+        df = resultado(FECHA=["05/03/2025", "2025-03-01", None], ARCHIVO=["a.csv", "b.csv", "b.csv"])
+        self.assertEqual(dias(df).tolist(), ["2025-03-05", "2025-03-01", "Sin fecha"])
+
+    def test_sin_columna_de_fecha(self):
+        df = resultado(ARCHIVO=["a.csv"] * 3)
+        por_fecha = totales(df, dias(df)).sort_values("FECHA", ignore_index=True)
+        self.assertEqual(por_fecha["FECHA"].tolist(), ["Sin fecha"])
+        self.assertEqual(por_fecha["FILAS"].tolist(), [3])
+        self.assertEqual(por_fecha["VR. BRUTO"].tolist(), [6.0])
+
+    def test_resultado_vacio(self):
+        df = pd.DataFrame(columns=["FECHA", "ARCHIVO", *COLUMNAS_TOTALES])
+        self.assertEqual(list(totales(df, dias(df)).sort_values("FECHA").columns), ["FECHA", "FILAS", *COLUMNAS_TOTALES])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+"""Lectura de columnas del XML de la hoja: mismo resultado que pandas.read_excel."""
+import io
+import unittest
+from datetime import datetime
+
+import pandas as pd
+import xlsxwriter
+
+from lector_cartera.archivos import ArchivoEnMemoria
+from lector_cartera.excel import buscar_fila_encabezado, leer_columnas, leer_primeras_filas
+
+COLUMNAS = ["Fecha Pago", "Factura", "Valor", "Nota"]
+
+
+def _libro(filas_vacias_al_final=3, hoja_previa=False, fila_lejana=True):
+    salida = io.BytesIO()
+    libro = xlsxwriter.Workbook(salida, {"in_memory": True})
+    if hoja_previa:
+        libro.add_worksheet("Portada").write(0, 0, "Resumen")
+    hoja = libro.add_worksheet("Pagos")
+    fecha = libro.add_format({"num_format": "dd/mm/yyyy"})
+    borde = libro.add_format({"border": 1})
+    hoja.write(0, 0, "ESTADO DE CUENTA")
+    hoja.write_row(2, 0, [" Fecha Pago ", "Factura", "Valor", "Nota", "Ignorada"])
+    filas = [
+        (datetime(2025, 3, 1), "FE001", 1500.5, "ok", "x"),
+        (datetime(2025, 3, 2), 2002, 0, None, "x"),
+        (None, "FE003", None, "sin fecha", None),
+        (datetime(2025, 3, 4), "", 12, True, "x"),
+    ]
+    for i, (dia, factura, valor, nota, otra) in enumerate(filas, start=3):
+        if dia is not None:
+            hoja.write_datetime(i, 0, dia, fecha)
+        hoja.write(i, 1, factura)
+        if valor is not None:
+            hoja.write_number(i, 2, valor)
+        if nota is not None:
+            hoja.write(i, 3, nota)
+        if otra is not None:
+            hoja.write(i, 4, otra)
+    # Fila vacía en medio y filas con formato pero sin valores al final.
+    hoja.write_row(8, 0, [datetime(2025, 3, 9)], fecha)
+    hoja.write_row(8, 1, ["FE009", 9])
+    for i in range(9, 9 + filas_vacias_al_final):
+        hoja.write_blank(i, 0, None, borde)
+    if fila_lejana:
+        hoja.write(20, 4, "solo en la columna ignorada")
+    libro.close()
+    return ArchivoEnMemoria("pagos.xlsx", salida.getvalue())
+
+
+class PruebaLeerColumnas(unittest.TestCase):
+    def esperado(self, archivo, columnas, hoja):
+        archivo.seek(0)
+        df = pd.read_excel(archivo, sheet_name=hoja, header=2)
+        df.columns = [str(c).strip() for c in df.columns]
+        return df[columnas]
+
+    def test_igual_que_pandas(self):
+        for hoja_previa in (False, True):
+            with self.subTest(hoja_previa=hoja_previa):
+                archivo = _libro(hoja_previa=hoja_previa)
+                hoja = 1 if hoja_previa else 0
+                df = leer_columnas(archivo, COLUMNAS, header=2, sheet_name=hoja, dtype={"Valor": "float64"}, normalizar=str.strip)
+                self.assertEqual(archivo.tell(), 0)
+                pd.testing.assert_frame_equal(df, self.esperado(archivo, COLUMNAS, hoja).astype({"Valor": "float64"}))
+
+    def test_filas_vacias_del_final(self):
+        # Las filas con formato y sin valores del final se descartan, como en pandas.
+        archivo = _libro(filas_vacias_al_final=10, fila_lejana=False)
+        df = leer_columnas(archivo, ["Factura"], header=2, normalizar=str.strip)
+        self.assertEqual(df["Factura"].tolist()[-1], "FE009")
+        pd.testing.assert_frame_equal(df, self.esperado(archivo, ["Factura"], 0))
+
+    def test_fila_con_datos_solo_en_una_columna_ignorada(self):
+        # La fila 21 solo tiene datos en una columna que no se pide: pandas la conserva y aquí también.
+        archivo = _libro(filas_vacias_al_final=10)
+        df = leer_columnas(archivo, ["Factura"], header=2, normalizar=str.strip)
+        self.assertEqual(len(df), 18)
+        pd.testing.assert_frame_equal(df, self.esperado(archivo, ["Factura"], 0))
+
+    def test_columnas_que_faltan_se_omiten(self):
+        df = leer_columnas(_libro(), ["Factura", "No existe"], header=2, normalizar=str.strip)
+        self.assertEqual(list(df.columns), ["Factura"])
+
+    def test_encabezado_desde_la_vista_previa(self):
+        archivo = _libro()
+        fila, faltantes = buscar_fila_encabezado(leer_primeras_filas(archivo), COLUMNAS)
+        self.assertEqual((fila, faltantes), (2, []))
+        self.assertEqual(buscar_fila_encabezado(leer_primeras_filas(archivo), ["Factura", "Saldo"]), (None, ["Saldo"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
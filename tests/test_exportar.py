@@ -0,0 +1,34 @@
+"""Reporte en Excel: hojas por aseguradora y filas que no caben en una hoja."""
+import io
+import unittest
+from unittest import mock
+
+import openpyxl
+import pandas as pd
+
+from lector_cartera import exportar
+
+
+class PruebaExcel(unittest.TestCase):
+    def hojas(self, df, separar_por=None):
+        with mock.patch.object(exportar, "FILAS_HOJA", 3):
+            libro = openpyxl.load_workbook(io.BytesIO(exportar.exportar(df, "xlsx", separar_por)), read_only=True)
+        return {hoja.title: [fila for fila in hoja.iter_rows(values_only=True)] for hoja in libro.worksheets}
+
+    def test_filas_de_mas_siguen_en_otra_hoja(self):
+        hojas = self.hojas(pd.DataFrame({"FACTURA": [f"FE{i}" for i in range(7)]}))
+        self.assertEqual(list(hojas), ["Procesado", "Procesado (2)", "Procesado (3)"])
+        self.assertTrue(all(filas[0] == ("FACTURA",) for filas in hojas.values()))
+        self.assertEqual([fila[0] for filas in hojas.values() for fila in filas[1:]], [f"FE{i}" for i in range(7)])
+
+    def test_por_aseguradora_sin_perder_filas(self):
+        df = pd.DataFrame({"ASEGURADORA": ["AXA"] * 4 + ["SURA"] * 2, "FACTURA": range(6)})
+        hojas = self.hojas(df, "ASEGURADORA")
+        self.assertEqual({nombre: len(filas) - 1 for nombre, filas in hojas.items()}, {"AXA": 3, "AXA (2)": 1, "SURA": 2})
+
+    def test_reporte_vacio_conserva_el_encabezado(self):
+        self.assertEqual(self.hojas(pd.DataFrame(columns=["FACTURA"])), {"Procesado": [("FACTURA",)]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+"""Eventos de diagnóstico: registros por hilo, contexto, archivo JSON lines y resumen."""
+import json
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import mock
+
+from lector_cartera import instrumentacion
+from lector_cartera.instrumentacion import Registro, a_jsonl, capturar, contexto, etapa, reemitir, registrar, resumen
+
+
+def sin_tiempos(eventos):
+    return [{k: v for k, v in evento.items() if k not in ("momento", "segundos")} for evento in eventos]
+
+
+class PruebaInstrumentacion(unittest.TestCase):
+    def setUp(self):
+        parche = mock.patch.object(instrumentacion, "REGISTRO_GLOBAL", None)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def test_sin_registro_no_se_emite_nada(self):
+        self.assertFalse(instrumentacion.activo())
+        with etapa("lectura") as medicion:
+            medicion.filas = 3
+        registrar("lectura", 1.0)
+        with capturar(None) as registro:
+            self.assertIsNone(registro)
+            self.assertFalse(instrumentacion.activo())
+
+    def test_etapa_con_contexto_filas_y_error(self):
+        registro = Registro()
+        with capturar(registro), contexto(trabajo="t1"):
+            with contexto(archivo="a.csv"), etapa("lectura", layout="Liberty") as medicion:
+                medicion.filas = 10
+                medicion.campos["cache"] = False
+            with self.assertRaises(ValueError), etapa("exportar"):
+                raise ValueError("sin columnas")
+        self.assertEqual(sin_tiempos(registro.eventos), [
+            {"trabajo": "t1", "archivo": "a.csv", "layout": "Liberty", "cache": False, "etapa": "lectura", "filas": 10},
+            {"trabajo": "t1", "etapa": "exportar", "error": "ValueError: sin columnas"},
+        ])
+        self.assertTrue(all(evento["segundos"] >= 0 for evento in registro.eventos))
+
+    def test_capturas_anidadas_restauran_el_registro_anterior(self):
+        externo, interno = Registro(), Registro()
+        with capturar(externo), contexto(trabajo="t1"):
+            registrar("antes", 0.1)
+            with capturar(interno):
+                registrar("dentro", 0.2)
+            with capturar(interno, aislado=True):
+                # Aislado no hereda el contexto de quien captura.
+                registrar("aislado", 0.3)
+            registrar("despues", 0.4)
+        registrar("fuera", 0.5)
+        self.assertEqual([(e["etapa"], e.get("trabajo")) for e in externo.eventos], [("antes", "t1"), ("despues", "t1")])
+        self.assertEqual([(e["etapa"], e.get("trabajo")) for e in interno.eventos], [("dentro", "t1"), ("aislado", None)])
+        self.assertFalse(instrumentacion.activo())
+
+    def test_archivo_jsonl(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = Path(directorio) / "diagnostico.jsonl"
+            registro = Registro(ruta, en_memoria=False)
+            with capturar(registro), contexto(archivo="pagos ñ.csv"):
+                registrar("lectura", 0.25, filas=4)
+                instrumentacion.fallo("factura", ValueError("valor no numérico"), factura="FE1")
+            lineas = ruta.read_text(encoding="utf-8").splitlines()
+        self.assertEqual(registro.eventos, [])
+        eventos = [json.loads(linea) for linea in lineas]
+        self.assertEqual(sin_tiempos(eventos), [
+            {"archivo": "pagos ñ.csv", "etapa": "lectura", "filas": 4},
+            {"archivo": "pagos ñ.csv", "factura": "FE1", "etapa": "factura", "error": "ValueError: valor no numérico"},
+        ])
+        self.assertEqual(a_jsonl(eventos).decode("utf-8").splitlines(), lineas)
+
+    def test_registro_global_recibe_lo_que_no_esta_aislado(self):
+        global_, propio = Registro(), Registro()
+        with mock.patch.object(instrumentacion, "REGISTRO_GLOBAL", global_):
+            self.assertTrue(instrumentacion.activo())
+            registrar("suelto", 0.1)
+            with capturar(propio):
+                registrar("trabajo", 0.2)
+            with capturar(propio, aislado=True):
+                registrar("hijo", 0.3)
+        self.assertEqual([e["etapa"] for e in global_.eventos], ["suelto", "trabajo"])
+        self.assertEqual([e["etapa"] for e in propio.eventos], ["trabajo", "hijo"])
+
+    def test_cada_hilo_captura_en_su_registro(self):
+        registros = [Registro() for _ in range(4)]
+        barrera = threading.Barrier(len(registros))
+
+        def trabajar(i):
+            with capturar(registros[i]), contexto(trabajo=i):
+                # Todos los hilos emiten a la vez; cada evento debe quedar en el registro de su hilo.
+                barrera.wait(timeout=5)
+                for _ in range(50):
+                    registrar("archivo", 0.0)
+
+        principal = Registro()
+        with capturar(principal):
+            with ThreadPoolExecutor(max_workers=len(registros)) as pool:
+                list(pool.map(trabajar, range(len(registros))))
+        self.assertEqual(principal.eventos, [])
+        for i, registro in enumerate(registros):
+            self.assertEqual(len(registro.eventos), 50)
+            self.assertEqual({e["trabajo"] for e in registro.eventos}, {i})
+
+    def test_registro_compartido_entre_hilos(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = Path(directorio) / "diagnostico.jsonl"
+            registro = Registro(ruta)
+
+            def trabajar(i):
+                with capturar(registro), contexto(hilo=i):
+                    for j in range(100):
+                        registrar("archivo", 0.0, filas=j)
+
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                list(pool.map(trabajar, range(4)))
+            lineas = ruta.read_text(encoding="utf-8").splitlines()
+        self.assertEqual(len(registro.eventos), 400)
+        # Ninguna línea del archivo queda mezclada con la de otro hilo.
+        self.assertEqual(sorted((e["hilo"], e["filas"]) for e in map(json.loads, lineas)), [(i, j) for i in range(4) for j in range(100)])
+
+    def test_eventos_del_trabajador_se_reemiten_con_el_contexto_del_que_recibe(self):
+        def extraer(nombre):
+            registro = Registro()
+            with capturar(registro, aislado=True), contexto(archivo=nombre):
+                registrar("texto_pdf", 0.1, filas=2)
+            return registro.eventos
+
+        registro = Registro()
+        with capturar(registro), contexto(trabajo="t1", archivo="lote"):
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                for eventos in pool.map(extraer, ["a.pdf", "b.pdf"]):
+                    reemitir(eventos)
+        self.assertEqual([(e["trabajo"], e["archivo"], e["etapa"]) for e in registro.eventos], [("t1", "a.pdf", "texto_pdf"), ("t1", "b.pdf", "texto_pdf")])
+
+    def test_resumen_por_etapa(self):
+        eventos = [
+            {"etapa": "lectura", "segundos": 1.0, "filas": 10},
+            {"etapa": "lectura", "segundos": 3.0, "filas": 5, "error": "ValueError: x"},
+            {"etapa": "cache", "segundos": 0.5},
+        ]
+        tabla = resumen(eventos).set_index("ETAPA")
+        self.assertEqual(list(tabla.index), ["lectura", "cache"])
+        self.assertEqual(tabla.loc["lectura", ["EVENTOS", "SEGUNDOS", "PROMEDIO", "MAXIMO", "FILAS", "ERRORES"]].tolist(), [2, 4.0, 2.0, 3.0, 15.0, 1])
+        self.assertEqual(tabla.loc["cache", "ERRORES"], 0)
+        self.assertTrue(resumen([]).empty)
+
+
+if __name__ == "__main__":
+    unittest.main()
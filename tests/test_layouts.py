@@ -0,0 +1,105 @@
+"""Lectura de los layouts Excel y CSV: fechas por archivo y filas de cada formato."""
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+from unittest import mock
+
+import pandas as pd
+import xlsxwriter
+
+from benchmarks.sinteticos import generar
+from lector_cartera import layouts
+from lector_cartera.archivos import ArchivoEnMemoria, ArchivoLocal, abrir_archivo
+from lector_cartera.avisos import capturar_avisos
+from lector_cartera.procesadores import procesar_adres, procesar_liberty, procesar_nueva_eps, procesar_previsora
+from tests.util import ENCABEZADO_LIBERTY, liberty_csv
+
+
+class PruebaFechas(unittest.TestCase):
+    def procesar(self, *archivos):
+        avisos = []
+        with mock.patch.object(layouts, "FILAS_BLOQUE_CSV", 2), capturar_avisos(lambda mensaje, nivel: avisos.append(mensaje)):
+            df = procesar_liberty([liberty_csv(f"pagos_{i}.csv", fechas=fechas) for i, fechas in enumerate(archivos)], 1, "LIBERTY SEGUROS SA", "PLAN")
+        return df, avisos
+
+    def test_dia_primero_en_todo_el_archivo(self):
+        # El primer bloque no distingue el orden; el segundo sí (13/01). Se decide una vez por archivo.
+        df, avisos = self.procesar(["01/02/2025", "03/04/2025", "13/01/2025", "05/06/2025"])
+        self.assertEqual(avisos, [])
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(df["FECHA"]))
+        self.assertEqual(list(df["FECHA"].dt.strftime("%Y-%m-%d")), ["2025-02-01", "2025-04-03", "2025-01-13", "2025-06-05"])
+
+    def test_fecha_no_reconocida_queda_vacia_y_se_avisa(self):
+        # Un archivo con una fecha rara no deja como texto la columna del lote entero.
+        df, avisos = self.procesar(["01/02/2025", "03/04/2025"], ["05/06/2025", "enero", ""])
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(df["FECHA"]))
+        self.assertEqual(list(df["FECHA"].dt.strftime("%Y-%m-%d").fillna("")), ["2025-02-01", "2025-04-03", "2025-06-05", "", ""])
+        self.assertEqual(len(avisos), 1)
+        self.assertIn("pagos_1.csv: 1 fechas no reconocidas", avisos[0])
+        self.assertIn("'enero'", avisos[0])
+
+
+class PruebaBloquesCsv(unittest.TestCase):
+    def procesar(self, contenido, filas_bloque):
+        with mock.patch.object(layouts, "FILAS_BLOQUE_CSV", filas_bloque), capturar_avisos(lambda mensaje, nivel: None):
+            return procesar_liberty([ArchivoEnMemoria("pagos.csv", contenido)], 1, "LIBERTY SEGUROS SA", "PLAN")
+
+    def test_columnas_que_cambian_de_tipo_a_mitad_del_archivo(self):
+        # Las facturas son números hasta la fila 4 y el valor pagado trae un texto en la 7:
+        # los primeros bloques se leen con otros tipos que los siguientes.
+        lineas = [ENCABEZADO_LIBERTY]
+        for i in range(10):
+            factura = 1000 + i if i < 4 else f"FE{1000 + i}"
+            pagado = "N/A" if i == 7 else f"{2000 + i}.5"
+            retencion = "" if i < 5 else f"{i}.0"
+            lineas.append(f"0{1 + i % 9}/03/2025,{factura},{pagado},{retencion},{3000 + i}")
+        contenido = ("\n".join(lineas) + "\n").encode("utf-8")
+
+        entero = self.procesar(contenido, 1_000_000)
+        por_bloques = self.procesar(contenido, 3)
+        pd.testing.assert_frame_equal(por_bloques, entero)
+        self.assertEqual(list(entero["APLICA A FV"]), ["1000", "1001", "1002", "1003"] + [f"FE{1000 + i}" for i in range(4, 10)])
+        self.assertTrue(pd.isna(entero["VR. RECAUDADO"].iloc[7]))
+        self.assertEqual(entero["VR. RECAUDADO"].iloc[8], 2008.5)
+
+
+class PruebaNuevaEps(unittest.TestCase):
+    def test_filas_del_archivo(self):
+        # Antes de los layouts procesar_nueva_eps armaba las filas pero devolvía
+        # siempre un DataFrame vacío; ahora entrega las filas del archivo.
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = Path(directorio) / "nueva_eps.xlsx"
+            libro = xlsxwriter.Workbook(ruta)
+            hoja = libro.add_worksheet()
+            hoja.write_row(0, 0, ["Fecha Legalización", "Número Factura", "Valor Aplicación", "Otra"])
+            hoja.write_datetime(1, 0, datetime(2025, 3, 5), libro.add_format({"num_format": "dd/mm/yyyy"}))
+            hoja.write_row(1, 1, ["FE100", 50000, "x"])
+            hoja.write_row(2, 0, ["07/03/2025", 200, 1250.5, "y"])
+            libro.close()
+            df = procesar_nueva_eps([ArchivoLocal(str(ruta))], 900123, "NUEVA EPS SA", "PLAN")
+        self.assertEqual(list(df["APLICA A FV"]), ["FE100", "200"])
+        self.assertEqual(list(df["VR. BRUTO"]), [50000.0, 1250.5])
+        self.assertEqual(list(df["(-) RETEF"]), [1000.0, 25.01])
+        self.assertEqual(list(df["FECHA"].dt.strftime("%Y-%m-%d")), ["2025-03-05", "2025-03-07"])
+        self.assertEqual(set(df["ASEGURADORA"]), {"NUEVA EPS SA"})
+
+
+class PruebaSinteticos(unittest.TestCase):
+    """Los archivos de la suite de rendimiento tienen el encabezado donde lo traen los reales."""
+
+    def test_adres_y_liquidacion_de_previsora(self):
+        casos = {"adres": ("ADRES", procesar_adres, "ADRES", 5), "previsora_liquidacion": ("PREVISORA", procesar_previsora, "Previsora liquidación", 8)}
+        with tempfile.TemporaryDirectory() as directorio:
+            for escenario, (familia, procesar, nombre, fila) in casos.items():
+                with self.subTest(escenario=escenario):
+                    archivo = ArchivoLocal(generar(escenario, directorio, 20)[0])
+                    layout, encontrada, _ = layouts.detectar_layout(abrir_archivo(archivo), layouts.LAYOUTS[familia])
+                    self.assertEqual((layout.nombre, encontrada), (nombre, fila))
+                    self.assertEqual(len(procesar([archivo], 1, familia, "PLAN")), 20)
+            df = procesar_previsora([ArchivoLocal(generar("previsora_liquidacion", directorio, 3)[0])], 1, "PREVISORA", "PLAN")
+            self.assertEqual(set(df["FECHA"].dt.strftime("%Y-%m-%d")), {"2025-01-01"})
+
+
+if __name__ == "__main__":
+    unittest.main()
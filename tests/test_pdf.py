@@ -0,0 +1,177 @@
+"""Extracción de los PDF: búsqueda página a página, tabla de Equidad por posición de las palabras y reparto en procesos."""
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from benchmarks.sinteticos import contenido_pdf
+from lector_cartera import instrumentacion, pdf
+from lector_cartera.archivos import ArchivoEnMemoria
+from lector_cartera.cache import CacheResultados, procesar_con_cache
+from lector_cartera.pdf import FACTURA_SISCO, LECTURA_PDF, MARCA_SISCO, BusquedaPorPagina, LecturaPdf, extraer_equidad, extraer_seg_estado, paginas_leidas
+from lector_cartera.procesadores import procesar_equidad, procesar_seg_estado
+
+# Posición horizontal de cada columna de la tabla de Equidad.
+X_COLUMNAS = [40, 110, 150, 180, 210, 240, 270, 320, 400]
+
+
+class PruebaBusquedaPorPagina(unittest.TestCase):
+    """Buscar de a una página encuentra lo mismo que finditer sobre el texto completo."""
+
+    def buscar(self, paginas, arrastre=500):
+        busqueda = BusquedaPorPagina(FACTURA_SISCO, arrastre)
+        encontradas = []
+        for pagina in paginas:
+            encontradas += [c.groups() for c in busqueda.agregar(pagina)]
+        return encontradas + [c.groups() for c in busqueda.terminar()]
+
+    def test_fila_partida_por_el_salto_de_pagina(self):
+        paginas = ["\nencabezado\n12345   $ 1.000   $ 973\n67890   $ 2.000", "\n   $ 1.946\n11111   $ 3.000   $ 2.919"]
+        esperadas = [("12345", "1.000", "973"), ("67890", "2.000", "1.946"), ("11111", "3.000", "2.919")]
+        self.assertEqual(self.buscar(paginas), esperadas)
+        self.assertEqual([c.groups() for c in FACTURA_SISCO.finditer("".join(paginas))], esperadas)
+
+    def test_cortes_al_azar_igual_que_el_texto_completo(self):
+        azar = random.Random(0)
+        lineas = [f"{azar.randint(10_000, 99_999_999)}   $ {azar.randint(1, 9_999_999):,}   $ {azar.randint(1, 9_999_999):,}".replace(",", ".") for _ in range(300)]
+        texto = "\n".join(azar.choice([linea, "Pago aplicado", "Total $ 1.000"]) for linea in lineas)
+        esperadas = [c.groups() for c in FACTURA_SISCO.finditer(texto)]
+        # Con un arrastre menor que una fila, la búsqueda igual espera al inicio de la línea.
+        for arrastre in (0, 40, 500):
+            with self.subTest(arrastre=arrastre):
+                for _ in range(200):
+                    cortes = sorted(azar.sample(range(1, len(texto)), azar.randint(1, 30)))
+                    paginas = [texto[i:j] for i, j in zip([0] + cortes, cortes + [len(texto)])]
+                    self.assertEqual(self.buscar(paginas, arrastre), esperadas, f"cortes={cortes}")
+
+
+class PruebaPresupuestoPaginas(unittest.TestCase):
+    def paginas(self, textos, leidas):
+        for texto in textos:
+            leidas.append(texto)
+            yield texto
+
+    def test_solo_se_leen_las_paginas_del_presupuesto(self):
+        leidas = []
+        textos = ["www.sis.co, pagos", "segunda", "tercera", "cuarta"]
+        self.assertEqual(list(paginas_leidas(self.paginas(textos, leidas), LecturaPdf(2, MARCA_SISCO))), textos[:2])
+        self.assertEqual(leidas, textos[:2])
+        self.assertEqual(list(paginas_leidas(iter(textos), LecturaPdf())), textos)
+
+    def test_sin_marca_en_la_primera_pagina_no_se_lee_mas(self):
+        leidas = []
+        self.assertEqual(list(paginas_leidas(self.paginas(["otro soporte", "www.sis.co"], leidas), LECTURA_PDF["SISCO"])), [])
+        self.assertEqual(leidas, ["otro soporte"])
+
+    def test_sisco_ignora_las_filas_despues_de_la_segunda_pagina(self):
+        filas = [[f"{10_000 + 100 * pagina + i}   $ 1.000   $ 973" for i in range(3)] for pagina in range(3)]
+        contenido = contenido_pdf([["Bogotá, D.C., 5 de marzo de 2025", "www.sis.co, pagos"] + filas[0], filas[1], filas[2]])
+        for motor in ("pdfplumber", "pdfium"):
+            with self.subTest(motor=motor):
+                columnas = extraer_seg_estado("sisco.pdf", contenido, 1, "SEGUROS DEL ESTADO SA", "PLAN", motor)
+                self.assertEqual(columnas["APLICA FV"], [f"{10_000 + 100 * pagina + i}" for pagina in range(2) for i in range(3)])
+                self.assertEqual(set(columnas["FECHA"]), {"05/03/2025"})
+        sin_marca = contenido_pdf([["Bogotá, D.C., 5 de marzo de 2025"] + filas[0]])
+        self.assertEqual(extraer_seg_estado("otro.pdf", sin_marca, 1, "SEGUROS DEL ESTADO SA", "PLAN")["APLICA FV"], [])
+
+
+# Liquidación de Equidad de dos páginas. Con la expresión regular anterior
+# (FACTURA_EQUIDAD sobre el texto unido) la primera fila daba la factura '7' y
+# el neto '716991': su \D+ se tragaba la clase "AB" y corría las columnas.
+EQUIDAD = contenido_pdf([
+    [
+        "LA EQUIDAD SEGUROS GENERALES",
+        "Fecha: 07.04.2025",
+        ["1234567890", "2025", "AB", "12", "7", "3", "X4", "716991", "305.425-"],
+        ["123456789", "2025", "AB", "1", "2", "3", "X1", "100200", "1.000.000-"],
+        ["123456789012", "2025", "CD", "5", "6", "7", "X2", "100201", "49.000-"],
+        # Celda vacía en medio: la fila se arma por la posición de cada palabra.
+        ["2234567890", "2025", "AB", "8", "", "9", "X3", "100202", "98.000-"],
+        # Sin número de factura: se reporta y no se inventa una fila.
+        ["3234567890", "2025", "AB", "1", "1", "1", "X1", "PEND", "10.000-"],
+        "1",
+    ],
+    [
+        # Solo filas incompletas: las columnas se toman de la página anterior.
+        ["4234567890", "2025", "AB", "", "4", "4", "X5", "100203", "1.960-"],
+        "2",
+    ],
+], X_COLUMNAS)
+
+FILAS_EQUIDAD = [
+    # APLICA A FV, VR. BRUTO, (-) RETEF, VR. RECAUDADO
+    ("716991", 311658.16326530615, 6233.0, 305425.0),
+    ("100200", 1020408.1632653062, 20408.0, 1000000.0),
+    ("100201", 50000.0, 1000.0, 49000.0),
+    ("100202", 100000.0, 2000.0, 98000.0),
+    ("100203", 2000.0, 40.0, 1960.0),
+]
+
+
+class PruebaEquidad(unittest.TestCase):
+    def test_filas_fijas_con_ambos_motores(self):
+        for motor in ("pdfplumber", "pdfium"):
+            with self.subTest(motor=motor):
+                df = procesar_equidad([ArchivoEnMemoria("equidad.pdf", EQUIDAD)], 1, "LA EQUIDAD SEGUROS GENERALES", "PLAN", max_workers=1, motor=motor)
+                filas = list(df[["APLICA A FV", "VR. BRUTO", "(-) RETEF", "VR. RECAUDADO"]].itertuples(index=False, name=None))
+                self.assertEqual(filas, FILAS_EQUIDAD)
+                self.assertEqual(set(df["FECHA"].dt.strftime("%Y-%m-%d")), {"2025-04-07"})
+                self.assertEqual(set(df["ARCHIVO"]), {"equidad.pdf"})
+
+    def test_fila_sin_factura_se_reporta(self):
+        registro = instrumentacion.Registro()
+        with instrumentacion.capturar(registro):
+            columnas = extraer_equidad("equidad.pdf", EQUIDAD, 1, "LA EQUIDAD SEGUROS GENERALES", "PLAN")
+        self.assertEqual(len(columnas["APLICA FV"]), len(FILAS_EQUIDAD))
+        fallos = [evento for evento in registro.eventos if evento.get("error")]
+        self.assertEqual([evento["documento"] for evento in fallos], ["3234567890"])
+
+
+def _sisco(semilla, filas):
+    lineas = [f"{10_000 + semilla * 1_000 + i}   $ {(i + 1) * 1_000:,}   $ {(i + 1) * 973:,}".replace(",", ".") for i in range(filas)]
+    return contenido_pdf([["Bogotá, D.C., 5 de marzo de 2025", "Consulte su pago en www.sis.co, opción pagos"] + lineas[:40], lineas[40:]])
+
+
+def _equidad(semilla, filas):
+    lineas = [[f"{1_000_000_000 + semilla * 1_000 + i}", "2025", "AB", "1", "2", "3", "X1", f"{500_000 + semilla * 1_000 + i}", f"{(i + 1) * 1_000:,}-".replace(",", ".")] for i in range(filas)]
+    return contenido_pdf([["Fecha: 07.04.2025"] + lineas[:40], lineas[40:]], X_COLUMNAS)
+
+
+class PruebaParalelo(unittest.TestCase):
+    """Repartir los PDF entre procesos da el mismo resultado, en el mismo orden, que leerlos uno tras otro."""
+
+    def lote(self, generador):
+        # Archivos de distinto largo para que los procesos terminen desordenados.
+        return [ArchivoEnMemoria(f"pdf_{i}.pdf", generador(i, 5 + 30 * (i % 3))) for i in range(7)]
+
+    def test_mismo_resultado_que_un_proceso(self):
+        for nombre, procesar, generador in (("SISCO", procesar_seg_estado, _sisco), ("EQUIDAD", procesar_equidad, _equidad)):
+            archivos = self.lote(generador)
+            uno = procesar(archivos, 1, nombre, "PLAN", max_workers=1)
+            self.assertEqual(list(uno["ARCHIVO"].unique()), [archivo.name for archivo in archivos])
+            with self.subTest(formato=nombre, pool="propio"):
+                pd.testing.assert_frame_equal(procesar(archivos, 1, nombre, "PLAN", max_workers=3), uno)
+            with self.subTest(formato=nombre, pool="compartido"), mock.patch.object(pdf, "WORKERS_POR_DEFECTO", 2):
+                self.addCleanup(lambda: pdf._pool and pdf._descartar_pool(pdf._pool))
+                pd.testing.assert_frame_equal(procesar(archivos, 1, nombre, "PLAN"), uno)
+
+
+class PruebaCachePdf(unittest.TestCase):
+    def test_pdf_sin_facturas_se_guarda_y_el_ilegible_no(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            cache = CacheResultados(directorio)
+            sin_marca = ArchivoEnMemoria("otro.pdf", contenido_pdf([["Bogotá, D.C., 5 de marzo de 2025", "12345   $ 1.000   $ 973"]]))
+            ilegible = ArchivoEnMemoria("roto.pdf", b"%PDF-1.4 roto")
+            for _ in range(2):
+                origen = {}
+                df = procesar_con_cache(procesar_seg_estado, [sin_marca, ilegible], 1, "SEGUROS DEL ESTADO SA", "PLAN", cache=cache, progreso=lambda nombre, df, segundos: origen.__setitem__(nombre, segundos), max_workers=1)
+                self.assertTrue(df.empty)
+            # En la segunda pasada el PDF sin facturas sale de la caché; el ilegible se vuelve a intentar.
+            self.assertIsNone(origen["otro.pdf"])
+            self.assertIsNotNone(origen["roto.pdf"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,161 @@
+"""Prueba del servicio HTTP sin red: se levanta en un puerto libre de 127.0.0.1."""
+import http.client
+import json
+import os
+import socket
+import tempfile
+import threading
+import unittest
+import uuid
+
+# La caché en disco de los resultados va a un directorio temporal antes de importar el paquete.
+_TEMPORAL = tempfile.TemporaryDirectory(prefix="lector_cartera_prueba_")
+os.environ["CARTERA_CACHE_DIR"] = _TEMPORAL.name
+
+from lector_cartera.almacen import AlmacenCartera  # noqa: E402
+from lector_cartera.servicio import crear_servidor  # noqa: E402
+from lector_cartera.trabajos import ColaTrabajos  # noqa: E402
+from tests.util import liberty_csv  # noqa: E402
+
+ENTIDAD = "LIBERTY SEGUROS SA"
+
+
+def _multipart(campos, archivos):
+    limite = uuid.uuid4().hex
+    cuerpo = b""
+    for nombre, valor in campos:
+        cuerpo += f'--{limite}\r\nContent-Disposition: form-data; name="{nombre}"\r\n\r\n{valor}\r\n'.encode("utf-8")
+    for nombre, contenido in archivos:
+        cuerpo += f'--{limite}\r\nContent-Disposition: form-data; name="archivo"; filename="{nombre}"\r\nContent-Type: text/csv\r\n\r\n'.encode("utf-8")
+        cuerpo += contenido + b"\r\n"
+    cuerpo += f"--{limite}--\r\n".encode("utf-8")
+    return cuerpo, f"multipart/form-data; boundary={limite}"
+
+
+class PruebaServicio(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.almacen = tempfile.TemporaryDirectory(prefix="lector_cartera_almacen_")
+        cls.servidor = crear_servidor(puerto=0, cola=ColaTrabajos(1), max_mb=1, almacen=AlmacenCartera(cls.almacen.name))
+        cls.hilo = threading.Thread(target=cls.servidor.serve_forever, daemon=True)
+        cls.hilo.start()
+        cls.host, cls.puerto = cls.servidor.server_address
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.servidor.shutdown()
+        cls.servidor.server_close()
+        cls.almacen.cleanup()
+
+    def pedir(self, metodo, ruta, cuerpo=None, cabeceras=None):
+        conexion = http.client.HTTPConnection(self.host, self.puerto, timeout=60)
+        try:
+            conexion.request(metodo, ruta, body=cuerpo, headers=cabeceras or {})
+            respuesta = conexion.getresponse()
+            return respuesta.status, respuesta.getheader("Content-Type"), respuesta.read()
+        finally:
+            conexion.close()
+
+    def enviar(self, campos, archivos):
+        cuerpo, tipo = _multipart(campos, archivos)
+        return self.pedir("POST", "/trabajos", cuerpo, {"Content-Type": tipo})
+
+    def crudo(self, peticion):
+        # Petición escrita a mano, para cabeceras que http.client no deja enviar.
+        with socket.create_connection((self.host, self.puerto), timeout=30) as conexion:
+            conexion.sendall(peticion)
+            respuesta = b""
+            while True:
+                bloque = conexion.recv(65536)
+                if not bloque:
+                    break
+                respuesta += bloque
+        cabeza, _, cuerpo = respuesta.partition(b"\r\n\r\n")
+        return int(cabeza.split()[1]), json.loads(cuerpo)
+
+    def test_envio_y_flujo_de_filas(self):
+        estado, tipo, cuerpo = self.enviar([("entidad", ENTIDAD), ("sin_cache", "1")], [("pagos_1.csv", liberty_csv(filas=30).getvalue()), ("pagos_2.csv", liberty_csv(filas=20, desde=30).getvalue())])
+        self.assertEqual(estado, 202, cuerpo)
+        self.assertTrue(tipo.startswith("application/json"))
+        trabajo = json.loads(cuerpo)
+        self.assertEqual(trabajo["archivos"], 2)
+
+        estado, tipo, cuerpo = self.pedir("GET", f"/trabajos/{trabajo['id']}/filas")
+        self.assertEqual(estado, 200)
+        self.assertTrue(tipo.startswith("application/x-ndjson"))
+        filas = [json.loads(linea) for linea in cuerpo.splitlines()]
+        self.assertEqual(len(filas), 50)
+        self.assertEqual(sorted(f["APLICA A FV"] for f in filas), sorted(f"FE{i}" for i in range(50)))
+        self.assertEqual({f["ARCHIVO"] for f in filas}, {"pagos_1.csv", "pagos_2.csv"})
+
+        estado, _, cuerpo = self.pedir("GET", f"/trabajos/{trabajo['id']}")
+        self.assertEqual(estado, 200)
+        self.assertEqual(json.loads(cuerpo)["filas"], 50)
+
+        estado, tipo, cuerpo = self.pedir("GET", f"/trabajos/{trabajo['id']}/reporte?formato=csv.gz")
+        self.assertEqual(estado, 200)
+        self.assertTrue(cuerpo.startswith(b"\x1f\x8b"))
+
+    def test_content_length_invalido(self):
+        for largo in (b"abc", b"-5"):
+            with self.subTest(largo=largo):
+                estado, cuerpo = self.crudo(b"POST /trabajos HTTP/1.1\r\nHost: prueba\r\nContent-Type: multipart/form-data; boundary=x\r\nContent-Length: " + largo + b"\r\n\r\n")
+                self.assertEqual(estado, 400)
+                self.assertIn("Content-Length", cuerpo["error"])
+
+    def test_campos_invalidos(self):
+        archivos = [("pagos.csv", liberty_csv(filas=3).getvalue())]
+        casos = {
+            "sin entidad": [],
+            "entidad desconocida": [("entidad", "NO EXISTE SA")],
+            "motor desconocido": [("entidad", ENTIDAD), ("motor", "otro")],
+            "entidad_familia sin '='": [("entidad", "auto"), ("entidad_familia", "LIBERTY")],
+            "formato desconocido": [("entidad", "auto"), ("entidad_familia", "OTRO=LIBERTY SEGUROS SA")],
+            "reemplazar sin almacen": [("entidad", ENTIDAD), ("reemplazar", "1")],
+        }
+        for caso, campos in casos.items():
+            with self.subTest(caso=caso):
+                estado, tipo, cuerpo = self.enviar(campos, archivos)
+                self.assertEqual(estado, 400, cuerpo)
+                self.assertTrue(tipo.startswith("application/json"))
+                self.assertIn("error", json.loads(cuerpo))
+        estado, _, _ = self.enviar([("entidad", ENTIDAD)], [])
+        self.assertEqual(estado, 400)
+        estado, _, _ = self.pedir("GET", "/trabajos/x/reporte?formato=otro")
+        self.assertEqual(estado, 404)
+
+    def test_almacen_y_reemplazo(self):
+        archivos = [("almacen.csv", liberty_csv(filas=4, desde=100).getvalue())]
+        almacenados = []
+        for campos in ([("almacen", "1")], [("almacen", "1")], [("almacen", "1"), ("reemplazar", "1")]):
+            estado, _, cuerpo = self.enviar([("entidad", ENTIDAD)] + campos, archivos)
+            self.assertEqual(estado, 202, cuerpo)
+            id_trabajo = json.loads(cuerpo)["id"]
+            # Se espera a que termine leyendo el flujo de filas.
+            self.pedir("GET", f"/trabajos/{id_trabajo}/filas")
+            almacenados.append(json.loads(self.pedir("GET", f"/trabajos/{id_trabajo}")[2])["almacenado"])
+        self.assertEqual([(a["archivos"], a["omitidos"]) for a in almacenados], [(1, 0), (0, 1), (1, 0)])
+        self.assertEqual(len(AlmacenCartera(self.almacen.name).extraer()), 4)
+
+    def test_error_interno_responde_json(self):
+        estado, _, cuerpo = self.enviar([("entidad", ENTIDAD), ("sin_cache", "1")], [("pagos.csv", liberty_csv(filas=5).getvalue())])
+        self.assertEqual(estado, 202, cuerpo)
+        id_trabajo = json.loads(cuerpo)["id"]
+        # Se espera a que termine leyendo el flujo de filas.
+        self.pedir("GET", f"/trabajos/{id_trabajo}/filas")
+
+        def fallar(trabajo, formato):
+            raise OSError("disco lleno")
+
+        self.servidor.reporte = fallar
+        try:
+            estado, tipo, cuerpo = self.pedir("GET", f"/trabajos/{id_trabajo}/reporte?formato=csv.gz")
+        finally:
+            del self.servidor.reporte
+        self.assertEqual(estado, 500)
+        self.assertTrue(tipo.startswith("application/json"))
+        self.assertIn("disco lleno", json.loads(cuerpo)["error"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+"""Cola de trabajos: cancelación en cola y en curso, y resultado por partes."""
+import queue
+import threading
+import unittest
+
+import pandas as pd
+
+from lector_cartera.archivos import ArchivoEnMemoria
+from lector_cartera.esquema import unir
+from lector_cartera.trabajos import CANCELADO, EN_COLA, PROCESANDO, TERMINADO, ColaTrabajos
+
+ESPERA = 5
+
+
+class Procesador:
+    """Procesador de prueba que se detiene antes de cada archivo hasta que la prueba lo deja seguir."""
+
+    def __init__(self):
+        self.empezados = queue.Queue()
+        self._seguir = threading.Semaphore(0)
+
+        def procesar_prueba(archivos, nit, selection_entidad, plan_entidad, progreso=None):
+            partes = []
+            for archivo in archivos:
+                self.empezados.put(archivo.name)
+                self._seguir.acquire(timeout=ESPERA)
+                df = pd.DataFrame({"ARCHIVO": [archivo.name] * 2, "VR. BRUTO": [1.0, 2.0]})
+                partes.append(df)
+                if progreso is not None:
+                    progreso(archivo.name, df, 0.0)
+            return pd.concat(partes, ignore_index=True)
+
+        self.funcion = procesar_prueba
+
+    def esperar_archivo(self):
+        return self.empezados.get(timeout=ESPERA)
+
+    def seguir(self, archivos=1):
+        for _ in range(archivos):
+            self._seguir.release()
+
+
+def archivos(*nombres):
+    return [ArchivoEnMemoria(nombre, nombre.encode("utf-8")) for nombre in nombres]
+
+
+def esperar(trabajo):
+    for _ in trabajo.partes(espera=0.01):
+        pass
+    return trabajo
+
+
+class PruebaColaTrabajos(unittest.TestCase):
+    def setUp(self):
+        self.cola = ColaTrabajos(max_simultaneos=1)
+        self.procesador = Procesador()
+        # Si una prueba falla a mitad, el procesador no deja hilos esperando.
+        self.addCleanup(self.procesador.seguir, 20)
+
+    def enviar(self, *nombres):
+        return self.cola.obtener(self.cola.enviar(self.procesador.funcion, archivos(*nombres), 1, "ENTIDAD", "PLAN", usar_cache=False))
+
+    def test_cancelar_un_trabajo_en_cola(self):
+        primero = self.enviar("a.csv")
+        self.assertEqual(self.procesador.esperar_archivo(), "a.csv")
+        segundo = self.enviar("b.csv")
+        self.assertEqual((primero.estado, segundo.estado), (PROCESANDO, EN_COLA))
+        self.assertEqual(self.cola.posicion(segundo.id), 0)
+
+        self.cola.cancelar(segundo.id)
+        self.assertEqual(segundo.estado, CANCELADO)
+        self.assertIsNone(segundo.resultado)
+        self.assertEqual(segundo.grupos[0].archivos, [])
+
+        self.procesador.seguir()
+        self.assertEqual(esperar(primero).estado, TERMINADO)
+        # El trabajo cancelado nunca llegó al procesador.
+        self.assertTrue(self.procesador.empezados.empty())
+
+    def test_cancelar_un_trabajo_en_curso_conserva_lo_procesado(self):
+        trabajo = self.enviar("a.csv", "b.csv", "c.csv")
+        self.assertEqual(self.procesador.esperar_archivo(), "a.csv")
+        self.procesador.seguir()
+        self.assertEqual(self.procesador.esperar_archivo(), "b.csv")
+
+        # La cancelación se atiende al terminar el archivo en curso.
+        self.cola.cancelar(trabajo.id)
+        self.procesador.seguir()
+        esperar(trabajo)
+        self.assertEqual(trabajo.estado, CANCELADO)
+        self.assertEqual([fila["ARCHIVO"] for fila in trabajo.detalle], ["a.csv", "b.csv"])
+        self.assertEqual(list(trabajo.resultado["ARCHIVO"]), ["a.csv", "a.csv", "b.csv", "b.csv"])
+        self.assertTrue(self.procesador.empezados.empty())
+
+    def test_partes_y_resultado_parcial(self):
+        trabajo = self.enviar("a.csv", "b.csv", "c.csv")
+        partes = trabajo.partes(espera=0.01)
+        self.assertEqual(self.procesador.esperar_archivo(), "a.csv")
+        self.procesador.seguir()
+        recibidas = [next(partes)]
+        self.assertEqual(self.procesador.esperar_archivo(), "b.csv")
+        self.procesador.seguir()
+        recibidas.append(next(partes))
+        self.assertEqual(self.procesador.esperar_archivo(), "c.csv")
+
+        self.assertEqual(list(trabajo.resultado_parcial()["ARCHIVO"]), ["a.csv", "a.csv", "b.csv", "b.csv"])
+        self.assertEqual(list(trabajo.resultado_parcial(ultimas=3)["ARCHIVO"]), ["a.csv", "b.csv", "b.csv"])
+        self.assertEqual(list(trabajo.resultado_parcial(ultimas=1)["VR. BRUTO"]), [2.0])
+
+        self.procesador.seguir()
+        recibidas.extend(partes)
+        self.assertEqual(trabajo.estado, TERMINADO)
+        self.assertEqual([list(df["ARCHIVO"].unique()) for df in recibidas], [["a.csv"], ["b.csv"], ["c.csv"]])
+        pd.testing.assert_frame_equal(unir(recibidas), trabajo.resultado)
+        # Con el trabajo terminado las partes llegan como el resultado completo.
+        self.assertEqual([len(df) for df in trabajo.partes()], [6])
+        pd.testing.assert_frame_equal(trabajo.resultado_parcial(ultimas=2), trabajo.resultado.tail(2))
+
+
+if __name__ == "__main__":
+    unittest.main()
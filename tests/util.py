@@ -0,0 +1,19 @@
+"""Archivos de prueba compartidos por los módulos de tests."""
+from lector_cartera.archivos import ArchivoEnMemoria
+
+ENCABEZADO_LIBERTY = "Fecha_Pago,No_Factura,Valor_Pagado,Valor_Ret,Valor_Base"
+
+
+def liberty_csv(nombre="pagos.csv", filas=0, desde=0, mes=3, fechas=None):
+    """CSV de Liberty con las facturas FE<desde>... FE<desde + filas - 1>.
+
+    Las fechas van del 01 al 09 del ``mes`` de 2025, salvo que se indiquen
+    ``fechas`` (una por fila, como texto).
+    """
+    if fechas is not None:
+        filas = len(fechas)
+    lineas = [ENCABEZADO_LIBERTY]
+    for n, i in enumerate(range(desde, desde + filas)):
+        fecha = fechas[n] if fechas is not None else f"0{1 + i % 9}/{mes:02d}/2025"
+        lineas.append(f"{fecha},FE{i},{1000 + i}.0,{i % 7}.0,{1100 + i}.0")
+    return ArchivoEnMemoria(nombre, ("\n".join(lineas) + "\n").encode("utf-8"))